@@ -0,0 +1,226 @@
+"""
+LifelineQR - Write-behind log of who viewed which student's records.
+Read handlers append an event to a bounded in-memory buffer and return; a
+background thread per process writes the buffer to the access_log table in
+multi-row INSERTs, every few seconds or once a batch has filled. When the
+buffer is full the overflow policy drops the oldest event, drops the new one,
+or briefly holds the request until the flusher has made room.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import mysql.connector
+
+# What a client looked at
+SCAN = 'scan'
+PROFILE = 'profile'
+DOCUMENTS = 'documents'
+DOCUMENT = 'document'
+DOCUMENT_CONTENT = 'document_content'
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+VIEWER_ROLES = ('admin', 'doctor', 'student')
+MAX_USER_AGENT = 255
+
+INSERT_SQL = ('INSERT INTO access_log (student_id, document_id, action, viewer_role, viewer_id, '
+              'ip, user_agent, status, accessed_at) '
+              'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)')
+
+HISTORY_COLUMNS = ('id, student_id, document_id, action, viewer_role, viewer_id, ip, '
+                   'user_agent, status, accessed_at')
+
+
+def viewer(role, viewer_id):
+    """(role, id) as declared by the client, or (None, None) when malformed."""
+    role = (role or '').strip().lower()
+    if role not in VIEWER_ROLES:
+        return None, None
+    try:
+        return role, int(viewer_id) if viewer_id else None
+    except ValueError:
+        return role, None
+
+
+class AccessLog:
+    """Buffered access events of one server process.
+
+    get_db         -- callable returning a pooled connection
+    capacity       -- events held in memory at most
+    batch_size     -- rows per INSERT; a full batch wakes the flusher early
+    flush_interval -- seconds between writes of a partial batch
+    policy         -- what record() does when the buffer is full (POLICIES)
+    block_timeout  -- seconds a BLOCK caller waits for room before its event is dropped
+
+    The flusher starts with the first event recorded in a process, so
+    forked workers each get their own. ``stop`` writes what is left.
+    """
+
+    def __init__(self, get_db, capacity=10000, batch_size=500, flush_interval=2.0,
+                 policy=DROP_OLDEST, block_timeout=0.05):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of: {', '.join(POLICIES)}")
+        self.get_db = get_db
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)    # a batch is waiting, or stopping
+        self._room = threading.Condition(self._lock)     # the flusher freed space
+        self._events = deque()
+        self._thread = None
+        self._stopping = False
+        self._pid = os.getpid()
+        self._recorded = 0
+        self._written = 0
+        self._dropped = 0
+        self._blocked = 0
+        self._failed_flushes = 0
+        self._last_error = None
+
+    # ── Recording (request path) ─────────────────────────────────────────────
+
+    def record(self, action, student_id, document_id=None, viewer_role=None, viewer_id=None,
+               ip=None, user_agent=None, status=200, wait=True):
+        """Queue one event; returns False if it was dropped.
+
+        ``wait=False`` never blocks, whatever the policy (for event-loop callers).
+        """
+        if os.getpid() != self._pid:
+            # Forked: the parent's buffer and flusher are not ours
+            self._reset()
+        event = (student_id, document_id, action, viewer_role, viewer_id, ip,
+                 user_agent[:MAX_USER_AGENT] if user_agent else None, status, datetime.now())
+
+        with self._lock:
+            if self._thread is None and not self._stopping:
+                self._start()
+            if len(self._events) >= self.capacity:
+                if self.policy == BLOCK and wait:
+                    self._blocked += 1
+                    self._ready.notify()
+                    self._room.wait_for(lambda: len(self._events) < self.capacity,
+                                        self.block_timeout)
+                if len(self._events) >= self.capacity:
+                    if self.policy != DROP_OLDEST:
+                        self._dropped += 1
+                        return False
+                    self._events.popleft()
+                    self._dropped += 1
+            self._events.append(event)
+            self._recorded += 1
+            if len(self._events) >= self.batch_size:
+                self._ready.notify()
+        return True
+
+    # ── Flushing ─────────────────────────────────────────────────────────────
+
+    def _start(self):
+        """Start this process's flusher (lock held)."""
+        self._thread = threading.Thread(target=self._run, name='access-log-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._ready.wait_for(lambda: self._stopping
+                                     or len(self._events) >= self.batch_size,
+                                     self.flush_interval)
+                stopping = self._stopping
+            written = self.flush()
+            if stopping:
+                return
+            if written is None:
+                # Database unavailable: keep the buffer and retry after a pause
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Write every buffered event in batches; returns rows written (None on error)."""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._events.popleft()
+                         for _ in range(min(self.batch_size, len(self._events)))]
+                if batch:
+                    self._room.notify_all()
+            if not batch:
+                return written
+            try:
+                with self.get_db() as conn:
+                    # mysql.connector sends the batch as one multi-row INSERT
+                    conn.cursor().executemany(INSERT_SQL, batch)
+                    conn.commit()
+            except mysql.connector.Error as err:
+                self._requeue(batch, err)
+                return None
+            with self._lock:
+                self._written += len(batch)
+            written += len(batch)
+
+    def _requeue(self, batch, err):
+        """Put a failed batch back in front, as far as the buffer has room."""
+        with self._lock:
+            self._failed_flushes += 1
+            self._last_error = str(err)
+            room = max(0, self.capacity - len(self._events))
+            if room < len(batch):
+                self._dropped += len(batch) - room
+                batch = batch[len(batch) - room:]
+            self._events.extendleft(reversed(batch))
+        print(f'  [ERR] Access log flush: {err}')
+
+    def stop(self, timeout=10.0):
+        """Stop the flusher after it has written the buffer (or ``timeout`` passed)."""
+        with self._lock:
+            if os.getpid() != self._pid:
+                return
+            self._stopping = True
+            self._ready.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'capacity': self.capacity,
+                'buffered': len(self._events),
+                'recorded': self._recorded,
+                'written': self._written,
+                'dropped': self._dropped,
+                'blocked': self._blocked,
+                'failed_flushes': self._failed_flushes,
+                'last_error': self._last_error,
+            }
+
+
+def history(cursor, student_id, page_cursor, limit):
+    """One page of a student's access events, newest first (plus one look-ahead row).
+
+    ``page_cursor`` is the (accessed_at, id) of the last row of the previous
+    page; the (student_id, accessed_at, id) index serves every page.
+    """
+    sql = f'SELECT {HISTORY_COLUMNS} FROM access_log WHERE student_id = %s'
+    params = [student_id]
+    if page_cursor:
+        accessed_at, row_id = page_cursor
+        sql += ' AND (accessed_at < %s OR (accessed_at = %s AND id < %s))'
+        params += [accessed_at, accessed_at, row_id]
+    sql += ' ORDER BY accessed_at DESC, id DESC LIMIT %s'
+    cursor.execute(sql, params + [limit + 1])
+    return cursor.fetchall()
@@ -0,0 +1,490 @@
+"""
+LifelineQR - ASGI entry point.
+The I/O-bound read endpoints (scan, profiles, documents, login, listings,
+search, dashboard stats) run as async handlers on an aiomysql pool; every other
+route falls through to the Flask app, so the API is unchanged.
+Run with `python manage.py serve --asgi`.
+"""
+
+import contextlib
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Match, Mount, Route
+from werkzeug.http import http_date
+
+import access_log
+import http_cache
+import metrics
+import search
+import server
+import stats
+from listing import (ListingError, decode_cursor, finish_page, keyset_query,
+                     parse_fields, parse_filters, parse_limit)
+
+# Connections per worker process for the async handlers (the Flask routes
+# mounted underneath keep using server.py's own pool)
+ASYNC_DB_POOL_SIZE = int(os.environ.get('LIFELINEQR_ASYNC_DB_POOL_SIZE', 50))
+# Threads running the mounted Flask routes, per worker process
+WSGI_THREADS = int(os.environ.get('LIFELINEQR_THREADS', 4))
+
+_pool = None
+_replica_pool = None    # with server.DB_REPLICA_CONFIG; routed by server._router
+
+
+class FlaskJSONResponse(JSONResponse):
+    """Serialise exactly as Flask's jsonify does (sorted keys, HTTP dates)."""
+
+    def render(self, content):
+        return json.dumps(content, default=_json_default, sort_keys=True,
+                          separators=(',', ':'), ensure_ascii=True).encode('utf-8')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _json(body, status=200, headers=None):
+    # Same CORS answer flask_cors gives; preflights fall through to Flask
+    headers = dict(headers or {}, **{'Access-Control-Allow-Origin': '*'})
+    return FlaskJSONResponse(body, status_code=status, headers=headers)
+
+
+async def _fetch(sql, params=(), one=False, pool=None):
+    async with (pool or _pool).acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return await (cursor.fetchone() if one else cursor.fetchall())
+
+
+def _isoformat(row, key):
+    if row.get(key):
+        row[key] = row[key].isoformat()
+
+
+async def _validators(cursor, sql, student_id, make_etag):
+    # Same order as server._validators: the version is read before the payload
+    await cursor.execute(sql, (student_id,))
+    row = await cursor.fetchone()
+    return (make_etag(student_id, row[0]), row[1]) if row else None
+
+
+def _not_modified(etag, last_modified=None):
+    headers = dict(http_cache.validator_headers(etag, last_modified),
+                   **{'Access-Control-Allow-Origin': '*'})
+    return Response(status_code=304, headers=headers)
+
+
+async def _read_pool(request):
+    # Same choice as server.get_read_db: the replica unless it lags or this client just wrote
+    router = server._router
+    if router is None or _replica_pool is None:
+        return _pool
+    if router.check_due():
+        await run_in_threadpool(router.check)
+    session = (request.client.host if request.client else None,
+               request.headers.get('user-agent', ''))
+    return _replica_pool if router.use_replica(session) else _pool
+
+
+def _log_access(request, action, student_id, document_id=None, status=200):
+    # Same event as server._log_access; never waits for buffer room on the event loop
+    role, viewer_id = access_log.viewer(request.query_params.get('viewer_role'),
+                                        request.query_params.get('viewer_id'))
+    server._access_log.record(action, student_id, document_id, role, viewer_id,
+                              request.client.host if request.client else None,
+                              request.headers.get('user-agent'), status, wait=False)
+
+
+# ── Students ─────────────────────────────────────────────────────────────────
+
+async def get_student(request):
+    student_id = request.path_params['student_id']
+    async with (await _read_pool(request)).acquire() as conn:
+        async with conn.cursor() as cursor:
+            validators = await _validators(cursor, http_cache.STUDENT_VERSION_SQL, student_id,
+                                           http_cache.student_etag)
+        if not validators:
+            return _json({'success': False, 'error': 'Student not found'}, 404)
+        if http_cache.not_modified(request.headers, *validators):
+            _log_access(request, access_log.PROFILE, student_id, status=304)
+            return _not_modified(*validators)
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(server.STUDENT_PROFILE_SQL, (student_id,))
+            student = await cursor.fetchone()
+
+    if not student:
+        return _json({'success': False, 'error': 'Student not found'}, 404)
+    _log_access(request, access_log.PROFILE, student_id)
+    _isoformat(student, 'created_at')
+    return _json({'success': True, 'student': student},
+                 headers=http_cache.validator_headers(*validators))
+
+
+async def _load_scan_profile(student_id):
+    async with _pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(server.STUDENT_PROFILE_SQL, (student_id,))
+            student = await cursor.fetchone()
+            if not student:
+                return None
+            await cursor.execute(server.DOCUMENT_LIST_SQL, (student_id,))
+            docs = list(await cursor.fetchall())
+
+    _isoformat(student, 'created_at')
+    for d in docs:
+        _isoformat(d, 'uploaded_at')
+        server.preview_links(d)
+    return {'student': student, 'documents': docs}
+
+
+async def scan_student(request):
+    student_id = request.path_params['student_id']
+    profile, state = await server._scan_cache.aget_or_load(
+        student_id, lambda: _load_scan_profile(student_id))
+    if profile is None:
+        return _json({'success': False, 'error': 'Student not found'}, 404)
+    _log_access(request, access_log.SCAN, student_id)
+    return _json({'success': True, 'stale': state == 'stale', **profile},
+                 headers={'X-Cache': state.upper()})
+
+
+async def login(request):
+    data = await request.json()
+
+    email = data.get('email', '').lower()
+    password = data.get('password', '')
+    role = data.get('role', '')
+
+    if not email or not password or not role:
+        return _json({'success': False, 'error': 'Email, password, and role are required'}, 400)
+
+    sql = server.DOCTOR_LOGIN_SQL if role == 'doctor' else server.STUDENT_LOGIN_SQL
+    user = await _fetch(sql, (email,), one=True)
+
+    if not user or user['password'] != password:
+        return _json({'success': False, 'error': 'Invalid email or password'}, 401)
+
+    del user['password']
+    _isoformat(user, 'created_at')
+    user['role'] = role
+    return _json({'success': True, 'user': user})
+
+
+# ── Documents ────────────────────────────────────────────────────────────────
+
+async def get_documents(request):
+    student_id = request.path_params['student_id']
+    async with (await _read_pool(request)).acquire() as conn:
+        async with conn.cursor() as cursor:
+            validators = await _validators(cursor, http_cache.DOCUMENTS_VERSION_SQL, student_id,
+                                           http_cache.documents_etag)
+        if not validators:
+            return _json({'success': True, 'documents': []})
+        if http_cache.not_modified(request.headers, *validators):
+            _log_access(request, access_log.DOCUMENTS, student_id, status=304)
+            return _not_modified(*validators)
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(server.DOCUMENT_LIST_SQL, (student_id,))
+            docs = await cursor.fetchall()
+    _log_access(request, access_log.DOCUMENTS, student_id)
+
+    for d in docs:
+        _isoformat(d, 'uploaded_at')
+        server.preview_links(d)
+    return _json({'success': True, 'documents': list(docs)},
+                 headers=http_cache.validator_headers(*validators))
+
+
+async def get_document(request):
+    doc_id = request.path_params['doc_id']
+    async with _pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(server.DOCUMENT_META_SQL, (doc_id,))
+            doc = await cursor.fetchone()
+            if doc:
+                etag = http_cache.document_etag(doc)   # no Last-Modified, as in server.py
+                if http_cache.not_modified(request.headers, etag):
+                    _log_access(request, access_log.DOCUMENT, doc['student_id'], doc_id,
+                                status=304)
+                    return _not_modified(etag)
+            if doc and not doc['blob_sha256']:
+                await cursor.execute('SELECT file_data FROM medical_documents WHERE id = %s',
+                                     (doc_id,))
+                doc['file_data'] = (await cursor.fetchone())['file_data']
+
+    if not doc:
+        return _json({'success': False, 'error': 'Document not found'}, 404)
+    _log_access(request, access_log.DOCUMENT, doc['student_id'], doc_id)
+    headers = http_cache.validator_headers(etag)
+    _isoformat(doc, 'uploaded_at')
+    doc['content_url'] = f'/api/document/{doc_id}/content'
+    server.preview_links(doc)
+    return _json({'success': True, 'document': doc}, headers=headers)
+
+
+# ── Listings and dashboard ───────────────────────────────────────────────────
+
+async def _list_page(request, table, columns, filters):
+    args = request.query_params
+    fields = parse_fields(args, columns)
+    limit = parse_limit(args)
+    page_cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+    sql, params = keyset_query(table, {f: columns[f] for f in fields},
+                               parse_filters(args, filters), page_cursor, limit)
+    rows = await _fetch(sql, params, pool=await _read_pool(request))
+    return finish_page(list(rows), limit, fields)
+
+
+def _listing(name, key, table, columns, filters):
+    async def endpoint(request):
+        rows, next_cursor = await _list_page(request, table, columns, filters)
+        return _json({'success': True, key: rows, 'next_cursor': next_cursor})
+    endpoint.__name__ = name   # same endpoint name as the Flask view, for the counters
+    return endpoint
+
+
+def _searcher(name, columns_by_target):
+    async def endpoint(request):
+        page = search.parse_request(request.query_params, columns_by_target,
+                                    server.SEARCH_FILTERS)
+        rows = await _fetch(page.sql, page.params, pool=await _read_pool(request))
+        rows, next_cursor = search.finish_page(list(rows), page)
+        return _json({'success': True, page.target: rows, 'next_cursor': next_cursor})
+    endpoint.__name__ = name
+    return endpoint
+
+
+async def admin_stats(request):
+    async with (await _read_pool(request)).acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(stats.READ_COUNTERS_SQL)
+            counters = await cursor.fetchall()
+            await cursor.execute(stats.READ_TODAY_SQL, (stats.DAILY_REGISTRATIONS,))
+            today = await cursor.fetchone()
+    return _json({'success': True, 'stats': stats.summarise(counters, today)})
+
+
+async def admin_login(request):
+    data = await request.json()
+    email = data.get('email', '').strip().lower()
+    password = data.get('password', '')
+    if not email or not password:
+        return _json({'success': False, 'error': 'Email and password required'}, 400)
+    admin = await _fetch(server.ADMIN_LOGIN_SQL, (email,), one=True)
+    if not admin or admin['password'] != password:
+        return _json({'success': False, 'error': 'Invalid credentials'}, 401)
+    return _json({'success': True, 'admin': {'id': admin['id'], 'email': admin['email']}})
+
+
+# ── Compression ──────────────────────────────────────────────────────────────
+
+class CompressionMiddleware:
+    """Apply server._compression to the async handlers' responses.
+
+    Responses from the mounted Flask app were already handled by its own
+    after_request hook (same policy, same counters) and pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+
+        compressor = server._compression
+        request_headers = Headers(scope=scope)
+        encoding = compressor.negotiate(request_headers.get('accept-encoding'))
+        stream = start = None
+
+        async def send_compressed(message):
+            nonlocal stream, start
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                if not compressor.compressible(message['status'], headers.get('content-type'),
+                                               headers.get('content-encoding')):
+                    await send(message)
+                    return
+                if 'accept-encoding' not in headers.get('vary', '').lower():
+                    headers.add_vary_header('Accept-Encoding')
+                length = headers.get('content-length')
+                if (not encoding or 'range' in request_headers
+                        or (length is not None and int(length) < compressor.min_bytes)):
+                    await send(message)
+                    return
+
+                endpoint = getattr(scope.get('endpoint'), '__name__', 'unknown')
+                stream = compressor.stream(endpoint, encoding)
+                headers['Content-Encoding'] = encoding
+                if 'content-length' in headers:
+                    del headers['Content-Length']
+                etag = headers.get('etag')
+                if etag and not etag.startswith('W/'):
+                    headers['ETag'] = 'W/' + etag
+                start = message   # sent with the first body chunk
+                return
+
+            if message['type'] == 'http.response.body' and stream is not None:
+                more_body = message.get('more_body', False)
+                body = stream.compress(message.get('body', b''))
+                if not more_body:
+                    body += stream.finish()
+                if start is not None:
+                    if not more_body:
+                        MutableHeaders(scope=start)['Content-Length'] = str(len(body))
+                    await send(start)
+                    start = None
+                await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+                return
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_compressed)
+        finally:
+            if stream is not None:
+                stream.close()
+
+
+# ── Metrics ──────────────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Record the async handlers' requests in server._metrics.
+
+    Requests that fall through to the Flask app are recorded by its own WSGI
+    middleware. aiomysql calls are not timed, so these routes report no DB time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # Starlette paths written the way Flask writes the same rules, so both
+        # halves of the app report under one route label
+        self.rules = [(route, re.sub(r'\{(\w+):(\w+)\}', r'<\2:\1>', route.path))
+                      for route in routes if isinstance(route, Route)]
+
+    async def __call__(self, scope, receive, send):
+        rule = None
+        if scope['type'] == 'http':
+            rule = next((rule for route, rule in self.rules
+                         if route.matches(scope)[0] == Match.FULL), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        recorder = server._metrics
+        recorder.started()
+        started = time.perf_counter()
+        status, size = '500', 0
+
+        async def send_measured(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            method = scope['method']
+            recorder.observe(metrics.DURATION,
+                             metrics.labels(route=rule, method=method, status=status),
+                             time.perf_counter() - started)
+            recorder.observe(metrics.RESPONSE_SIZE, metrics.labels(route=rule, method=method),
+                             size)
+
+
+# ── Application ──────────────────────────────────────────────────────────────
+
+async def _db_error(request, err):
+    return _json({'success': False, 'error': str(err)}, 500)
+
+
+async def _listing_error(request, err):
+    return _json({'success': False, 'error': str(err)}, 400)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool, _replica_pool
+    if server.DB_BACKEND == 'sqlite':
+        # The async handlers talk to MySQL directly (aiomysql)
+        raise RuntimeError('asgi.py needs the MySQL backend; serve SQLite without --asgi')
+    if not server._check_schema():
+        raise RuntimeError('Database schema is not up to date')
+    _pool = await _create_pool(server.DB_CONFIG)
+    if server.DB_REPLICA_CONFIG:
+        _replica_pool = await _create_pool(server.DB_REPLICA_CONFIG)
+    server._start_job_workers()
+    try:
+        yield
+    finally:
+        for pool in (_pool, _replica_pool):
+            if pool is not None:
+                pool.close()
+                await pool.wait_closed()
+
+
+async def _create_pool(db):
+    return await aiomysql.create_pool(
+        host=db['host'], port=db['port'], user=db['user'], password=db['password'],
+        db=db['database'], charset='utf8mb4', autocommit=True,
+        minsize=1, maxsize=ASYNC_DB_POOL_SIZE, pool_recycle=server.DB_POOL_RECYCLE,
+    )
+
+
+routes = [
+    Route('/api/scan/{student_id:int}', scan_student, methods=['GET']),
+    Route('/api/student/{student_id:int}', get_student, methods=['GET']),
+    Route('/api/student/{student_id:int}/documents', get_documents, methods=['GET']),
+    Route('/api/document/{doc_id:int}', get_document, methods=['GET']),
+    Route('/api/login', login, methods=['POST']),
+    Route('/api/students', _listing('get_students', 'students', 'students',
+                                    server.STUDENT_LIST_COLUMNS, server.STUDENT_LIST_FILTERS),
+          methods=['GET']),
+    Route('/api/doctors', _listing('get_doctors', 'doctors', 'doctors',
+                                   server.DOCTOR_LIST_COLUMNS, server.DOCTOR_LIST_FILTERS),
+          methods=['GET']),
+    Route('/api/admin/students', _listing('admin_get_students', 'students', 'students',
+                                          server.ADMIN_STUDENT_LIST_COLUMNS,
+                                          server.STUDENT_LIST_FILTERS), methods=['GET']),
+    Route('/api/admin/doctors', _listing('admin_get_doctors', 'doctors', 'doctors',
+                                         server.DOCTOR_LIST_COLUMNS, server.DOCTOR_LIST_FILTERS),
+          methods=['GET']),
+    Route('/api/search', _searcher('search_people', {
+        'students': server.STUDENT_LIST_COLUMNS, 'doctors': server.DOCTOR_LIST_COLUMNS,
+    }), methods=['GET']),
+    Route('/api/admin/search', _searcher('admin_search', {
+        'students': server.ADMIN_STUDENT_LIST_COLUMNS, 'doctors': server.DOCTOR_LIST_COLUMNS,
+    }), methods=['GET']),
+    Route('/api/admin/stats', admin_stats, methods=['GET']),
+    Route('/api/admin/login', admin_login, methods=['POST']),
+    # Uploads, writes, downloads, exports and everything else: the Flask app
+    Mount('/', WSGIMiddleware(server.app, workers=WSGI_THREADS)),
+]
+
+app = Starlette(
+    routes=routes,
+    exception_handlers={aiomysql.Error: _db_error, ListingError: _listing_error},
+    middleware=[Middleware(MetricsMiddleware), Middleware(CompressionMiddleware)],
+    lifespan=lifespan,
+)
@@ -0,0 +1,464 @@
+"""
+LifelineQR - Reproducible load test of the API hot paths.
+Seeds a dedicated database (default lifelineqr_bench) with synthetic schools
+(students, doctors, documents of realistic sizes), boots `manage.py serve`
+against it with its storage under storage/bench, and drives each scenario at a
+fixed concurrency. Throughput and p50/p95/p99 per endpoint can be saved as a
+JSON baseline and compared with a later run:
+
+    python benchmarks/bench_api.py --save baseline.json
+    python benchmarks/bench_api.py --compare baseline.json --save after.json
+    python benchmarks/bench_api.py --compare baseline.json after.json
+    python benchmarks/bench_api.py --url http://127.0.0.1:5000 --scenarios scan,admin
+    python benchmarks/bench_api.py --backend sqlite --compare mysql.json
+
+With --backend sqlite the same data is seeded into storage/bench/<database>.sqlite3
+and served by the embedded backend, so the two can be compared on one machine.
+A comparison exits with status 1 when any endpoint regressed by more than
+--threshold percent, so it can gate a change.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mysql.connector  # noqa: E402
+
+import config  # noqa: E402
+import loadgen  # noqa: E402
+import migrations  # noqa: E402
+from sqlite_db import SQLitePool  # noqa: E402
+import stats  # noqa: E402
+from bench_search import CLASSES, FIRST, LAST, SECTIONS  # noqa: E402
+
+SEED_BATCH = 2000
+BENCH_DOMAIN = 'bench.invalid'
+
+# (filename, content type, median bytes): scanned reports, phone photos, prescriptions
+DOCUMENT_KINDS = [
+    ('report.pdf', 'application/pdf', 180 * 1024),
+    ('scan.jpg', 'image/jpeg', 600 * 1024),
+    ('prescription.png', 'image/png', 250 * 1024),
+]
+MIN_DOCUMENT_BYTES = 4 * 1024
+MAX_DOCUMENT_BYTES = 8 * 1024 * 1024
+# Distinct upload bodies generated per run; each request makes its copy unique
+UPLOAD_BODIES = 16
+
+SPECIALIZATIONS = ['Paediatrics', 'General Medicine', 'Emergency Medicine', 'Cardiology',
+                   'Pulmonology', 'Endocrinology']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+
+SCENARIOS = ('scan', 'register', 'upload', 'admin', 'mixed')
+# Latency changes smaller than this are noise whatever their percentage
+MIN_REGRESSION_MS = 1.0
+
+
+def document_size(rng, median):
+    """Lognormal around ``median``: most files near it, a long tail of large scans."""
+    size = int(rng.lognormvariate(math.log(median), 0.7))
+    return max(MIN_DOCUMENT_BYTES, min(MAX_DOCUMENT_BYTES, size))
+
+
+# ── Seeding ──────────────────────────────────────────────────────────────────
+
+def sqlite_path(args):
+    return os.path.join(os.path.abspath(args.storage), f'{args.database}.sqlite3')
+
+
+def prepare_database(args):
+    """Create (or with --reseed, recreate) and migrate the benchmark database."""
+    if args.backend == 'sqlite':
+        if args.reseed:
+            # The database file lives under the storage directory
+            shutil.rmtree(args.storage, ignore_errors=True)
+        conn = SQLitePool(sqlite_path(args)).connection()
+        migrations.migrate(conn)
+        return conn
+
+    db = config.db_config()
+    if args.reseed:
+        if 'bench' not in db['database']:
+            sys.exit(f"Refusing to drop {db['database']!r}: --database must name a bench database")
+        server_db = {k: v for k, v in db.items() if k != 'database'}
+        conn = mysql.connector.connect(**server_db)
+        try:
+            conn.cursor().execute(f"DROP DATABASE IF EXISTS `{db['database']}`")
+        finally:
+            conn.close()
+        shutil.rmtree(args.storage, ignore_errors=True)
+    migrations.create_database(db)
+    conn = mysql.connector.connect(**db)
+    migrations.migrate(conn)
+    return conn
+
+
+def seed(conn, args, store):
+    """Bring the database up to the requested students / doctors / documents."""
+    rng = random.Random(args.seed)
+    cursor = conn.cursor()
+    started = time.perf_counter()
+
+    cursor.execute('SELECT COUNT(*) FROM students')
+    have = cursor.fetchone()[0]
+    sql = ('INSERT IGNORE INTO students (name, age, email, password, blood_group, allergies, '
+           'address, emergency_contacts, student_class, section, roll_number, parent_name) '
+           'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)')
+    for start in range(have, args.students, SEED_BATCH):
+        rows = []
+        for n in range(start, min(start + SEED_BATCH, args.students)):
+            school = n % args.schools + 1
+            first, last = rng.choice(FIRST), rng.choice(LAST)
+            rows.append((f'{first} {last}', rng.randint(5, 18),
+                         f'{first.lower()}.{last.lower()}{n}@school{school}.{BENCH_DOMAIN}',
+                         'bench', rng.choice(BLOOD_GROUPS),
+                         rng.choice(['', '', 'Peanuts', 'Penicillin', 'Dust']),
+                         f'{n} School {school} Road', f'9{n:09d}', rng.choice(CLASSES),
+                         rng.choice(SECTIONS), f'S{school}-{n:06d}',
+                         f'{rng.choice(FIRST)} {last}'))
+        cursor.executemany(sql, rows)
+        conn.commit()
+
+    cursor.execute('SELECT COUNT(*) FROM doctors')
+    have = cursor.fetchone()[0]
+    if have < args.doctors:
+        cursor.executemany(
+            'INSERT IGNORE INTO doctors (name, age, email, password, specialization, experience, '
+            'hospital, contact_number, working_hours, is_verified) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            [(f'Dr {rng.choice(FIRST)} {rng.choice(LAST)}', rng.randint(28, 65),
+              f'doctor{n}@{BENCH_DOMAIN}', 'bench', rng.choice(SPECIALIZATIONS),
+              rng.randint(1, 30), f'City Hospital {n % 5 + 1}', f'8{n:09d}', '09:00-17:00',
+              rng.random() < 0.8)
+             for n in range(have, args.doctors)])
+        conn.commit()
+
+    cursor.execute('SELECT id FROM students ORDER BY id')
+    student_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT COUNT(*) FROM medical_documents')
+    have = cursor.fetchone()[0]
+    for start in range(have, args.documents, SEED_BATCH // 10):
+        rows = []
+        for n in range(start, min(start + SEED_BATCH // 10, args.documents)):
+            filename, content_type, median = rng.choice(DOCUMENT_KINDS)
+            data = os.urandom(document_size(rng, median))
+            # Preview state 'none': seeding should not queue thousands of preview jobs
+            rows.append((rng.choice(student_ids), f'{n}-{filename}', store.put_bytes(data),
+                         content_type, len(data), 'Seeded document', 'none'))
+        cursor.executemany(
+            'INSERT INTO medical_documents (student_id, filename, blob_sha256, content_type, '
+            'size_bytes, description, preview_state) VALUES (%s, %s, %s, %s, %s, %s, %s)', rows)
+        conn.commit()
+        print(f'  seeded {start + len(rows)}/{args.documents} documents', end='\r')
+
+    stats.backfill_doc_counts(cursor)
+    conn.commit()
+    stats.reconcile(conn)
+    print(f'  [OK] {len(student_ids)} students in {args.schools} schools, {args.doctors} doctors, '
+          f'{args.documents} documents ({time.perf_counter() - started:.1f}s)')
+    return student_ids
+
+
+# ── Server under test ────────────────────────────────────────────────────────
+
+def start_server(args, port):
+    """`manage.py serve` on the benchmark database and storage; returns (process, URL)."""
+    storage = os.path.abspath(args.storage)
+    env = dict(
+        os.environ,
+        LIFELINEQR_DB_BACKEND=args.backend,
+        LIFELINEQR_DB_NAME=args.database,
+        LIFELINEQR_SQLITE_PATH=sqlite_path(args),
+        LIFELINEQR_BLOB_STORE=os.path.join(storage, 'blobs'),
+        LIFELINEQR_UPLOAD_DIR=os.path.join(storage, 'uploads'),
+        LIFELINEQR_METRICS_DIR=os.path.join(storage, 'metrics'),
+        LIFELINEQR_JOB_FILES_DIR=os.path.join(storage, 'job-files'),
+        LIFELINEQR_QR_CACHE_DIR=os.path.join(storage, 'qr-cache'),
+        LIFELINEQR_QR_SHEET_DIR=os.path.join(storage, 'qr-sheets'),
+    )
+    command = [sys.executable, os.path.join(ROOT, 'manage.py'), 'serve',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+               '--threads', str(args.threads)]
+    if args.asgi:
+        command.append('--asgi')
+    proc = subprocess.Popen(command, env=env, cwd=ROOT)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f'Server exited with status {proc.returncode} during startup')
+        try:
+            with urllib.request.urlopen(url + '/api/admin/stats', timeout=2) as response:
+                if response.status == 200:
+                    return proc, url
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.25)
+    stop_server(proc)
+    sys.exit('Server did not answer within 60 seconds')
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# ── Scenarios ────────────────────────────────────────────────────────────────
+
+def build_mixes(student_ids, rng):
+    """{scenario: [(Request or function returning one, weight)]}."""
+    token = secrets.token_hex(4)    # emails stay unique across runs on one database
+    counter = itertools.count(1)
+    bodies = []
+    for n in range(UPLOAD_BODIES):
+        filename, content_type, median = DOCUMENT_KINDS[n % len(DOCUMENT_KINDS)]
+        bodies.append((filename, content_type, os.urandom(document_size(rng, median))))
+
+    def student(kind, path):
+        return lambda: loadgen.get(kind, path.format(random.choice(student_ids)))
+
+    def register():
+        n = next(counter)
+        first, last = random.choice(FIRST), random.choice(LAST)
+        return loadgen.post_json('register_student', '/api/register/student', {
+            'name': f'{first} {last}', 'age': random.randint(5, 18),
+            'email': f'new.{token}.{n}@register.{BENCH_DOMAIN}', 'password': 'bench',
+            'blood_group': random.choice(BLOOD_GROUPS), 'student_class': random.choice(CLASSES),
+            'section': random.choice(SECTIONS), 'parent_name': f'{random.choice(FIRST)} {last}',
+        })
+
+    def upload():
+        filename, content_type, body = random.choice(bodies)
+        # A unique tail gives every upload its own blob, as real files would
+        body += f'\n{token}-{next(counter)}'.encode()
+        path = (f'/api/student/{random.choice(student_ids)}/documents'
+                f'?filename={quote(filename)}&description=Benchmark+upload')
+        return loadgen.post('upload_document', path, body, content_type)
+
+    scan = [
+        (student('scan', '/api/scan/{}'), 4),
+        (student('get_student', '/api/student/{}'), 3),
+        (student('get_documents', '/api/student/{}/documents'), 3),
+    ]
+    admin = [
+        (loadgen.get('admin_stats', '/api/admin/stats'), 4),
+        (loadgen.get('admin_students', '/api/admin/students?limit=50'), 2),
+        (loadgen.get('admin_doctors', '/api/admin/doctors?limit=50'), 1),
+    ]
+    mixes = {
+        'scan': scan,
+        'register': [(register, 1)],
+        'upload': [(upload, 1)],
+        'admin': admin,
+    }
+    # A school day: mostly reads, the odd registration and upload
+    mixes['mixed'] = ([(req, w * 20) for req, w in scan] + [(req, w * 2) for req, w in admin]
+                      + [(register, 2), (upload, 3)])
+    return mixes
+
+
+# ── Baselines ────────────────────────────────────────────────────────────────
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _change(old, new):
+    """Percentage change from old to new (None when there is nothing to compare)."""
+    if not old:
+        return None
+    return round((new - old) / old * 100, 1)
+
+
+def compare(baseline, current, threshold):
+    """Print per-endpoint changes against the baseline; returns the regressions."""
+    settings = ('concurrency', 'duration_s', 'students', 'documents', 'workers', 'threads',
+                'backend', 'asgi')
+    for key in settings:
+        old, new = baseline['meta'].get(key), current['meta'].get(key)
+        if old != new:
+            print(f'  [WARN] {key} differs: baseline {old}, current {new}')
+
+    regressions = []
+    for scenario, summary in current['scenarios'].items():
+        base = baseline['scenarios'].get(scenario)
+        if base is None:
+            continue
+        print(f"\n{scenario}: {base['total_rps']} -> {summary['total_rps']} req/s "
+              f"({_change(base['total_rps'], summary['total_rps'])}%)")
+        print(f"  {'endpoint':<22}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}  change %")
+        for name, e in summary['endpoints'].items():
+            b = base['endpoints'].get(name)
+            if b is None:
+                continue
+            changes = {key: _change(b[key], e[key])
+                       for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms')}
+            worse = []
+            if changes['rps'] is not None and changes['rps'] < -threshold:
+                worse.append('req/s')
+            for key in ('p95_ms', 'p99_ms'):
+                if (changes[key] is not None and changes[key] > threshold
+                        and e[key] - b[key] >= MIN_REGRESSION_MS):
+                    worse.append(key[:3])
+            if e['errors'] + e['non_2xx'] > b['errors'] + b['non_2xx']:
+                worse.append('errors')
+            print(f"  {name:<22}" + ''.join(
+                f"{'-' if changes[k] is None else f'{changes[k]:+.1f}':>9}"
+                for k in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'))
+                + (f"  REGRESSED ({', '.join(worse)})" if worse else ''))
+            if worse:
+                regressions.append((scenario, name, worse))
+    return regressions
+
+
+def report(regressions, threshold):
+    """Exit status for a comparison: 1 if anything regressed."""
+    if regressions:
+        print(f'\n  [ERR] {len(regressions)} endpoint(s) regressed by more than {threshold}%')
+        return 1
+    print(f'\n  [OK] No endpoint regressed by more than {threshold}%')
+    return 0
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', help='drive this running server instead of booting one '
+                        '(student ids 1..--students must exist)')
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql',
+                        help='database backend the server runs on')
+    parser.add_argument('--database', default='lifelineqr_bench',
+                        help='MySQL database (or SQLite file name) to seed and serve from')
+    parser.add_argument('--storage', default=os.path.join(ROOT, 'storage', 'bench'),
+                        help='blob store and other server storage for the run')
+    parser.add_argument('--reseed', action='store_true',
+                        help='drop the benchmark database and storage and seed from scratch')
+    parser.add_argument('--schools', type=int, default=4)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=100)
+    parser.add_argument('--documents', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=2, help='server processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per server process')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--asgi', action='store_true', help='serve with `manage.py serve --asgi`')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and mixes')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs='+', metavar='FILE',
+                        help='baseline to compare this run with, or two saved runs')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change in req/s, p95 or p99 counted as a regression')
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite' and args.asgi:
+        parser.error('--asgi needs the MySQL backend')
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes a baseline, or a baseline and a saved run')
+    if args.compare and len(args.compare) == 2:
+        return report(compare(load(args.compare[0]), load(args.compare[1]), args.threshold),
+                      args.threshold)
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    proc = None
+    if args.url:
+        url = args.url
+        student_ids = list(range(1, args.students + 1))
+    else:
+        os.environ['LIFELINEQR_DB_NAME'] = args.database
+        config.load()
+        from blob_store import make_blob_store
+        conn = prepare_database(args)
+        try:
+            student_ids = seed(conn, args, make_blob_store(os.path.join(args.storage, 'blobs')))
+        finally:
+            conn.close()
+        proc, url = start_server(args, args.port)
+
+    mixes = build_mixes(student_ids, rng)
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'url': args.url,
+            'backend': None if args.url else args.backend,
+            'asgi': args.asgi,
+            'workers': None if args.url else args.workers,
+            'threads': None if args.url else args.threads,
+            'schools': args.schools,
+            'students': len(student_ids),
+            'doctors': args.doctors,
+            'documents': args.documents,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'seed': args.seed,
+        },
+        'scenarios': {},
+    }
+    try:
+        for scenario in scenarios:
+            summary = asyncio.run(loadgen.run(url, mixes[scenario], args.concurrency,
+                                              args.duration, args.warmup))
+            loadgen.print_summary(f'{scenario} ({args.concurrency} connections)', summary)
+            results['scenarios'][scenario] = summary
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\n  [OK] Results saved to {args.save}')
+
+    if args.compare:
+        return report(compare(load(args.compare[0]), results, args.threshold), args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
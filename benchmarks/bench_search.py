@@ -0,0 +1,204 @@
+"""
+LifelineQR - /api/search latency benchmark.
+Seeds synthetic students (emails under @bench.invalid) into the configured,
+migrated database until it holds --students rows, then times each kind of
+search query straight against MySQL and, with --http, through a running
+server at the given concurrency:
+
+    python benchmarks/bench_search.py --students 100000 --explain
+    python benchmarks/bench_search.py --http http://127.0.0.1:5000 --concurrency 64
+    python benchmarks/bench_search.py --cleanup
+
+Every query goes through search.py, so it is exactly what the endpoint runs.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mysql.connector  # noqa: E402
+
+import config  # noqa: E402
+import loadgen  # noqa: E402
+import migrations  # noqa: E402
+import search  # noqa: E402
+import stats  # noqa: E402
+
+BENCH_DOMAIN = 'bench.invalid'
+SEED_BATCH = 5000
+
+FIRST = ['Aarav', 'Aditi', 'Anya', 'Arjun', 'Bhavya', 'Dev', 'Diya', 'Esha', 'Farhan', 'Gauri',
+         'Ishaan', 'Kabir', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul', 'Riya', 'Sai', 'Tara',
+         'Vihaan', 'Zoya']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy', 'Gupta', 'Khan', 'Patel', 'Menon', 'Das',
+        'Joshi', 'Kapoor', 'Mehta', 'Rao', 'Singh', 'Pillai', 'Bose', 'Chatterjee']
+CLASSES = [str(n) for n in range(1, 13)]
+SECTIONS = 'ABCDE'
+
+COLUMNS = {c: c for c in ('id', 'name', 'email', 'student_class', 'section', 'roll_number')}
+FILTERS = {'class': ('student_class', str)}
+
+
+def connect():
+    config.load()
+    return mysql.connector.connect(**config.db_config())
+
+
+def seed(conn, target):
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM students')
+    have = cursor.fetchone()[0]
+    if have >= target:
+        print(f'  {have} students already present')
+        return
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM students')
+    next_id = cursor.fetchone()[0] + 1
+    sql = ('INSERT IGNORE INTO students (name, age, email, password, blood_group, '
+           'student_class, section, roll_number, parent_name) '
+           'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)')
+    started = time.perf_counter()
+    need = target - have
+    for start in range(0, need, SEED_BATCH):
+        rows = []
+        for n in range(next_id + start, next_id + min(start + SEED_BATCH, need)):
+            first, last = random.choice(FIRST), random.choice(LAST)
+            rows.append((f'{first} {last}', random.randint(5, 18),
+                         f'{first.lower()}.{last.lower()}{n}@{BENCH_DOMAIN}', 'bench',
+                         random.choice(['A+', 'B+', 'O+', 'AB+', 'O-']),
+                         random.choice(CLASSES), random.choice(SECTIONS), f'R{n:07d}',
+                         f'{random.choice(FIRST)} {last}'))
+        cursor.executemany(sql, rows)
+        conn.commit()
+        print(f'  seeded {start + len(rows)}/{need}', end='\r')
+    stats.reconcile(conn)
+    print(f'  seeded {need} students in {time.perf_counter() - started:.1f}s')
+
+
+def cleanup(conn):
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM students WHERE email LIKE %s', (f'%@{BENCH_DOMAIN}',))
+    conn.commit()
+    stats.reconcile(conn)
+    print(f'  removed {cursor.rowcount} benchmark students')
+
+
+def build_queries(conn, per_kind):
+    """(kind, q, extra query params) samples drawn from rows that exist."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, email, roll_number, parent_name, student_class FROM students '
+                   'ORDER BY RAND() LIMIT %s', (per_kind,))
+    queries = []
+    for name, email, roll, parent, student_class in cursor.fetchall():
+        first, _, last = name.partition(' ')
+        queries += [
+            ('name_prefix', first[:3], {}),
+            ('surname', last or first, {}),
+            ('full_name', name, {}),
+            ('email_exact', email, {}),
+            ('roll_number', roll or first[:4], {}),
+            ('parent_prefix', (parent or name)[:5], {}),
+            ('name_in_class', first[:4], {'class': student_class or '1'}),
+        ]
+    return queries
+
+
+def time_sql(conn, queries, limit):
+    cursor = conn.cursor()
+    latencies, results = {}, {}
+    for kind, q, extra in queries:
+        args = dict(extra, q=q, type='students', limit=limit)
+        page = search.parse_request(args, {'students': COLUMNS}, {'students': FILTERS})
+        started = time.perf_counter()
+        cursor.execute(page.sql, page.params)
+        rows = cursor.fetchall()
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        results.setdefault(kind, []).append(len(rows))
+
+    summary = {}
+    for kind, values in latencies.items():
+        values.sort()
+        summary[kind] = {
+            'queries': len(values),
+            'p50_ms': round(loadgen.percentile(values, 50) * 1000, 2),
+            'p95_ms': round(loadgen.percentile(values, 95) * 1000, 2),
+            'p99_ms': round(loadgen.percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+            'avg_rows': round(sum(results[kind]) / len(results[kind]), 1),
+        }
+    return summary
+
+
+def explain(conn, queries):
+    cursor = conn.cursor(dictionary=True)
+    seen = set()
+    for kind, q, extra in queries:
+        if kind in seen:
+            continue
+        seen.add(kind)
+        page = search.parse_request(dict(extra, q=q), {'students': COLUMNS},
+                                    {'students': FILTERS})
+        cursor.execute('EXPLAIN ' + page.sql, page.params)
+        print(f'\n  {kind} ({q!r})')
+        for row in cursor.fetchall():
+            print(f"    {row['select_type']:<16}{str(row['table']):<20}{str(row['type']):<10}"
+                  f"{str(row['key']):<24}{str(row['rows']):>8}  {row['Extra'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--students', type=int, default=100000,
+                        help='seed until the students table holds this many rows')
+    parser.add_argument('--queries', type=int, default=200, help='samples per query kind')
+    parser.add_argument('--limit', type=int, default=search.DEFAULT_LIMIT)
+    parser.add_argument('--explain', action='store_true', help='print the plan per query kind')
+    parser.add_argument('--http', help='also drive /api/search on this base URL')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--cleanup', action='store_true', help='delete the seeded students')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if migrations.current_version(conn.cursor()) < 3:
+            sys.exit('Run `python manage.py migrate` first (search indexes are migration 3)')
+        if args.cleanup:
+            cleanup(conn)
+            return
+        seed(conn, args.students)
+        queries = build_queries(conn, args.queries)
+        if args.explain:
+            explain(conn, queries)
+
+        results = {'students': args.students, 'sql': time_sql(conn, queries, args.limit)}
+    finally:
+        conn.close()
+
+    print(f"\nsearch SQL ({args.students} students, limit {args.limit})")
+    print(f"  {'query':<16}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'rows':>7}")
+    for kind, s in results['sql'].items():
+        print(f"  {kind:<16}{s['queries']:>6}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}"
+              f"{s['max_ms']:>9}{s['avg_rows']:>7}")
+
+    if args.http:
+        mix = [(loadgen.get(kind, '/api/search?' + urlencode(dict(extra, q=q, limit=args.limit))),
+                1) for kind, q, extra in queries]
+        summary = asyncio.run(loadgen.run(args.http, mix, args.concurrency, args.duration))
+        loadgen.print_summary(f'/api/search over HTTP ({args.concurrency} connections)', summary)
+        results['http'] = summary
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
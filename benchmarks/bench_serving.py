@@ -0,0 +1,81 @@
+"""
+LifelineQR - WSGI vs ASGI serving benchmark.
+Start both modes against the same database, e.g.
+
+    python manage.py serve --bind 127.0.0.1:5000 --workers 2
+    python manage.py serve --asgi --bind 127.0.0.1:5001 --workers 2
+
+then drive the same read mix (emergency scans, profiles, document lists,
+dashboard stats) at each with many concurrent keep-alive connections:
+
+    python benchmarks/bench_serving.py --wsgi http://127.0.0.1:5000 \
+        --asgi http://127.0.0.1:5001 --concurrency 256 --students 1000
+
+Scans hit the in-process cache after the first read of each student; pass
+--scan-ttl-bypass to spread scans over more ids than the cache holds.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+import loadgen
+
+
+def build_mix(students, spread):
+    ids = random.sample(range(1, students + 1), min(students, spread))
+    mix = []
+    for sid in ids:
+        mix += [
+            (loadgen.get('scan', f'/api/scan/{sid}'), 4),
+            (loadgen.get('get_student', f'/api/student/{sid}'), 2),
+            (loadgen.get('get_documents', f'/api/student/{sid}/documents'), 2),
+        ]
+    mix.append((loadgen.get('admin_stats', '/api/admin/stats'), len(ids) // 10 or 1))
+    mix.append((loadgen.get('admin_students', '/api/admin/students?limit=50'),
+                len(ids) // 20 or 1))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--wsgi', help='base URL of `manage.py serve`')
+    parser.add_argument('--asgi', help='base URL of `manage.py serve --asgi`')
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--students', type=int, default=1000,
+                        help='student ids 1..N exist in the target database')
+    parser.add_argument('--spread', type=int, default=200,
+                        help='how many distinct students the mix touches')
+    parser.add_argument('--scan-ttl-bypass', action='store_true',
+                        help='touch every student id so scans mostly miss the cache')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if not (args.wsgi or args.asgi):
+        parser.error('give --wsgi and/or --asgi')
+
+    spread = args.students if args.scan_ttl_bypass else args.spread
+    mix = build_mix(args.students, spread)
+    results = {}
+    for mode, url in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+        if not url:
+            continue
+        summary = asyncio.run(loadgen.run(url, mix, args.concurrency,
+                                          args.duration, args.warmup))
+        loadgen.print_summary(f'{mode} ({url}, {args.concurrency} connections)', summary)
+        results[mode] = summary
+
+    if 'wsgi' in results and 'asgi' in results and results['wsgi']['total_rps']:
+        ratio = results['asgi']['total_rps'] / results['wsgi']['total_rps']
+        print(f'\nasgi / wsgi throughput: {ratio:.2f}x')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
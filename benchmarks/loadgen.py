@@ -0,0 +1,172 @@
+"""
+LifelineQR - Minimal HTTP/1.1 load generator for the benchmarks.
+Keeps ``concurrency`` keep-alive connections busy from one asyncio loop, so a
+single process can offer far more parallel requests than the server under
+test has threads. Standard library only.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+# A mix entry is a Request, or a function returning one for every request
+# sent (unique emails, a random student id, ...)
+Request = namedtuple('Request', 'name method path body content_type', defaults=(None,))
+
+
+def get(name, path):
+    return Request(name, 'GET', path, None)
+
+
+def post_json(name, path, payload):
+    return Request(name, 'POST', path, json.dumps(payload).encode())
+
+
+def post(name, path, body, content_type):
+    return Request(name, 'POST', path, body, content_type)
+
+
+class _Stats:
+    def __init__(self):
+        self.latencies = {}    # request name -> [seconds]
+        self.errors = {}       # request name -> count
+        self.statuses = {}     # (request name, status) -> count
+
+    def record(self, name, status, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.statuses[(name, status)] = self.statuses.get((name, status), 0) + 1
+
+    def error(self, name):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    length, chunked, close = None, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        key, value = key.strip().lower(), value.strip().lower()
+        if key == 'content-length':
+            length = int(value)
+        elif key == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif key == 'connection' and value == 'close':
+            close = True
+
+    size = 0
+    if chunked:
+        while True:
+            chunk = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(chunk + 2)
+            size += chunk
+            if not chunk:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+        size = length
+    else:
+        size = len(await reader.read())
+        close = True
+    return status, size, close
+
+
+async def _client(host, port, requests, weights, deadline, record_after, stats):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        req = random.choices(requests, weights)[0]
+        if callable(req):
+            req = req()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            head = [f'{req.method} {req.path} HTTP/1.1', f'Host: {host}:{port}',
+                    'Connection: keep-alive']
+            if req.body is not None:
+                head += [f'Content-Type: {req.content_type or "application/json"}',
+                         f'Content-Length: {len(req.body)}']
+            started = time.perf_counter()
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + (req.body or b''))
+            await writer.drain()
+            status, _, close = await _read_response(reader)
+            elapsed = time.perf_counter() - started
+            if started >= record_after:
+                stats.record(req.name, status, elapsed)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            if time.perf_counter() >= record_after:
+                stats.error(req.name)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run(base_url, mix, concurrency=64, duration=10.0, warmup=2.0):
+    """Drive ``mix`` ([(Request or function, weight)]) at ``base_url``; returns a summary dict.
+
+    Requests completed during the first ``warmup`` seconds are not recorded.
+    """
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    requests = [r for r, _ in mix]
+    weights = [w for _, w in mix]
+
+    stats = _Stats()
+    start = time.perf_counter()
+    record_after = start + warmup
+    deadline = record_after + duration
+    await asyncio.gather(*(
+        _client(host, port, requests, weights, deadline, record_after, stats)
+        for _ in range(concurrency)
+    ))
+    return summarise(stats, duration)
+
+
+def summarise(stats, duration):
+    endpoints = {}
+    for name in sorted(set(stats.latencies) | set(stats.errors)):
+        values = sorted(stats.latencies.get(name, []))
+        non_2xx = sum(n for (req, status), n in stats.statuses.items()
+                      if req == name and not 200 <= status < 400)
+        endpoints[name] = {
+            'requests': len(values),
+            'rps': round(len(values) / duration, 1),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+            'non_2xx': non_2xx,
+            'errors': stats.errors.get(name, 0),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {'duration_s': duration, 'total_rps': round(total / duration, 1),
+            'endpoints': endpoints}
+
+
+def print_summary(title, summary):
+    print(f"\n{title}: {summary['total_rps']} req/s")
+    print(f"  {'endpoint':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'non-2xx':>9}{'errors':>8}")
+    for name, e in summary['endpoints'].items():
+        print(f"  {name:<22}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}"
+              f"{e['non_2xx']:>9}{e['errors']:>8}")
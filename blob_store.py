@@ -0,0 +1,207 @@
+"""
+LifelineQR - Content-addressed storage for medical document bytes.
+Documents are stored once per SHA-256 digest; MySQL keeps only metadata
+and the digest. Pick a backend with a URL, e.g. ``file:///var/lib/lifelineqr``.
+"""
+
+import base64
+import binascii
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single waitress process, a thread lock is enough
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFound(KeyError):
+    """No blob is stored under the requested digest."""
+
+
+def decode_data_url(value):
+    """Split a ``data:<mime>;base64,<payload>`` string into (bytes, mime).
+
+    Plain base64 without the ``data:`` prefix is accepted too (mime is None).
+    Raises ValueError if the payload is not valid base64.
+    """
+    mime = None
+    if value.startswith('data:'):
+        header, _, value = value.partition(',')
+        mime = header[5:].split(';', 1)[0] or None
+    try:
+        return base64.b64decode(value, validate=True), mime
+    except (binascii.Error, ValueError):
+        raise ValueError('fileData is not valid base64')
+
+
+class BlobStore:
+    """Interface every blob backend implements."""
+
+    def put_bytes(self, data):
+        """Store data and return its hex SHA-256 digest."""
+        raise NotImplementedError
+
+    def put_file(self, path, digest):
+        """Move an already-hashed local file into the store."""
+        raise NotImplementedError
+
+    def lock(self):
+        """Context manager excluding puts; hold it from a reference check to the delete."""
+        raise NotImplementedError
+
+    def open(self, digest):
+        """Return a binary file object for reading the blob."""
+        raise NotImplementedError
+
+    def local_path(self, digest):
+        """Filesystem path of the blob, or None if the backend is not local."""
+        return None
+
+    def exists(self, digest):
+        raise NotImplementedError
+
+    def size(self, digest):
+        raise NotImplementedError
+
+    def delete(self, digest):
+        raise NotImplementedError
+
+    def iter_digests(self):
+        """Yield (digest, mtime) for every stored blob."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under root/ab/cd/<digest>, written atomically.
+
+    A put that finds its blob already stored touches it, so gc-blobs treats it
+    as young again. Puts run under the store lock, so a blob cannot be deleted
+    between a put finding it and the put returning.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._tmp = os.path.join(self.root, 'tmp')
+        self._thread_lock = threading.Lock() if fcntl is None else None
+        os.makedirs(self._tmp, exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self):
+        # Opened per call: a descriptor inherited across fork would be one lock
+        # shared by parent and child
+        with open(os.path.join(self._tmp, '.lock'), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+            else:
+                with self._thread_lock:
+                    yield
+
+    def _path(self, digest):
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            raise BlobNotFound(digest)
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def temp_file(self):
+        """Open a named temp file on the same filesystem as the store."""
+        return tempfile.NamedTemporaryFile(dir=self._tmp, delete=False)
+
+    def put_bytes(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock():
+            if self._touch(digest):
+                return digest
+        with self.temp_file() as tmp:
+            tmp.write(data)
+        return self.put_file(tmp.name, digest)
+
+    def put_file(self, path, digest):
+        with self.lock():
+            if self._touch(digest):
+                os.unlink(path)
+            else:
+                self._move_in(path, digest)
+        return digest
+
+    def _touch(self, digest):
+        """Refresh the blob's mtime if it is stored; returns whether it was."""
+        try:
+            os.utime(self._path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _move_in(self, path, digest):
+        dest = self._path(digest)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.replace(path, dest)
+        except OSError:
+            # Different filesystem: copy next to the destination, then rename
+            tmp = dest + '.part'
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, dest)
+            os.unlink(path)
+
+    def open(self, digest):
+        try:
+            return open(self._path(digest), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def local_path(self, digest):
+        path = self._path(digest)
+        return path if os.path.exists(path) else None
+
+    def exists(self, digest):
+        try:
+            return os.path.exists(self._path(digest))
+        except BlobNotFound:
+            return False
+
+    def size(self, digest):
+        try:
+            return os.path.getsize(self._path(digest))
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def delete(self, digest):
+        try:
+            os.unlink(self._path(digest))
+        except (FileNotFoundError, BlobNotFound):
+            pass
+
+    def iter_digests(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            if dirpath == self._tmp:
+                continue
+            for name in filenames:
+                if len(name) == 64:
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+
+
+_BACKENDS = {
+    'file': lambda url: LocalBlobStore(url.path if url.scheme else url.geturl()),
+    '': lambda url: LocalBlobStore(url.geturl()),
+}
+
+
+def make_blob_store(url):
+    """Build a blob store from a URL or a plain directory path."""
+    parsed = urlparse(url)
+    # Windows drive letters ("C:\\...") parse as a one-letter scheme
+    if len(parsed.scheme) == 1:
+        return LocalBlobStore(url)
+    try:
+        factory = _BACKENDS[parsed.scheme]
+    except KeyError:
+        raise ValueError(f'Unsupported blob store: {url!r}')
+    return factory(parsed)
@@ -0,0 +1,208 @@
+"""
+LifelineQR - Negotiated gzip / brotli response compression.
+Text responses (JSON listings, exports, document metadata) over a size
+threshold are compressed with whichever of br / gzip the client prefers;
+media that is already compressed (JPEG, PDF, ...) is never on the allowlist.
+Streamed bodies are compressed chunk by chunk as they are produced.
+"""
+
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+from werkzeug.http import parse_accept_header
+
+# Content types worth compressing; everything else passes through untouched
+DEFAULT_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+)
+
+# Streamed bodies are flushed to the client at least this often, so a long
+# export still arrives progressively
+FLUSH_BYTES = 64 * 1024
+
+
+class _Encoder:
+    """Incremental gzip or brotli compressor."""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class BodyStream:
+    """Incremental compression of one response body.
+
+    Counters are recorded on ``finish()``, or on ``close()`` for a body the
+    client abandoned.
+    """
+
+    def __init__(self, compressor, endpoint, encoding):
+        self._compressor = compressor
+        self._encoder = compressor._encoder(encoding)
+        self.endpoint = endpoint
+        self.encoding = encoding
+        self.size_in = self.size_out = 0
+        self.seconds = 0.0
+        self._pending = 0
+        self._closed = False
+
+    def compress(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            return b''
+        started = time.perf_counter()
+        out = self._encoder.compress(chunk)
+        self._pending += len(chunk)
+        if self._pending >= FLUSH_BYTES:
+            out += self._encoder.flush()
+            self._pending = 0
+        self._account(len(chunk), len(out), started)
+        return out
+
+    def finish(self):
+        started = time.perf_counter()
+        out = self._encoder.finish()
+        self._account(0, len(out), started)
+        self.close()
+        return out
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._compressor._record(self.endpoint, self.encoding, self.size_in,
+                                     self.size_out, self.seconds)
+
+    def _account(self, size_in, size_out, started):
+        self.seconds += time.perf_counter() - started
+        self.size_in += size_in
+        self.size_out += size_out
+
+
+class ResponseCompressor:
+    """Compression policy plus per-endpoint counters; safe to share between threads.
+
+    min_bytes      -- smaller bodies are sent as they are
+    types          -- content types (without parameters) that may be compressed
+    gzip_level     -- zlib level, 1 (fastest) to 9
+    brotli_quality -- brotli quality, 0 (fastest) to 11
+    """
+
+    def __init__(self, min_bytes=1024, types=DEFAULT_TYPES, gzip_level=6, brotli_quality=4):
+        self.min_bytes = min_bytes
+        self.types = frozenset(t.strip().lower() for t in types if t.strip())
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli else ('gzip',)
+
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def negotiate(self, accept_encoding):
+        """The encoding to use for this Accept-Encoding header, or None."""
+        if not accept_encoding:
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compressible(self, status, content_type, content_encoding=None):
+        """Whether a response of this status and type may be compressed at all.
+
+        Partial content is excluded: byte ranges refer to the unencoded file.
+        """
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        return (200 <= status < 300 and status not in (204, 206)
+                and not content_encoding and content_type in self.types)
+
+    def compress(self, endpoint, data, encoding):
+        """Compress a complete body."""
+        started = time.perf_counter()
+        encoder = self._encoder(encoding)
+        out = encoder.compress(data) + encoder.finish()
+        self._record(endpoint, encoding, len(data), len(out), time.perf_counter() - started)
+        return out
+
+    def stream(self, endpoint, encoding):
+        """A BodyStream to push one streamed body through."""
+        return BodyStream(self, endpoint, encoding)
+
+    def compress_stream(self, endpoint, chunks, encoding):
+        """Generator compressing an iterable of str / bytes chunks as it is consumed.
+
+        Closing the generator closes ``chunks``.
+        """
+        stream = self.stream(endpoint, encoding)
+        try:
+            for chunk in chunks:
+                out = stream.compress(chunk)
+                if out:
+                    yield out
+            yield stream.finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            stream.close()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, c in sorted(self._endpoints.items()):
+                endpoints[endpoint] = dict(
+                    c,
+                    ratio=round(c['bytes_out'] / c['bytes_in'], 4) if c['bytes_in'] else 0.0,
+                    seconds=round(c['seconds'], 6),
+                )
+            return {
+                'encodings': list(self.encodings),
+                'min_bytes': self.min_bytes,
+                'endpoints': endpoints,
+            }
+
+    def _encoder(self, encoding):
+        return _Encoder(encoding, self.gzip_level, self.brotli_quality)
+
+    def _record(self, endpoint, encoding, size_in, size_out, seconds):
+        with self._lock:
+            c = self._endpoints.get(endpoint)
+            if c is None:
+                c = self._endpoints[endpoint] = {
+                    'responses': 0, 'gzip': 0, 'br': 0,
+                    'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0,
+                }
+            c['responses'] += 1
+            c[encoding] += 1
+            c['bytes_in'] += size_in
+            c['bytes_out'] += size_out
+            c['seconds'] += seconds
@@ -0,0 +1,94 @@
+"""
+LifelineQR - Backend configuration.
+Settings are LIFELINEQR_* environment variables, optionally seeded from a
+KEY=VALUE file (``lifelineqr.env`` next to server.py, or the path in
+LIFELINEQR_CONFIG). Variables already set in the environment always win.
+"""
+
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(BASE_DIR, 'lifelineqr.env')
+
+
+def config_path():
+    return os.environ.get('LIFELINEQR_CONFIG') or DEFAULT_PATH
+
+
+def read_env_file(path):
+    """Parse KEY=VALUE lines; blank lines and # comments are ignored."""
+    values = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, _, value = line.partition('=')
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            values[key.strip()] = value
+    return values
+
+
+def write_env_file(path, values):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# LifelineQR backend settings (environment variables override these)\n')
+        for key, value in values.items():
+            f.write(f'{key}={value}\n')
+
+
+def load(path=None):
+    """Copy settings from the config file into os.environ (without overriding).
+
+    Returns the file that was read, or None if there was none.
+    """
+    path = path or config_path()
+    if not os.path.exists(path):
+        return None
+    for key, value in read_env_file(path).items():
+        os.environ.setdefault(key, value)
+    return path
+
+
+def db_config():
+    """mysql.connector keyword arguments for the application database."""
+    return {
+        'host': os.environ.get('LIFELINEQR_DB_HOST', 'localhost'),
+        'port': int(os.environ.get('LIFELINEQR_DB_PORT', 3306)),
+        'user': os.environ.get('LIFELINEQR_DB_USER', 'root'),
+        'password': os.environ.get('LIFELINEQR_DB_PASSWORD', ''),
+        'database': os.environ.get('LIFELINEQR_DB_NAME', 'lifelineqr'),
+    }
+
+
+def db_backend():
+    """'mysql' (default) or 'sqlite', the embedded single-machine backend (sqlite_db.py)."""
+    backend = os.environ.get('LIFELINEQR_DB_BACKEND', 'mysql').strip().lower()
+    if backend not in ('mysql', 'sqlite'):
+        raise ValueError(f'LIFELINEQR_DB_BACKEND must be mysql or sqlite, not {backend!r}')
+    return backend
+
+
+def sqlite_path():
+    return os.environ.get('LIFELINEQR_SQLITE_PATH') or os.path.join(
+        BASE_DIR, 'storage', 'lifelineqr.sqlite3')
+
+
+def replica_config():
+    """mysql.connector keyword arguments for the read replica, or None without one.
+
+    Only LIFELINEQR_DB_REPLICA_HOST is required; the port, user, password
+    and database name default to the primary's.
+    """
+    host = os.environ.get('LIFELINEQR_DB_REPLICA_HOST')
+    if not host:
+        return None
+    primary = db_config()
+    return {
+        'host': host,
+        'port': int(os.environ.get('LIFELINEQR_DB_REPLICA_PORT', primary['port'])),
+        'user': os.environ.get('LIFELINEQR_DB_REPLICA_USER', primary['user']),
+        'password': os.environ.get('LIFELINEQR_DB_REPLICA_PASSWORD', primary['password']),
+        'database': os.environ.get('LIFELINEQR_DB_REPLICA_NAME', primary['database']),
+    }
@@ -0,0 +1,328 @@
+"""
+LifelineQR - MySQL connection pool
+Keeps a bounded set of live connections so request handlers reuse them
+instead of paying a TCP + auth handshake on every request. Cursors handed
+out are wrapped to add the time spent in each database call to a per-thread
+QueryTimer, which the request metrics read, and to the SQL profile of the
+request when profiling is on (sql_profile.py).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors
+
+
+class PoolExhausted(errors.PoolError):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class QueryTimer(threading.local):
+    """Time spent in database calls by the current thread since its last ``reset``.
+
+    ``profile`` is the thread's sql_profile.RequestProfile while its request
+    is being profiled, else None.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self.profile = None
+
+    def reset(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+
+class TimedCursor:
+    """Cursor wrapper that adds the time of every execute and fetch to a QueryTimer."""
+
+    def __init__(self, cursor, timer):
+        self._cursor = cursor
+        self._timer = timer
+        self._statement = None    # profiled statement the next fetches belong to
+
+    def _timed(self, func, args, kwargs, query=False, many=False):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timer = self._timer
+            timer.seconds += elapsed
+            if query:
+                timer.queries += 1
+            if timer.profile is not None:
+                if query:
+                    self._statement = timer.profile.record(
+                        args, kwargs, elapsed, self._cursor.rowcount, many)
+                elif self._statement is not None:
+                    self._statement.update(elapsed, self._cursor.rowcount)
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, args, kwargs, query=True)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, args, kwargs, query=True, many=True)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone, (), {})
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._cursor.fetchmany, args, kwargs)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall, (), {})
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """A checked-out connection. Closing it returns it to the pool."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._cursors = []
+        self.created_at = created_at
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        self._cursors.append(cursor)
+        return TimedCursor(cursor, self._pool.timer)
+
+    def commit(self):
+        if self._raw is None:
+            raise errors.OperationalError('Connection already returned to the pool')
+        start = time.perf_counter()
+        try:
+            self._raw.commit()
+        finally:
+            elapsed = time.perf_counter() - start
+            timer = self._pool.timer
+            timer.seconds += elapsed
+            if timer.profile is not None:
+                timer.profile.record(('COMMIT',), {}, elapsed, -1)
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)."""
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        cursors, self._cursors = self._cursors, []
+        self._pool._release(raw, self.created_at, cursors)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise errors.OperationalError('Connection already returned to the pool')
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Thread-safe LIFO pool of mysql.connector connections.
+
+    size       -- maximum number of open connections
+    timeout    -- seconds a checkout may wait for a free connection
+    recycle    -- connections older than this many seconds are reopened
+    pre_ping   -- ping idle connections on checkout before handing them out
+    ping_grace -- skip the ping if the connection was returned this recently
+    timer      -- QueryTimer to record query time into (shared by pools serving one request)
+    """
+
+    def __init__(self, config, size=10, timeout=10.0, recycle=1800,
+                 pre_ping=True, ping_grace=1.0, timer=None):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_grace = ping_grace
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (raw, created_at, returned_at)
+        self._open = 0
+        self._in_use = 0
+        self._pid = os.getpid()
+        self.timer = timer if timer is not None else QueryTimer()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._exhausted = 0
+        self._timeouts = 0
+        self._connects = 0
+        self._recycled = 0
+        self._invalidated = 0
+
+    # ── Checkout / return ────────────────────────────────────────────────
+
+    def connection(self):
+        """Check out a connection; use it as a context manager."""
+        self._check_pid()
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, returned_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    raw, created_at, returned_at = None, None, None
+                    break
+                if not waited:
+                    self._exhausted += 1
+                    waited = True
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolExhausted(
+                        f'No database connection free after {self.timeout}s '
+                        f'(pool size {self.size})')
+                self._cond.wait(remaining)
+
+            wait = time.perf_counter() - start
+            self._checkouts += 1
+            self._in_use += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            if raw is not None:
+                raw = self._validate(raw, created_at, returned_at)
+            if raw is None:
+                raw = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at, cursors):
+        for cursor in cursors:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            # Ends any open transaction so the next borrower gets a fresh snapshot
+            raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and os.getpid() == self._pid:
+                self._idle.append((raw, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+                self._invalidated += 1
+                self._close_quietly(raw)
+            self._cond.notify()
+
+    def _validate(self, raw, created_at, returned_at):
+        """Return raw if still usable, otherwise close it and return None."""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._close_quietly(raw)
+            with self._cond:
+                self._recycled += 1
+            return None
+        if self.pre_ping and time.monotonic() - returned_at > self.ping_grace:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._close_quietly(raw)
+                with self._cond:
+                    self._invalidated += 1
+                return None
+        return raw
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._connects += 1
+        return raw
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    def _check_pid(self):
+        """Drop connections inherited across fork(); they belong to the parent."""
+        if os.getpid() == self._pid:
+            return
+        with self._cond:
+            if os.getpid() != self._pid:
+                self._idle.clear()
+                self._open = 0
+                self._in_use = 0
+                self._pid = os.getpid()
+
+    def after_fork(self):
+        """Start afresh in a forked worker (call from the server's post-fork hook).
+
+        Inherited connections are forgotten, not closed: closing them would
+        end the parent's sessions on the shared sockets. The condition is
+        recreated in case another thread held it at fork time, and the
+        counters start from zero so stats() describes this worker alone.
+        """
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._reset_stats()
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on return)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        """Snapshot of pool occupancy and lifetime counters."""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+                'exhausted': self._exhausted,
+                'timeouts': self._timeouts,
+                'connects': self._connects,
+                'recycled': self._recycled,
+                'invalidated': self._invalidated,
+            }
@@ -0,0 +1,291 @@
+"""
+LifelineQR - Signed emergency payload carried inside the QR code itself.
+The vital fields of a student's profile are packed into a compact binary
+record, deflated when that helps, signed with Ed25519 and base45-encoded, so
+a scan can show them with no network at all; anyone holding the public key
+can check the data came from this server and was not edited.
+
+Text format (base45 keeps to the QR alphanumeric character set):
+
+    LQR1:<base45(header | body | signature)>
+
+    header     version (1 byte), flags (1 byte), key id (4 bytes)
+    body       varint student id, varint issued-at (unix minutes),
+               blood group code (1 byte, 0xFF = string follows),
+               then name, allergies, medical conditions, regular medications
+               and emergency contacts as varint-length UTF-8 strings;
+               raw-deflated when flags & FLAG_DEFLATE
+    signature  Ed25519 over header | body, 64 bytes
+
+js/emergency-payload.js is the browser decoder for the same format.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import (Ed25519PrivateKey,
+                                                                   Ed25519PublicKey)
+except ImportError:  # optional; payloads cannot be issued or verified without it
+    Ed25519PrivateKey = Ed25519PublicKey = InvalidSignature = serialization = None
+
+PREFIX = 'LQR1:'
+VERSION = 1
+FLAG_DEFLATE = 0x01
+HEADER_BYTES = 6
+SIGNATURE_BYTES = 64
+
+# Longest UTF-8 value kept per free-text field. With every field at the cap
+# the text stays under ~1200 characters, inside a version 40 QR code even at
+# error correction level H.
+MAX_FIELD_BYTES = 120
+# Inflated bodies larger than this are rejected rather than decompressed
+MAX_BODY_BYTES = 4096
+
+# Profile columns a payload is built from; update_student regenerates it when
+# any of the editable ones change
+FIELDS = ('name', 'blood_group', 'allergies', 'medical_conditions',
+          'regular_medications', 'emergency_contacts')
+TEXT_FIELDS = ('name', 'allergies', 'medical_conditions', 'regular_medications',
+               'emergency_contacts')
+
+# Blood group codes 1-8; 0 = not recorded, 0xFF = other text follows
+BLOOD_GROUPS = ('', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+_BLOOD_OTHER = 0xFF
+
+_BASE45 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+_BASE45_INDEX = {c: i for i, c in enumerate(_BASE45)}
+
+
+class PayloadError(ValueError):
+    """Malformed, tampered or unverifiable payload text."""
+
+
+# ── base45 (RFC 9285) ────────────────────────────────────────────────────────
+
+def b45encode(data):
+    out = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        out += [_BASE45[c], _BASE45[d], _BASE45[e]]
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        out += [_BASE45[c], _BASE45[d]]
+    return ''.join(out)
+
+
+def b45decode(text):
+    try:
+        values = [_BASE45_INDEX[c] for c in text]
+    except KeyError:
+        raise PayloadError('Invalid base45 character')
+    if len(values) % 3 == 1:
+        raise PayloadError('Invalid base45 length')
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        n = sum(v * 45 ** k for k, v in enumerate(chunk))
+        if len(chunk) == 3:
+            if n > 0xFFFF:
+                raise PayloadError('Invalid base45 group')
+            out.extend(divmod(n, 256))
+        else:
+            if n > 0xFF:
+                raise PayloadError('Invalid base45 group')
+            out.append(n)
+    return bytes(out)
+
+
+# ── Body serialisation ───────────────────────────────────────────────────────
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise PayloadError('Truncated payload')
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return n, pos
+
+
+def _string(value):
+    """varint length + UTF-8, cut to MAX_FIELD_BYTES on a character boundary."""
+    raw = ' '.join(str(value or '').split()).encode('utf-8')
+    if len(raw) > MAX_FIELD_BYTES:
+        raw = raw[:MAX_FIELD_BYTES - 3].decode('utf-8', 'ignore').encode('utf-8') + '…'.encode()
+    return _varint(len(raw)) + raw
+
+
+def _read_string(data, pos):
+    length, pos = _read_varint(data, pos)
+    if pos + length > len(data):
+        raise PayloadError('Truncated payload')
+    try:
+        return data[pos:pos + length].decode('utf-8'), pos + length
+    except UnicodeDecodeError:
+        raise PayloadError('Invalid UTF-8 in payload')
+
+
+def pack_body(student, issued_at=None):
+    issued_at = int((time.time() if issued_at is None else issued_at) // 60)
+    blood_group = (student.get('blood_group') or '').strip().upper()
+    out = bytearray(_varint(student['id']) + _varint(issued_at))
+    if blood_group in BLOOD_GROUPS:
+        out.append(BLOOD_GROUPS.index(blood_group))
+    else:
+        out.append(_BLOOD_OTHER)
+        out += _string(blood_group)
+    for field in TEXT_FIELDS:
+        out += _string(student.get(field))
+    return bytes(out)
+
+
+def unpack_body(data):
+    student_id, pos = _read_varint(data, 0)
+    issued_at, pos = _read_varint(data, pos)
+    if pos >= len(data):
+        raise PayloadError('Truncated payload')
+    code, pos = data[pos], pos + 1
+    if code == _BLOOD_OTHER:
+        blood_group, pos = _read_string(data, pos)
+    elif code < len(BLOOD_GROUPS):
+        blood_group = BLOOD_GROUPS[code]
+    else:
+        raise PayloadError('Unknown blood group code')
+
+    fields = {'id': student_id, 'blood_group': blood_group,
+              'issued_at': datetime.fromtimestamp(issued_at * 60, timezone.utc)}
+    for field in TEXT_FIELDS:
+        fields[field], pos = _read_string(data, pos)
+    if pos != len(data):
+        raise PayloadError('Trailing bytes in payload')
+    return fields
+
+
+# ── Signing and verification ─────────────────────────────────────────────────
+
+def _require_crypto():
+    if Ed25519PrivateKey is None:
+        raise RuntimeError('Emergency payloads need the cryptography package '
+                           '(pip install cryptography)')
+
+
+def key_id(public_raw):
+    """First 4 bytes of the SHA-256 of a raw 32-byte Ed25519 public key."""
+    return hashlib.sha256(public_raw).digest()[:4]
+
+
+def generate_key(path):
+    """Write a new Ed25519 private key to ``path`` (PEM, owner-only) and return its signer."""
+    _require_crypto()
+    private = Ed25519PrivateKey.generate()
+    pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pem)
+    return PayloadSigner(private)
+
+
+class PayloadSigner:
+    """Issues payloads under one private key."""
+
+    def __init__(self, private_key):
+        _require_crypto()
+        self._private = private_key
+        self.public_raw = private_key.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        self.key_id = key_id(self.public_raw)
+
+    @classmethod
+    def from_file(cls, path):
+        _require_crypto()
+        with open(path, 'rb') as f:
+            private = serialization.load_pem_private_key(f.read(), password=None)
+        if not isinstance(private, Ed25519PrivateKey):
+            raise ValueError(f'{path} is not an Ed25519 private key')
+        return cls(private)
+
+    def encode(self, student, issued_at=None):
+        """Payload text for a row holding ``id`` plus FIELDS."""
+        body = pack_body(student, issued_at)
+        flags = 0
+        deflater = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        packed = deflater.compress(body) + deflater.flush()
+        if len(packed) < len(body):
+            body, flags = packed, FLAG_DEFLATE
+        signed = bytes([VERSION, flags]) + self.key_id + body
+        return PREFIX + b45encode(signed + self._private.sign(signed))
+
+
+def _split(text):
+    text = (text or '').strip()
+    if not text.upper().startswith(PREFIX):
+        raise PayloadError('Not an emergency payload')
+    raw = b45decode(text[len(PREFIX):].upper())
+    if len(raw) < HEADER_BYTES + SIGNATURE_BYTES:
+        raise PayloadError('Truncated payload')
+    if raw[0] != VERSION:
+        raise PayloadError(f'Unsupported payload version {raw[0]}')
+    return raw[:-SIGNATURE_BYTES], raw[-SIGNATURE_BYTES:]
+
+
+def key_id_of(text):
+    """Hex id of the key that signed ``text`` (nothing is verified)."""
+    signed, _ = _split(text)
+    return signed[2:HEADER_BYTES].hex()
+
+
+def decode(text, public_keys):
+    """Verify ``text`` against any of ``public_keys`` (raw 32-byte keys) and unpack it.
+
+    The signature is checked before anything is inflated or parsed. Returns
+    the profile fields plus ``issued_at`` (aware datetime) and ``key_id``.
+    """
+    _require_crypto()
+    signed, signature = _split(text)
+    flags, kid = signed[1], signed[2:HEADER_BYTES]
+
+    for public_raw in public_keys:
+        if key_id(public_raw) != kid:
+            continue
+        try:
+            Ed25519PublicKey.from_public_bytes(public_raw).verify(signature, signed)
+        except InvalidSignature:
+            raise PayloadError('Signature does not match')
+        break
+    else:
+        raise PayloadError(f'Signed by unknown key {kid.hex()}')
+
+    body = signed[HEADER_BYTES:]
+    if flags & FLAG_DEFLATE:
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(body, MAX_BODY_BYTES)
+        except zlib.error:
+            raise PayloadError('Corrupt compressed body')
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise PayloadError('Corrupt compressed body')
+    fields = unpack_body(body)
+    fields['key_id'] = kid.hex()
+    return fields
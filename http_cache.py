@@ -0,0 +1,55 @@
+"""
+LifelineQR - Conditional GET helpers.
+Profiles and document lists carry version counters on the students row and
+stored documents never change, so a validator costs one primary-key lookup;
+a matching If-None-Match / If-Modified-Since is answered with 304 before the
+payload itself is read. Shared by server.py and asgi.py.
+"""
+
+from werkzeug.http import http_date, quote_etag
+from werkzeug.sansio.http import is_resource_modified
+
+# Clients may keep a copy but must check back before reusing it
+REVALIDATE = 'private, no-cache'
+# Blob-backed document bytes are addressed by their sha256 and never change
+IMMUTABLE = 'private, max-age=31536000, immutable'
+
+# (version, last modified) of a student's profile / document list
+STUDENT_VERSION_SQL = ('SELECT version, COALESCE(updated_at, created_at) '
+                       'FROM students WHERE id = %s')
+DOCUMENTS_VERSION_SQL = ('SELECT docs_version, COALESCE(docs_updated_at, created_at) '
+                         'FROM students WHERE id = %s')
+
+
+def student_etag(student_id, version):
+    return f'student-{student_id}-v{version}'
+
+
+def documents_etag(student_id, version):
+    return f'documents-{student_id}-v{version}'
+
+
+def document_etag(doc):
+    """Documents are immutable once stored (legacy inline rows have no digest);
+    only their previews appear later. Metadata responses carry this ETag and
+    no Last-Modified, since uploaded_at does not move when the previews land."""
+    return (f"document-{doc['id']}-{doc['blob_sha256'] or 'inline'}"
+            f"-{doc.get('preview_state') or 'pending'}")
+
+
+def not_modified(headers, etag, last_modified=None):
+    """True if the validators in the request ``headers`` match the current version."""
+    return not is_resource_modified(
+        http_if_modified_since=headers.get('If-Modified-Since'),
+        http_if_none_match=headers.get('If-None-Match'),
+        etag=etag,
+        last_modified=last_modified,
+    )
+
+
+def validator_headers(etag, last_modified=None):
+    """ETag / Last-Modified / Cache-Control for a 200 or 304 response."""
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': REVALIDATE}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
@@ -0,0 +1,383 @@
+"""
+LifelineQR - Durable background jobs kept in the MySQL ``jobs`` table.
+Work that should not run on a request thread is enqueued as a row; worker
+threads in any server (or `manage.py jobs-worker`) process claim rows with
+SELECT ... FOR UPDATE SKIP LOCKED, hold them under a lease they keep
+renewing, and retry failures with exponential backoff. A job whose worker
+died is requeued once its lease runs out, so nothing is lost on restart.
+"""
+
+import json
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+# jobs.state
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+STATES = (QUEUED, RUNNING, DONE, FAILED)
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry n waits BACKOFF_BASE * 2**(n-1) seconds, capped, with +/-50% jitter
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+# Progress is written at most this often (and always on the last item)
+PROGRESS_INTERVAL = 0.5
+MAX_ERROR_CHARS = 2000
+
+STATUS_COLUMNS = ('id, kind, state, priority, idempotency_key, attempts, max_attempts, '
+                  'progress_done, progress_total, result, error, run_after, created_at, '
+                  'started_at, finished_at')
+
+
+class PermanentFailure(Exception):
+    """Raised by a handler for errors retrying cannot fix; the job fails at once."""
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return int(delay * random.uniform(0.5, 1.5))
+
+
+def _row(row):
+    """A jobs row as returned by status() / recent(), JSON parsed, times as ISO 8601."""
+    row = dict(row)
+    row['result'] = json.loads(row['result']) if row['result'] else None
+    row['progress'] = {'done': row.pop('progress_done'), 'total': row.pop('progress_total')}
+    for key in ('run_after', 'created_at', 'started_at', 'finished_at'):
+        if isinstance(row[key], datetime):
+            row[key] = row[key].isoformat()
+    return row
+
+
+class Job:
+    """What a handler receives: the job's id, kind, payload and attempt number."""
+
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row['id']
+        self.kind = row['kind']
+        self.payload = json.loads(row['payload']) if row['payload'] else {}
+        self.attempts = row['attempts']
+        self.max_attempts = row['max_attempts']
+        self._last_progress = 0.0
+
+    def progress(self, done, total=None):
+        """Record how far along the job is; writes are throttled to PROGRESS_INTERVAL."""
+        now = time.monotonic()
+        if done != total and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        with self.queue.get_db() as conn:
+            conn.cursor().execute(
+                'UPDATE jobs SET progress_done = %s, progress_total = %s '
+                'WHERE id = %s AND locked_by = %s', (done, total, self.id, self.queue.worker_id))
+            conn.commit()
+
+
+class JobQueue:
+    """Enqueues jobs and, once started, runs the kinds registered with it.
+
+    get_db        -- callable returning a pooled connection context manager
+    threads       -- worker threads started by ``start`` (0 = enqueue only)
+    lease_seconds -- how long a claimed job is held without a heartbeat
+    poll_seconds  -- idle wait between looks at the table
+
+    Handlers are ``func(job)`` and return a JSON-serialisable result (or
+    None). Any exception other than PermanentFailure is retried with backoff
+    until the job's max_attempts is used up.
+    """
+
+    def __init__(self, get_db, threads=2, lease_seconds=300, poll_seconds=2.0):
+        self.get_db = get_db
+        self.threads = max(0, threads)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(2)}'
+        self._handlers = {}
+        self._schedules = []
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._counts = {'claimed': 0, 'done': 0, 'retried': 0, 'failed': 0, 'requeued': 0}
+        self._seconds = 0.0
+
+    # ── Registration ─────────────────────────────────────────────────────────
+
+    def register(self, kind, func, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self._handlers[kind] = (func, max_attempts)
+
+    def every(self, seconds, kind, payload=None, priority=0):
+        """Enqueue ``kind`` once per ``seconds`` across every process sharing the table.
+
+        Each period's job carries the idempotency key ``every:<kind>:<period>``,
+        so however many schedulers are running only one of them inserts it.
+        """
+        if seconds > 0:
+            self._schedules.append({'seconds': seconds, 'kind': kind, 'payload': payload,
+                                    'priority': priority, 'last': None})
+
+    # ── Enqueueing ───────────────────────────────────────────────────────────
+
+    def enqueue(self, kind, payload=None, priority=0, idempotency_key=None, delay=0,
+                max_attempts=None, conn=None):
+        """Add a job; returns its id.
+
+        Higher ``priority`` runs first. A job with the ``idempotency_key`` of
+        an existing one is not added again: the existing id is returned. Pass
+        ``conn`` to insert inside the caller's transaction (the caller
+        commits), so the job exists exactly when the caller's writes do.
+        """
+        if max_attempts is None:
+            max_attempts = self._handlers.get(kind, (None, DEFAULT_MAX_ATTEMPTS))[1]
+        params = (kind, json.dumps(payload if payload is not None else {}), priority,
+                  idempotency_key, max_attempts, delay)
+        if conn is not None:
+            return self._insert(conn.cursor(), params)
+        with self.get_db() as conn:
+            job_id = self._insert(conn.cursor(), params)
+            conn.commit()
+        self._wake.set()
+        return job_id
+
+    def notify(self):
+        """Wake idle workers in this process, e.g. after committing jobs enqueued with ``conn``."""
+        self._wake.set()
+
+    def _insert(self, cursor, params):
+        cursor.execute('INSERT IGNORE INTO jobs (kind, payload, priority, idempotency_key, '
+                       'max_attempts, run_after) '
+                       'VALUES (%s, %s, %s, %s, %s, DATE_ADD(NOW(), INTERVAL %s SECOND))', params)
+        if cursor.rowcount:
+            return cursor.lastrowid
+        # Ignored: a job with this idempotency key already exists
+        cursor.execute('SELECT id FROM jobs WHERE idempotency_key = %s', (params[3],))
+        return cursor.fetchone()[0]
+
+    def retry(self, job_id):
+        """Requeue a failed job with fresh attempts; False unless it had failed."""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE jobs SET state = 'queued', attempts = 0, run_after = NOW(), "
+                           'error = NULL, locked_by = NULL, finished_at = NULL '
+                           'WHERE id = %s AND state = %s',
+                           (job_id, FAILED))
+            conn.commit()
+            retried = cursor.rowcount > 0
+        self._wake.set()
+        return retried
+
+    # ── Inspection ───────────────────────────────────────────────────────────
+
+    def status(self, job_id):
+        """State, progress and result of a job; None if there is no such job."""
+        with self.get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f'SELECT {STATUS_COLUMNS} FROM jobs WHERE id = %s', (job_id,))
+            row = cursor.fetchone()
+        return _row(row) if row else None
+
+    def recent(self, state=None, kind=None, limit=50):
+        """Newest jobs first, optionally of one state and/or kind."""
+        where, params = [], []
+        if state:
+            where.append('state = %s')
+            params.append(state)
+        if kind:
+            where.append('kind = %s')
+            params.append(kind)
+        sql = f'SELECT {STATUS_COLUMNS} FROM jobs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        with self.get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql + ' ORDER BY id DESC LIMIT %s', params + [limit])
+            return [_row(row) for row in cursor.fetchall()]
+
+    def counts(self):
+        """{state: {kind: n}} over the whole table."""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT state, kind, COUNT(*) FROM jobs GROUP BY state, kind')
+            out = {state: {} for state in STATES}
+            for state, kind, n in cursor.fetchall():
+                out.setdefault(state, {})[kind] = n
+        return out
+
+    def stats(self):
+        """Counters for the jobs this process has run."""
+        with self._lock:
+            return dict(self._counts, worker_id=self.worker_id, threads=len(self._workers),
+                        kinds=sorted(self._handlers), run_seconds=round(self._seconds, 6))
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    # ── Workers ──────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the worker, heartbeat and scheduler threads (no-op with 0 threads)."""
+        if self._workers or not self.threads:
+            return
+        for n in range(self.threads):
+            self._spawn(self._work, f'jobs-{n}')
+        self._spawn(self._heartbeat, 'jobs-heartbeat')
+        self._spawn(self._schedule, 'jobs-scheduler')
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=self._loop, args=(target,), name=name, daemon=True)
+        thread.start()
+        self._workers.append(thread)
+
+    def stop(self, timeout=None):
+        """Stop taking jobs and wait for running ones to finish.
+
+        Jobs still running after ``timeout`` keep their lease until it
+        expires, then go back to the queue.
+        """
+        self._stopped.set()
+        self._wake.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._workers:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        self._workers = []
+
+    def _loop(self, target):
+        while not self._stopped.is_set():
+            try:
+                if target():
+                    continue
+            except mysql.connector.Error as err:
+                print(f'  [ERR] Job queue: {err}')
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _work(self):
+        """Claim and run one job; True if there was one (so look again at once)."""
+        row = self._claim()
+        if row is None:
+            return False
+        self._run(Job(self, row))
+        return True
+
+    def _claim(self):
+        if not self._handlers:
+            return None
+        kinds = list(self._handlers)
+        with self.get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            # Rows other workers hold are skipped rather than waited on
+            cursor.execute(
+                'SELECT id, kind, payload, attempts, max_attempts FROM jobs '
+                "WHERE state = 'queued' AND run_after <= NOW() "
+                f"AND kind IN ({', '.join(['%s'] * len(kinds))}) "
+                'ORDER BY priority DESC, run_after, id LIMIT 1 FOR UPDATE SKIP LOCKED', kinds)
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            cursor.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, "
+                           'locked_by = %s, locked_until = DATE_ADD(NOW(), INTERVAL %s SECOND), '
+                           'started_at = COALESCE(started_at, NOW()) WHERE id = %s',
+                           (self.worker_id, self.lease_seconds, row['id']))
+            conn.commit()
+        row['attempts'] += 1
+        self._count('claimed')
+        return row
+
+    def _run(self, job):
+        func, _ = self._handlers[job.kind]
+        started = time.perf_counter()
+        try:
+            result = func(job)
+        except Exception as err:
+            error = f'{type(err).__name__}: {err}'[:MAX_ERROR_CHARS]
+            print(f'  [ERR] Job {job.id} ({job.kind}) attempt {job.attempts}: {error}')
+            self._failed(job, error, permanent=isinstance(err, PermanentFailure))
+        else:
+            self._finish(job.id, 'state = %s, result = %s, error = NULL',
+                         (DONE, json.dumps(result) if result is not None else None))
+            self._count('done')
+        with self._lock:
+            self._seconds += time.perf_counter() - started
+
+    def _failed(self, job, error, permanent):
+        if permanent or job.attempts >= job.max_attempts:
+            self._finish(job.id, 'state = %s, error = %s', (FAILED, error))
+            self._count('failed')
+            return
+        with self.get_db() as conn:
+            conn.cursor().execute(
+                "UPDATE jobs SET state = 'queued', error = %s, locked_by = NULL, "
+                'locked_until = NULL, run_after = DATE_ADD(NOW(), INTERVAL %s SECOND) '
+                'WHERE id = %s AND locked_by = %s',
+                (error, backoff(job.attempts), job.id, self.worker_id))
+            conn.commit()
+        self._count('retried')
+
+    def _finish(self, job_id, assignments, params):
+        # Guarded by locked_by: a worker whose lease expired and was requeued
+        # must not overwrite the outcome of whoever holds the job now
+        with self.get_db() as conn:
+            conn.cursor().execute(
+                f'UPDATE jobs SET {assignments}, locked_by = NULL, locked_until = NULL, '
+                'finished_at = NOW() WHERE id = %s AND locked_by = %s',
+                params + (job_id, self.worker_id))
+            conn.commit()
+
+    def _heartbeat(self):
+        """Extend the lease on every job this process is running."""
+        with self.get_db() as conn:
+            conn.cursor().execute(
+                'UPDATE jobs SET locked_until = DATE_ADD(NOW(), INTERVAL %s SECOND) '
+                "WHERE locked_by = %s AND state = 'running'", (self.lease_seconds, self.worker_id))
+            conn.commit()
+        self._stopped.wait(self.lease_seconds / 3)
+        return True
+
+    def _schedule(self):
+        """Enqueue due periodic jobs and requeue jobs whose worker went away."""
+        now = time.time()
+        for schedule in self._schedules:
+            period = int(now // schedule['seconds'])
+            if period != schedule['last']:
+                self.enqueue(schedule['kind'], schedule['payload'], schedule['priority'],
+                             idempotency_key=f"every:{schedule['kind']}:{period}")
+                schedule['last'] = period
+
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            # attempts was counted at claim time, so a job that keeps killing
+            # its worker still runs out of attempts
+            cursor.execute(
+                'UPDATE jobs SET error = %s, '
+                "state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "finished_at = CASE WHEN attempts >= max_attempts THEN NOW() ELSE NULL END, "
+                "locked_by = NULL, locked_until = NULL WHERE state = 'running' "
+                'AND locked_until < NOW()', ('Worker stopped before finishing (lease expired)',))
+            conn.commit()
+            if cursor.rowcount > 0:
+                self._count('requeued', cursor.rowcount)
+                self._wake.set()
+        self._stopped.wait(min(self.lease_seconds / 3, 60))
+        return True
+
+    # ── Housekeeping ─────────────────────────────────────────────────────────
+
+    def purge(self, older_than_days):
+        """Delete finished (done / failed) jobs older than the given age; returns how many."""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') "
+                           'AND finished_at < DATE_SUB(NOW(), INTERVAL %s DAY)',
+                           (older_than_days,))
+            conn.commit()
+            return cursor.rowcount
@@ -0,0 +1,91 @@
+// LifeLine QR - Document uploads to the Python backend
+// Small files go up as one multipart request. Larger ones use the resumable
+// upload API, so a dropped connection only repeats the chunk in flight.
+
+const DocumentUpload = {
+    API: 'http://localhost:5000',
+    RESUMABLE_THRESHOLD: 1024 * 1024,   // bytes; bigger files are chunked
+    MAX_RETRIES: 5,
+
+    // Upload a File for a student; resolves to the server's JSON reply
+    async upload(studentId, file, description) {
+        if (file.size <= this.RESUMABLE_THRESHOLD) {
+            return this.uploadMultipart(studentId, file, description);
+        }
+        return this.uploadResumable(studentId, file, description);
+    },
+
+    async uploadMultipart(studentId, file, description) {
+        const form = new FormData();
+        form.append('file', file, file.name);
+        form.append('description', description || 'Medical Document');
+
+        const res = await fetch(`${this.API}/api/student/${studentId}/documents`, {
+            method: 'POST',
+            body: form
+        });
+        return res.json();
+    },
+
+    async uploadResumable(studentId, file, description) {
+        const startRes = await fetch(`${this.API}/api/student/${studentId}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                contentType: file.type,
+                description: description || 'Medical Document'
+            })
+        });
+        const started = await startRes.json();
+        if (!started.success) return started;
+
+        const uploadId = started.upload.upload_id;
+        const chunkSize = started.chunk_size;
+        let offset = 0;
+        let retries = 0;
+
+        while (true) {
+            const end = Math.min(offset + chunkSize, file.size);
+            let data;
+            try {
+                const res = await fetch(`${this.API}/api/uploads/${uploadId}`, {
+                    method: 'PUT',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`
+                    },
+                    body: file.slice(offset, end)
+                });
+                data = await res.json();
+            } catch (err) {
+                // Network drop: ask the server how far it got, then carry on
+                if (++retries > this.MAX_RETRIES) throw err;
+                await new Promise(r => setTimeout(r, 1000 * retries));
+                offset = await this.receivedBytes(uploadId, offset);
+                continue;
+            }
+
+            if (data.document_id) return data;
+            if (data.received !== undefined) {
+                offset = data.received;          // 409: resume where the server is
+            } else if (data.success) {
+                offset = data.upload.received;
+                retries = 0;
+            } else {
+                return data;
+            }
+        }
+    },
+
+    async receivedBytes(uploadId, fallback) {
+        try {
+            const res = await fetch(`${this.API}/api/uploads/${uploadId}`);
+            const data = await res.json();
+            return data.success ? data.upload.received : fallback;
+        } catch (err) {
+            return fallback;
+        }
+    }
+};
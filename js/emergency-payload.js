@@ -0,0 +1,188 @@
+// LifeLine QR - Offline emergency payload decoder
+//
+// Reads the signed "LQR1:" text printed in a student's QR code (format in
+// emergency_payload.py) and verifies it against public keys cached from
+// /api/emergency-payload/keys, so a scan shows vital data with no network.
+
+const EmergencyPayload = {
+    PREFIX: 'LQR1:',
+    VERSION: 1,
+    FLAG_DEFLATE: 0x01,
+    HEADER_BYTES: 6,
+    SIGNATURE_BYTES: 64,
+    MAX_BODY_BYTES: 4096,
+    KEYS_STORAGE_KEY: 'lifeline_payload_keys',
+    KEYS_URL: 'http://localhost:5000/api/emergency-payload/keys',
+
+    BASE45: '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:',
+    BLOOD_GROUPS: ['', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'],
+    BLOOD_OTHER: 0xFF,
+    TEXT_FIELDS: ['name', 'allergies', 'medical_conditions', 'regular_medications',
+                  'emergency_contacts'],
+
+    isPayload(text) {
+        return typeof text === 'string' && text.trim().toUpperCase().startsWith(this.PREFIX);
+    },
+
+    // Fetch the server's public keys and add them to the local cache. Keys
+    // are never dropped, so codes printed before a key rotation still verify.
+    async refreshKeys() {
+        try {
+            const res = await fetch(this.KEYS_URL);
+            const data = await res.json();
+            if (!data.success) return false;
+            const keys = this.cachedKeys();
+            data.keys.forEach(k => { keys[k.key_id] = k.public_key; });
+            localStorage.setItem(this.KEYS_STORAGE_KEY, JSON.stringify(keys));
+            return true;
+        } catch (err) {
+            return false;   // offline: keep using what is cached
+        }
+    },
+
+    cachedKeys() {
+        try {
+            return JSON.parse(localStorage.getItem(this.KEYS_STORAGE_KEY)) || {};
+        } catch (err) {
+            return {};
+        }
+    },
+
+    // Decode a payload. Resolves to { student, verified, keyId, issuedAt };
+    // verified is false when no cached key matches or WebCrypto lacks
+    // Ed25519. Rejects on malformed or tampered text.
+    async decode(text) {
+        const raw = this.base45Decode(text.trim().slice(this.PREFIX.length).toUpperCase());
+        if (raw.length < this.HEADER_BYTES + this.SIGNATURE_BYTES) {
+            throw new Error('Truncated payload');
+        }
+        if (raw[0] !== this.VERSION) {
+            throw new Error(`Unsupported payload version ${raw[0]}`);
+        }
+
+        const signed = raw.subarray(0, raw.length - this.SIGNATURE_BYTES);
+        const signature = raw.subarray(raw.length - this.SIGNATURE_BYTES);
+        const flags = signed[1];
+        const keyId = this.hex(signed.subarray(2, this.HEADER_BYTES));
+
+        // Check the signature before inflating or parsing anything
+        let verified = false;
+        const publicKey = this.cachedKeys()[keyId];
+        if (publicKey) {
+            verified = await this.verify(publicKey, signature, signed);
+            if (verified === null) {
+                verified = false;
+            } else if (!verified) {
+                throw new Error('Signature does not match: this QR code has been altered');
+            }
+        }
+
+        let body = signed.subarray(this.HEADER_BYTES);
+        if (flags & this.FLAG_DEFLATE) {
+            body = await this.inflate(body);
+        }
+
+        const parsed = this.unpack(body);
+        return {
+            student: parsed.student,
+            issuedAt: parsed.issuedAt,
+            keyId: keyId,
+            verified: verified
+        };
+    },
+
+    // true / false, or null if this browser cannot check Ed25519 signatures
+    async verify(publicKeyB64, signature, data) {
+        let key;
+        try {
+            key = await crypto.subtle.importKey(
+                'raw', this.base64UrlDecode(publicKeyB64), { name: 'Ed25519' }, false, ['verify']);
+        } catch (err) {
+            return null;
+        }
+        return crypto.subtle.verify({ name: 'Ed25519' }, key, signature, data);
+    },
+
+    async inflate(bytes) {
+        if (typeof DecompressionStream === 'undefined') {
+            throw new Error('This browser cannot decompress QR payloads');
+        }
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+        const out = new Uint8Array(await new Response(stream).arrayBuffer());
+        if (out.length > this.MAX_BODY_BYTES) {
+            throw new Error('Payload too large');
+        }
+        return out;
+    },
+
+    unpack(data) {
+        let pos = 0;
+        const readVarint = () => {
+            let n = 0;
+            let scale = 1;
+            for (;;) {
+                if (pos >= data.length) throw new Error('Truncated payload');
+                const byte = data[pos++];
+                n += (byte & 0x7F) * scale;
+                scale *= 128;
+                if (!(byte & 0x80)) return n;
+            }
+        };
+        const readString = () => {
+            const length = readVarint();
+            if (pos + length > data.length) throw new Error('Truncated payload');
+            const value = new TextDecoder('utf-8', { fatal: true }).decode(data.subarray(pos, pos + length));
+            pos += length;
+            return value;
+        };
+
+        const student = { id: readVarint() };
+        const issuedAt = new Date(readVarint() * 60 * 1000);
+        if (pos >= data.length) throw new Error('Truncated payload');
+        const code = data[pos++];
+        if (code === this.BLOOD_OTHER) {
+            student.blood_group = readString();
+        } else if (code < this.BLOOD_GROUPS.length) {
+            student.blood_group = this.BLOOD_GROUPS[code];
+        } else {
+            throw new Error('Unknown blood group code');
+        }
+        this.TEXT_FIELDS.forEach(field => { student[field] = readString(); });
+        if (pos !== data.length) throw new Error('Trailing bytes in payload');
+
+        return { student, issuedAt };
+    },
+
+    // RFC 9285
+    base45Decode(text) {
+        const values = Array.from(text, c => {
+            const v = this.BASE45.indexOf(c);
+            if (v < 0) throw new Error('Invalid base45 character');
+            return v;
+        });
+        if (values.length % 3 === 1) throw new Error('Invalid base45 length');
+
+        const out = [];
+        for (let i = 0; i < values.length; i += 3) {
+            if (i + 2 < values.length) {
+                const n = values[i] + values[i + 1] * 45 + values[i + 2] * 2025;
+                if (n > 0xFFFF) throw new Error('Invalid base45 group');
+                out.push(n >> 8, n & 0xFF);
+            } else {
+                const n = values[i] + values[i + 1] * 45;
+                if (n > 0xFF) throw new Error('Invalid base45 group');
+                out.push(n);
+            }
+        }
+        return new Uint8Array(out);
+    },
+
+    base64UrlDecode(text) {
+        const b64 = text.replace(/-/g, '+').replace(/_/g, '/') + '='.repeat((4 - text.length % 4) % 4);
+        return Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+    },
+
+    hex(bytes) {
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+};
@@ -0,0 +1,139 @@
+"""
+LifelineQR - Keyset pagination, filters and field projection for list endpoints.
+Pages are ordered newest first on (created_at, id), so each page is one
+bounded range scan over a (filter columns..., created_at, id) index.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class ListingError(ValueError):
+    """Bad pagination, filter or projection parameter (a 400 for the client)."""
+
+
+def encode_cursor(created_at, row_id):
+    raw = f'{created_at.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        stamp, _, row_id = raw.partition('|')
+        return datetime.fromisoformat(stamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ListingError('Invalid cursor')
+
+
+def parse_limit(args, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        raise ListingError('limit must be an integer')
+    if limit < 1:
+        raise ListingError('limit must be positive')
+    return min(limit, maximum)
+
+
+def parse_fields(args, allowed):
+    """Columns named in ``?fields=a,b`` (all of ``allowed`` if absent)."""
+    raw = args.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ListingError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_bool(value):
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ListingError(f'Expected true or false, got {value!r}')
+
+
+def parse_filters(args, spec):
+    """Turn query parameters into equality predicates.
+
+    spec maps parameter name -> (column, converter). Returns (sql, params)
+    fragments ready to AND together.
+    """
+    clauses = []
+    for param, (column, convert) in spec.items():
+        value = args.get(param)
+        if value is None or value == '':
+            continue
+        clauses.append((f'{column} = %s', (convert(value),)))
+    return clauses
+
+
+def select_list(columns):
+    return [expr if expr == name else f'{expr} AS {name}' for name, expr in columns.items()]
+
+
+def keyset_query(table, columns, filters, cursor, limit):
+    """SELECT one page (plus one row, to detect whether another page follows).
+
+    columns maps each output field to its SQL expression.
+    """
+    select = select_list(columns)
+    for needed in ('id', 'created_at'):
+        if needed not in columns:
+            select.append(needed)
+
+    where = [sql for sql, _ in filters]
+    params = [p for _, ps in filters for p in ps]
+    if cursor:
+        created_at, row_id = cursor
+        where.append('(created_at < %s OR (created_at = %s AND id < %s))')
+        params += [created_at, created_at, row_id]
+
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT %s'
+    params.append(limit + 1)
+    return sql, params
+
+
+def export_query(table, columns, filters):
+    """SELECT every matching row, oldest first, for a streaming export.
+
+    Same filters as the paged listing, and the same (…, created_at, id)
+    indexes deliver the order, so rows stream without a filesort.
+    """
+    where = [sql for sql, _ in filters]
+    params = [p for _, ps in filters for p in ps]
+    sql = f"SELECT {', '.join(select_list(columns))} FROM {table}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY created_at, id'
+    return sql, params
+
+
+def finish_page(rows, limit, fields):
+    """Trim the look-ahead row, build next_cursor and serialise datetimes."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+
+    for row in rows:
+        for key in ('id', 'created_at'):
+            if key not in fields:
+                row.pop(key, None)
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+
+    return rows, next_cursor
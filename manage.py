@@ -0,0 +1,643 @@
+"""
+LifelineQR - Maintenance commands for the Python backend.
+
+Usage:
+    python manage.py serve [--asgi] [--bind HOST:PORT] [--workers N] [--threads N] [--timeout S]
+    python manage.py init-config [--force]
+    python manage.py migrate [--target N] [--status]
+    python manage.py import-students FILE [--format csv|ndjson] [--batch-size N]
+                                          [--default-password PW]
+    python manage.py export-students [--format csv|ndjson] [--output FILE] [--fields a,b]
+                                     [--class C] [--section S] [--blood-group G]
+    python manage.py migrate-blobs [--batch-size N] [--drop-column]
+    python manage.py gc-blobs [--min-age SECONDS] [--dry-run]
+    python manage.py previews [--retry-failed] [--workers N]
+    python manage.py reconcile-stats
+    python manage.py doc-counts [--backfill | --fix] [--batch-size N]
+    python manage.py payload-keygen [--force]
+    python manage.py payload-decode TEXT
+    python manage.py qr-sheet --class C [--section S] [--output FILE] [--workers N]
+    python manage.py jobs [--state S] [--kind K] [--limit N] [--retry ID]
+    python manage.py jobs-worker [--threads N] [--processes N]
+"""
+
+import argparse
+import mimetypes
+import os
+import sys
+import threading
+import time
+
+
+# ── Serving ──────────────────────────────────────────────────────────────────
+
+def cmd_serve(args):
+    """Run the app under the production server (see serving.py)."""
+    import serving
+
+    serving.serve(asgi=args.asgi, bind=args.bind, workers=args.workers, threads=args.threads,
+                  timeout=args.timeout, graceful_timeout=args.graceful_timeout,
+                  keepalive=args.keepalive, max_requests=args.max_requests)
+    return 0
+
+
+# ── Configuration and schema ─────────────────────────────────────────────────
+
+# Passwords common on developer machines, tried by init-config
+_MYSQL_PASSWORDS_TO_TRY = [
+    '',           # XAMPP / WAMP default (no password)
+    'sjssjs',     # Original developer password
+    'root',       # Common default
+    'mysql',      # Common default
+    'password',   # Common default
+    'MC9044PKM',  # Client's password
+]
+
+
+def cmd_init_config(args):
+    """Find working MySQL credentials and write them to the config file."""
+    import getpass
+    import mysql.connector
+    import config
+
+    path = config.config_path()
+    if os.path.exists(path) and not args.force:
+        print(f'  [ERR] {path} already exists (use --force to overwrite)')
+        return 1
+
+    db = config.db_config()
+    db.pop('database')
+
+    def try_connect(user, password):
+        try:
+            mysql.connector.connect(**dict(db, user=user, password=password)).close()
+            return True
+        except mysql.connector.Error as err:
+            print(f"  - {user} / {'***' if password else '(empty)'}: {err}")
+            return False
+
+    user, password = db['user'], None
+    for candidate in _MYSQL_PASSWORDS_TO_TRY:
+        if try_connect(user, candidate):
+            password = candidate
+            break
+
+    if password is None and sys.stdin.isatty():
+        user = input(f'MySQL Username [{user}]: ').strip() or user
+        candidate = getpass.getpass(f'MySQL Password for {user}: ')
+        if try_connect(user, candidate):
+            password = candidate
+
+    if password is None:
+        print('  [ERR] Could not connect to MySQL; set LIFELINEQR_DB_* by hand')
+        return 1
+
+    values = config.read_env_file(path) if os.path.exists(path) else {}
+    values.update({
+        'LIFELINEQR_DB_HOST': db['host'],
+        'LIFELINEQR_DB_PORT': db['port'],
+        'LIFELINEQR_DB_USER': user,
+        'LIFELINEQR_DB_PASSWORD': password,
+        'LIFELINEQR_DB_NAME': os.environ.get('LIFELINEQR_DB_NAME', 'lifelineqr'),
+    })
+    config.write_env_file(path, values)
+    print(f'  [OK] Wrote {path}')
+    return 0
+
+
+def cmd_migrate(args):
+    """Create the database if needed and apply pending schema migrations."""
+    import server
+    import migrations
+
+    if args.status:
+        with server.get_db() as conn:
+            version = migrations.current_version(conn.cursor())
+        print(f'  Schema version {version}, latest {migrations.LATEST}')
+        for number, description, _ in migrations.MIGRATIONS:
+            if number > version:
+                print(f'  pending {number}: {description}')
+        return 0 if version == migrations.LATEST else 1
+
+    if server.DB_BACKEND == 'mysql':
+        migrations.create_database(server.DB_CONFIG)
+    with server.get_db() as conn:
+        try:
+            applied = migrations.migrate(conn, target=args.target)
+        except ValueError as err:
+            print(f'  [ERR] {err}')
+            return 1
+        version = migrations.current_version(conn.cursor())
+    if not applied:
+        print(f'  [OK] Schema already at version {version}')
+    return 0
+
+
+# ── Students ─────────────────────────────────────────────────────────────────
+
+def cmd_import_students(args):
+    """Bulk-register students from a CSV or NDJSON roster file."""
+    import server
+    import roster
+
+    fmt = args.format or ('ndjson' if args.file.endswith(('.ndjson', '.jsonl')) else 'csv')
+    started = time.time()
+    with open(args.file, encoding='utf-8-sig', newline='') as f:
+        with server.get_db() as conn:
+            importer = roster.RosterImporter(conn, batch_size=args.batch_size,
+                                             default_password=args.default_password)
+            report = importer.run(roster.read_rows(f, fmt))
+    elapsed = time.time() - started
+
+    for error in report['errors']:
+        print(f"  line {error['line']}: {error['email'] or '-'}: {error['error']}")
+    rate = report['inserted'] / elapsed if elapsed else 0
+    print(f"  [OK] {report['inserted']} students imported, {report['failed']} rejected "
+          f"({elapsed:.1f}s, {rate:.0f} rows/s)")
+    return 1 if report['failed'] else 0
+
+
+def cmd_export_students(args):
+    """Stream students matching the listing filters to a CSV or NDJSON file."""
+    import server
+    import roster
+    from listing import ListingError
+
+    query = {'fields': args.fields, 'class': args.student_class,
+             'section': args.section, 'blood_group': args.blood_group}
+    try:
+        fields, sql, params = server._export_students_query(query)
+    except ListingError as err:
+        print(f'  [ERR] {err}')
+        return 1
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        out.write(roster.export_header(fields, args.format))
+        with server.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            for chunk in roster.iter_export(cursor, fields, args.format):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.output:
+        print(f'  [OK] Wrote {args.output}')
+    return 0
+
+
+# ── Document blobs ───────────────────────────────────────────────────────────
+
+def cmd_migrate_blobs(args):
+    """Move base64 file_data out of medical_documents into the blob store."""
+    import server
+    from blob_store import decode_data_url
+
+    if server.DB_BACKEND == 'sqlite':
+        print('  [OK] SQLite databases never stored file_data; nothing to migrate')
+        return 0
+    with server.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM information_schema.COLUMNS "
+                       "WHERE TABLE_SCHEMA = DATABASE() "
+                       "AND TABLE_NAME = 'medical_documents' AND COLUMN_NAME = 'file_data'")
+        if not cursor.fetchone()[0]:
+            print('  [OK] file_data column already removed; nothing to migrate')
+            return 0
+
+    store = server._blob_store
+    last_id = 0
+    moved = failed = 0
+
+    while True:
+        with server.get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT id, filename, file_data FROM medical_documents '
+                           'WHERE blob_sha256 IS NULL AND id > %s ORDER BY id LIMIT %s',
+                           (last_id, args.batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                last_id = row['id']
+                try:
+                    content, content_type = decode_data_url(row['file_data'] or '')
+                except ValueError as err:
+                    failed += 1
+                    print(f"  [ERR] document {row['id']}: {err}")
+                    continue
+
+                content_type = (content_type or mimetypes.guess_type(row['filename'])[0]
+                                or 'application/octet-stream')
+                digest = store.put_bytes(content)
+                cursor.execute('UPDATE medical_documents SET blob_sha256 = %s, '
+                               'content_type = %s, size_bytes = %s, file_data = NULL '
+                               'WHERE id = %s',
+                               (digest, content_type, len(content), row['id']))
+                moved += 1
+
+            conn.commit()
+        print(f'  ... {moved} documents migrated (last id {last_id})')
+
+    print(f'  [OK] {moved} documents migrated, {failed} failed')
+
+    if args.drop_column:
+        if failed:
+            print('  [ERR] Not dropping file_data while some rows failed to migrate')
+            return 1
+        with server.get_db() as conn:
+            conn.cursor().execute('ALTER TABLE medical_documents DROP COLUMN file_data')
+        print('  [OK] Dropped medical_documents.file_data')
+
+    return 1 if failed else 0
+
+
+def cmd_gc_blobs(args):
+    """Delete blobs that no document references (e.g. left by a failed delete)."""
+    import server
+
+    referenced = set()
+    with server.get_db() as conn:
+        cursor = conn.cursor()
+        for column in ('blob_sha256', 'thumb_sha256', 'preview_sha256'):
+            cursor.execute(f'SELECT DISTINCT {column} FROM medical_documents '
+                           f'WHERE {column} IS NOT NULL')
+            for (digest,) in cursor:
+                referenced.add(digest)
+
+    store = server._blob_store
+    cutoff = time.time() - args.min_age
+    removed = 0
+    with server.get_db() as conn:
+        for digest, mtime in list(store.iter_digests()):
+            # Skip young blobs: their upload may not have committed its row yet
+            # (an upload reusing a stored blob touches it too)
+            if digest in referenced or mtime > cutoff:
+                continue
+            if not args.dry_run:
+                # Check again under the store lock: a row may have committed
+                # since the scan above
+                with store.lock():
+                    conn.rollback()
+                    if server._blob_referenced(conn.cursor(), digest):
+                        continue
+                    store.delete(digest)
+            removed += 1
+
+    verb = 'would be removed' if args.dry_run else 'removed'
+    print(f'  [OK] {removed} unreferenced blobs {verb}, {len(referenced)} in use')
+    return 0
+
+
+def cmd_previews(args):
+    """Generate previews missing for older uploads, or queued when a server stopped."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import previews
+    import server
+
+    states = [previews.PENDING] + ([previews.FAILED] if args.retry_failed else [])
+    with server.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT id FROM medical_documents "
+                       f"WHERE preview_state IS NULL OR preview_state IN "
+                       f"({', '.join(['%s'] * len(states))}) ORDER BY id", states)
+        doc_ids = [doc_id for (doc_id,) in cursor.fetchall()]
+
+    queue = previews.PreviewQueue(server._blob_store, server.get_db,
+                                  workers=args.workers or server.PREVIEW_WORKERS)
+    results = {}
+    try:
+        with ThreadPoolExecutor(queue.workers) as threads:
+            for n, state in enumerate(threads.map(queue.process, doc_ids), 1):
+                state = state or 'deleted'
+                results[state] = results.get(state, 0) + 1
+                print(f'  processed {n}/{len(doc_ids)}', end='\r')
+    finally:
+        queue.shutdown()
+
+    summary = ', '.join(f'{count} {state}' for state, count in sorted(results.items()))
+    print(f'  [OK] {len(doc_ids)} documents processed' + (f' ({summary})' if summary else ''))
+    return 1 if results.get(previews.FAILED) else 0
+
+
+# ── Dashboard counters ───────────────────────────────────────────────────────
+
+def cmd_reconcile_stats(args):
+    """Recount dashboard counters from the source tables."""
+    import server
+    import stats
+
+    with server.get_db() as conn:
+        drift = stats.reconcile(conn)
+    if drift:
+        for name, delta in sorted(drift.items()):
+            print(f'  corrected {name}: {delta:+d}')
+    print(f'  [OK] Counters reconciled ({len(drift)} corrected)')
+    return 0
+
+
+def cmd_doc_counts(args):
+    """Verify (or rebuild) students.doc_count and last_upload_at."""
+    import server
+    import stats
+
+    with server.get_db() as conn:
+        if args.backfill:
+            updated = stats.backfill_doc_counts(conn.cursor())
+            conn.commit()
+            print(f'  [OK] Document counts rebuilt ({updated} students changed)')
+            return 0
+        mismatched = stats.verify_doc_counts(conn, fix=args.fix, batch_size=args.batch_size)
+
+    for student_id, stored, actual in mismatched:
+        print(f'  student {student_id}: doc_count {stored}, actual {actual}')
+    if not mismatched:
+        print('  [OK] Every student document count matches')
+        return 0
+    if args.fix:
+        print(f'  [OK] {len(mismatched)} students corrected')
+        return 0
+    print(f'  [ERR] {len(mismatched)} students out of step; rerun with --fix')
+    return 1
+
+
+# ── Emergency payload ────────────────────────────────────────────────────────
+
+def cmd_payload_keygen(args):
+    """Create the Ed25519 key that signs QR emergency payloads."""
+    import emergency_payload
+    import server
+
+    path = server.PAYLOAD_KEY
+    if os.path.exists(path) and not args.force:
+        print(f'  [ERR] {path} already exists (use --force to replace it)')
+        return 1
+    try:
+        signer = emergency_payload.generate_key(path)
+    except RuntimeError as err:
+        print(f'  [ERR] {err}')
+        return 1
+    print(f'  [OK] Wrote {path} (key id {signer.key_id.hex()})')
+    if args.force:
+        # Stored payloads carry the old key id and are reissued on their next
+        # request; QR codes already printed verify only on scanners that
+        # cached the old public key.
+        print('  Reprint student QR codes so they carry the new signature')
+    return 0
+
+
+def cmd_payload_decode(args):
+    """Verify a scanned payload against the configured key and print its fields."""
+    import emergency_payload
+    import server
+
+    signer = server.payload_signer()
+    if signer is None:
+        print(f'  [ERR] No signing key at {server.PAYLOAD_KEY}; '
+              'run: python manage.py payload-keygen')
+        return 1
+    try:
+        fields = emergency_payload.decode(args.text, [signer.public_raw])
+    except emergency_payload.PayloadError as err:
+        print(f'  [ERR] {err}')
+        return 1
+    for name, value in fields.items():
+        print(f'  {name:<20}{value}')
+    print('  [OK] Signature verified')
+    return 0
+
+
+# ── QR codes ─────────────────────────────────────────────────────────────────
+
+def cmd_qr_sheet(args):
+    """Render the printable QR card sheet of a class across a process pool."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    import server
+    from qr_sheets import render_sheet
+
+    with server.get_db() as conn:
+        title, cards = server._sheet_cards(conn, args.student_class, args.section)
+    if not cards:
+        print(f'  [ERR] No students in {title}')
+        return 1
+
+    workers = args.workers or server.QR_WORKERS or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f'  rendered {done}/{total}', end='\r')
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            sheet = render_sheet(title, cards, server._qr_cache, executor, workers, progress)
+    else:
+        sheet = render_sheet(title, cards, server._qr_cache, progress=progress)
+
+    output = args.output or f"qr-sheet-{title.lower().replace(' ', '')}.html"
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(sheet)
+    print(f'  [OK] {len(cards)} cards in {time.perf_counter() - started:.1f}s '
+          f'({workers} workers) -> {output}')
+    return 0
+
+
+# ── Background jobs ──────────────────────────────────────────────────────────
+
+def cmd_jobs(args):
+    """List recent background jobs and the queue's size, or retry a failed one."""
+    import server
+
+    if args.retry:
+        if not server._jobs.retry(args.retry):
+            print(f'  [ERR] Job {args.retry} does not exist or has not failed')
+            return 1
+        print(f'  [OK] Job {args.retry} queued again')
+        return 0
+
+    for job in reversed(server._jobs.recent(args.state, args.kind, args.limit)):
+        progress = job['progress']
+        done = '' if progress['done'] is None else f" {progress['done']}/{progress['total'] or '?'}"
+        print(f"  {job['id']:>8} {job['kind']:<16} {job['state']:<8} "
+              f"attempt {job['attempts']}/{job['max_attempts']}{done}"
+              + (f"  {job['error']}" if job['error'] and job['state'] != 'done' else ''))
+    for state, kinds in server._jobs.counts().items():
+        if kinds:
+            summary = ', '.join(f'{n} {kind}' for kind, n in sorted(kinds.items()))
+            print(f'  {state}: {summary}')
+    return 0
+
+
+def _job_worker(threads):
+    """Body of one worker process: run jobs until interrupted or terminated."""
+    import signal
+
+    import server
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    server._jobs.threads = threads
+    server._start_job_workers()
+    print(f'  [OK] Job worker {server._jobs.worker_id} running with {threads} threads')
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    # Jobs still running when this gives up are requeued once their lease expires
+    server._jobs.stop(timeout=30)
+
+
+def cmd_jobs_worker(args):
+    """Run background jobs in dedicated processes instead of (or as well as) the servers."""
+    import multiprocessing
+    import signal
+
+    import server
+
+    if not server._check_schema():
+        return 1
+    threads = args.threads or server.JOB_THREADS or 2
+    if args.processes <= 1:
+        _job_worker(threads)
+        return 0
+
+    # spawn, not fork: this process already holds pool connections
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_job_worker, args=(threads,), name=f'jobs-{n}')
+               for n in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGTERM, lambda *_: [w.terminate() for w in workers])
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # The terminal sent SIGINT to the workers too; let them finish
+        for worker in workers:
+            worker.join()
+    return 0
+
+
+# ── Entry point ──────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    import roster
+
+    parser = argparse.ArgumentParser(prog='manage.py', description='LifelineQR maintenance')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serve', help='run the production multi-process server')
+    p.add_argument('--bind', help='HOST:PORT to listen on (default 127.0.0.1:5000)')
+    p.add_argument('--workers', type=int, help='worker processes (default 2 x CPUs + 1)')
+    p.add_argument('--threads', type=int, help='request threads per worker (default 4)')
+    p.add_argument('--timeout', type=int, help='seconds before a hung worker is replaced')
+    p.add_argument('--graceful-timeout', type=int,
+                   help='seconds in-flight requests get on restart')
+    p.add_argument('--keepalive', type=int, help='seconds to hold idle keep-alive connections')
+    p.add_argument('--max-requests', type=int,
+                   help='recycle a worker after this many requests (0 = never)')
+    p.add_argument('--asgi', action='store_true',
+                   help='serve asgi.py under uvicorn (async read endpoints)')
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('init-config', help='detect MySQL credentials and write lifelineqr.env')
+    p.add_argument('--force', action='store_true', help='overwrite an existing config file')
+    p.set_defaults(func=cmd_init_config)
+
+    p = sub.add_parser('migrate', help='create the database and apply schema migrations')
+    p.add_argument('--target', type=int, help='stop after this migration number (MySQL only)')
+    p.add_argument('--status', action='store_true',
+                   help='show the current version and pending migrations')
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('import-students', help='bulk-register students from a roster file')
+    p.add_argument('file', help='CSV with a header row, or NDJSON (one object per line)')
+    p.add_argument('--format', choices=('csv', 'ndjson'),
+                   help='default: ndjson for .ndjson/.jsonl files, otherwise csv')
+    p.add_argument('--batch-size', type=int, default=roster.DEFAULT_BATCH_SIZE,
+                   help=f'students per transaction (default {roster.DEFAULT_BATCH_SIZE})')
+    p.add_argument('--default-password', help='password for rows that do not have one')
+    p.set_defaults(func=cmd_import_students)
+
+    p = sub.add_parser('export-students', help='stream students to CSV or NDJSON')
+    p.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    p.add_argument('--output', help='file to write (default: standard output)')
+    p.add_argument('--fields', help='comma-separated columns (default: all)')
+    p.add_argument('--class', dest='student_class', help='only this class')
+    p.add_argument('--section', help='only this section')
+    p.add_argument('--blood-group', help='only this blood group')
+    p.set_defaults(func=cmd_export_students)
+
+    p = sub.add_parser('migrate-blobs', help='move legacy base64 documents into the blob store')
+    p.add_argument('--batch-size', type=int, default=20,
+                   help='documents loaded per round trip (default 20)')
+    p.add_argument('--drop-column', action='store_true',
+                   help='drop medical_documents.file_data once every row is migrated')
+    p.set_defaults(func=cmd_migrate_blobs)
+
+    p = sub.add_parser('gc-blobs', help='delete blobs no document references')
+    p.add_argument('--min-age', type=int, default=3600,
+                   help='only delete blobs older than this many seconds (default 3600)')
+    p.add_argument('--dry-run', action='store_true', help='report without deleting')
+    p.set_defaults(func=cmd_gc_blobs)
+
+    p = sub.add_parser('previews', help='generate missing document thumbnails and previews')
+    p.add_argument('--retry-failed', action='store_true',
+                   help='also retry documents whose previews failed')
+    p.add_argument('--workers', type=int,
+                   help='rendering processes (default LIFELINEQR_PREVIEW_WORKERS)')
+    p.set_defaults(func=cmd_previews)
+
+    p = sub.add_parser('reconcile-stats', help='recount admin dashboard counters')
+    p.set_defaults(func=cmd_reconcile_stats)
+
+    p = sub.add_parser('doc-counts', help='verify per-student document counts')
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument('--backfill', action='store_true',
+                      help='recompute every student in one statement')
+    mode.add_argument('--fix', action='store_true', help='correct rows that are out of step')
+    p.add_argument('--batch-size', type=int, default=500,
+                   help='students checked per query (default 500)')
+    p.set_defaults(func=cmd_doc_counts)
+
+    p = sub.add_parser('payload-keygen', help='create the key that signs QR emergency payloads')
+    p.add_argument('--force', action='store_true', help='replace an existing key')
+    p.set_defaults(func=cmd_payload_keygen)
+
+    p = sub.add_parser('payload-decode', help='verify and print a scanned QR emergency payload')
+    p.add_argument('text', help='the scanned text, starting LQR1:')
+    p.set_defaults(func=cmd_payload_decode)
+
+    p = sub.add_parser('qr-sheet', help='render a printable QR card sheet for a class')
+    p.add_argument('--class', dest='student_class', required=True, help='the class to print')
+    p.add_argument('--section', help='only this section')
+    p.add_argument('--output', help='HTML file to write (default: qr-sheet-<class>.html)')
+    p.add_argument('--workers', type=int,
+                   help='rendering processes (default LIFELINEQR_QR_WORKERS, else one per CPU)')
+    p.set_defaults(func=cmd_qr_sheet)
+
+    p = sub.add_parser('jobs', help='list background jobs, or retry a failed one')
+    p.add_argument('--state', choices=('queued', 'running', 'done', 'failed'))
+    p.add_argument('--kind', help='only jobs of this kind')
+    p.add_argument('--limit', type=int, default=20, help='jobs to list (default 20)')
+    p.add_argument('--retry', type=int, metavar='ID', help='queue this failed job again')
+    p.set_defaults(func=cmd_jobs)
+
+    p = sub.add_parser('jobs-worker', help='run background jobs in dedicated processes')
+    p.add_argument('--threads', type=int,
+                   help='jobs run at once per process (default LIFELINEQR_JOB_THREADS, else 2)')
+    p.add_argument('--processes', type=int, default=1, help='worker processes (default 1)')
+    p.set_defaults(func=cmd_jobs_worker)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+LifelineQR - Request metrics in the Prometheus text format.
+Each thread records into its own shard with no lock taken on the request
+path; a scrape sums the shards. With a metrics directory, a background
+thread in every server process also writes its totals there every few
+seconds, so /metrics on any gunicorn or uvicorn worker reports the whole
+server.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single waitress process, nothing to merge
+    fcntl = None
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+DURATION = 'lifelineqr_http_request_duration_seconds'
+RESPONSE_SIZE = 'lifelineqr_http_response_size_bytes'
+DB_SECONDS = 'lifelineqr_http_request_db_seconds'
+DB_QUERIES = 'lifelineqr_http_request_db_queries_total'
+IN_FLIGHT = 'lifelineqr_http_requests_in_flight'
+# Internal counter; in flight = started - finished, so no shared gauge is written
+_STARTED = '_started'
+
+# name -> (type, help, buckets)
+METRICS = {
+    DURATION: ('histogram', 'Time from receiving a request to sending its last byte.',
+               LATENCY_BUCKETS),
+    RESPONSE_SIZE: ('histogram', 'Response body bytes as sent (after compression).',
+                    SIZE_BUCKETS),
+    DB_SECONDS: ('histogram', 'Time a request spent in database calls.', LATENCY_BUCKETS),
+    DB_QUERIES: ('counter', 'SQL statements executed by requests.', None),
+    IN_FLIGHT: ('gauge', 'Requests being handled right now.', None),
+}
+
+# Flask stores the matched URL rule here (see server.py); unmatched paths share one label
+ROUTE_KEY = 'lifelineqr.route'
+UNMATCHED = '<unmatched>'
+
+
+def labels(**values):
+    """Prometheus label list, e.g. method="GET",route="/api/scan/<int:student_id>"."""
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for k, v in sorted(values.items()))
+
+
+def _merge(into, items):
+    for key, value in items:
+        if isinstance(value, list):
+            current = into.get(key)
+            if current is None:
+                into[key] = list(value)
+            else:
+                for i, n in enumerate(value):
+                    current[i] += n
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _in_flight(totals):
+    started = totals.get((_STARTED, ''), 0)
+    finished = sum(sum(value[:-1]) for (name, _), value in totals.items() if name == DURATION)
+    return max(0, started - finished)
+
+
+class Metrics:
+    """Histograms and counters for one server process.
+
+    directory      -- where processes share their totals (None: this process only)
+    flush_interval -- seconds between writes of this process's totals
+
+    The thread writing them starts with the first request a process counts,
+    so forked workers each get their own.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []       # (thread, shard) of every thread that has recorded
+        self._retired = {}      # totals of threads that have exited
+        self._pid = None
+        self._flusher_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # ── Recording (request path) ─────────────────────────────────────────────
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def observe(self, name, label_list, value):
+        """Add ``value`` to a histogram series."""
+        shard = self._shard()
+        series = shard.get((name, label_list))
+        if series is None:
+            # bucket counts, then overflow (+Inf), then the sum
+            buckets = METRICS[name][2]
+            series = shard[(name, label_list)] = [0] * (len(buckets) + 2)
+        series[bisect_left(METRICS[name][2], value)] += 1
+        series[-1] += value
+
+    def inc(self, name, label_list='', value=1):
+        shard = self._shard()
+        shard[(name, label_list)] = shard.get((name, label_list), 0) + value
+
+    def started(self):
+        """Count a request in flight; observing its DURATION ends it."""
+        if self.directory and self._flusher_pid != os.getpid():
+            self._start_flusher()
+        self.inc(_STARTED)
+
+    # ── Collection ───────────────────────────────────────────────────────────
+
+    def collect(self):
+        """This process's totals, {(name, labels): count or histogram list}."""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    _merge(self._retired, dict(shard).items())
+            self._shards = live
+            totals = {}
+            _merge(totals, self._retired.items())
+            for _, shard in live:
+                # dict() copies under the GIL while the owning thread keeps writing
+                _merge(totals, dict(shard).items())
+        return totals
+
+    def render(self):
+        """The Prometheus text exposition of every process's totals."""
+        totals = self.collect()
+        in_flight = _in_flight(totals)
+        if self.directory:
+            self.flush(totals)
+            for data, live in self._others():
+                _merge(totals, data.items())
+                if live:
+                    in_flight += _in_flight(data)
+
+        by_name = {}
+        for (name, label_list), value in totals.items():
+            by_name.setdefault(name, []).append((label_list, value))
+
+        out = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+            if name == IN_FLIGHT:
+                out.append(f'{name} {in_flight}')
+                continue
+            for label_list, value in sorted(by_name.get(name, ())):
+                if kind != 'histogram':
+                    out.append(f'{name}{{{label_list}}} {value}')
+                    continue
+                prefix = label_list + ',' if label_list else ''
+                cumulative = 0
+                for bound, n in zip(buckets, value):
+                    cumulative += n
+                    out.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                count = cumulative + value[-2]
+                out.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+                out.append(f'{name}_sum{{{label_list}}} {value[-1]:.6f}')
+                out.append(f'{name}_count{{{label_list}}} {count}')
+        return '\n'.join(out) + '\n'
+
+    # ── Sharing between processes ────────────────────────────────────────────
+
+    def _start_flusher(self):
+        """Start this process's flusher (once per process; forked workers start their own)."""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._run_flusher, name='metrics-flusher', daemon=True).start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as err:
+                print(f'  [ERR] Metrics flush: {err}')
+
+    def flush(self, totals=None):
+        pid = os.getpid()
+        if pid != self._pid:
+            # First write from this process: a file under its pid was left by
+            # an earlier process that had the same pid
+            self._pid = pid
+            self._retire(self._path(pid))
+        if totals is None:
+            totals = self.collect()
+        self._write(self._path(pid), totals)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.json')
+
+    def _write(self, path, totals):
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp',
+                                         delete=False) as tmp:
+            json.dump([[name, label_list, value] for (name, label_list), value in totals.items()],
+                      tmp)
+        os.replace(tmp.name, path)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return {(name, label_list): value for name, label_list, value in json.load(f)}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _others(self):
+        """(totals, alive) of the other processes' files and of the archive."""
+        if fcntl is not None:
+            # Fold exited processes into the archive before reading anything
+            for name in os.listdir(self.directory):
+                stem, ext = os.path.splitext(name)
+                if ext == '.json' and stem.isdigit() and not _alive(int(stem)):
+                    self._retire(os.path.join(self.directory, name))
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == '.json' and stem != str(self._pid):
+                yield self._read(os.path.join(self.directory, name)), stem.isdigit()
+
+    def _retire(self, path):
+        """Fold an exited process's totals into archive.json, so counts never go backwards."""
+        if fcntl is None or not os.path.exists(path):
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self._read(path)
+            if not data:
+                return
+            data.pop((_STARTED, ''), None)
+            archive = self._read(self._path('archive'))
+            _merge(archive, data.items())
+            self._write(self._path('archive'), archive)
+            os.unlink(path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WSGIMiddleware:
+    """Records duration, status, response size and DB time of every request.
+
+    The route label is the URL rule the app stores in the environ under
+    ROUTE_KEY. A response is measured until its last byte has been sent,
+    so streamed exports are timed in full.
+    """
+
+    def __init__(self, app, metrics, db_timer=None):
+        self.app = app
+        self.metrics = metrics
+        self.db_timer = db_timer
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        self.metrics.started()
+        if self.db_timer is not None:
+            self.db_timer.reset()
+        response = {'status': '500', 'length': 0}
+
+        def start(status, headers, exc_info=None):
+            response['status'] = status[:3]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    response['length'] = int(value)
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.app(environ, start)
+        except BaseException:
+            self._record(environ, response['status'], 0, started)
+            raise
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Leave it to the server's sendfile path; count the declared length
+            self._record(environ, response['status'], response['length'], started)
+            return body
+        return _CountingBody(
+            body, lambda size: self._record(environ, response['status'], size, started))
+
+    def _record(self, environ, status, size, started):
+        route = environ.get(ROUTE_KEY) or UNMATCHED
+        method = environ.get('REQUEST_METHOD', '')
+        metrics = self.metrics
+        metrics.observe(DURATION, labels(route=route, method=method, status=status),
+                        time.perf_counter() - started)
+        route_labels = labels(route=route, method=method)
+        metrics.observe(RESPONSE_SIZE, route_labels, size)
+        if self.db_timer is not None:
+            metrics.observe(DB_SECONDS, route_labels, self.db_timer.seconds)
+            metrics.inc(DB_QUERIES, route_labels, self.db_timer.queries)
+
+
+class _CountingBody:
+    """Response iterable that counts bytes sent and reports the total on close()."""
+
+    def __init__(self, body, done):
+        self._body = body
+        self._done = done
+        self._size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self._body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._done(self._size)
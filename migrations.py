@@ -0,0 +1,390 @@
+"""
+LifelineQR - Versioned schema migrations.
+Each migration runs once, in order, and records its number in schema_version.
+``python manage.py migrate`` applies pending ones; the server itself only
+reads the recorded version at startup and never issues DDL.
+"""
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import sqlite_db
+import stats
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+# ── Introspection helpers ────────────────────────────────────────────────────
+# MySQL commits DDL implicitly, so a migration interrupted halfway is rerun
+# from the top; these checks make every step safe to repeat.
+
+def _column(cursor, table, column):
+    """(IS_NULLABLE,) for an existing column, else None."""
+    cursor.execute('SELECT IS_NULLABLE FROM information_schema.COLUMNS '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s',
+                   (table, column))
+    return cursor.fetchone()
+
+
+def _table_exists(cursor, table):
+    cursor.execute('SELECT 1 FROM information_schema.TABLES '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', (table,))
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, coldef):
+    """Add a column unless it exists; returns True if it was added."""
+    if _column(cursor, table, column):
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {coldef}')
+    return True
+
+
+def _add_index(cursor, table, index, columns, kind='INDEX'):
+    """CREATE INDEX (or kind='FULLTEXT INDEX') unless an index of that name exists."""
+    cursor.execute('SELECT 1 FROM information_schema.STATISTICS '
+                   'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s '
+                   'LIMIT 1', (table, index))
+    if not cursor.fetchone():
+        cursor.execute(f'CREATE {kind} {index} ON {table} ({columns})')
+
+
+# ── Migrations ───────────────────────────────────────────────────────────────
+
+def _m001_baseline(conn):
+    """Bring a new or pre-migrations database to the current schema.
+
+    Databases created by older versions of server.py's bootstrap (or by
+    fix_admin_table.py) are upgraded in place.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            age INT NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            blood_group VARCHAR(5),
+            allergies TEXT,
+            medical_conditions TEXT,
+            regular_medications TEXT,
+            address TEXT,
+            emergency_contacts VARCHAR(20),
+            student_class VARCHAR(10),
+            section VARCHAR(5),
+            roll_number VARCHAR(20),
+            parent_name VARCHAR(255),
+            doc_count INT NOT NULL DEFAULT 0,
+            last_upload_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    for col, coldef in [
+        ('student_class', 'VARCHAR(10)'),
+        ('section', 'VARCHAR(5)'),
+        ('roll_number', 'VARCHAR(20)'),
+        ('parent_name', 'VARCHAR(255)'),
+    ]:
+        _add_column(cursor, 'students', col, coldef)
+    backfill_doc_counts = _add_column(cursor, 'students', 'doc_count', 'INT NOT NULL DEFAULT 0')
+    _add_column(cursor, 'students', 'last_upload_at', 'DATETIME')
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS doctors (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            age INT NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            specialization VARCHAR(100),
+            experience INT,
+            hospital VARCHAR(255),
+            contact_number VARCHAR(20),
+            working_hours VARCHAR(50),
+            is_verified BOOLEAN DEFAULT FALSE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_column(cursor, 'doctors', 'is_verified', 'BOOLEAN DEFAULT FALSE')
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS medical_documents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            blob_sha256 CHAR(64),
+            content_type VARCHAR(100),
+            size_bytes BIGINT,
+            description TEXT,
+            uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_documents_blob (blob_sha256),
+            INDEX idx_documents_student (student_id, uploaded_at),
+            FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Older databases kept base64 bytes in file_data; `manage.py migrate-blobs`
+    # moves them into the blob store. New rows leave it NULL.
+    for col, coldef in [
+        ('blob_sha256', 'CHAR(64)'),
+        ('content_type', 'VARCHAR(100)'),
+        ('size_bytes', 'BIGINT'),
+    ]:
+        _add_column(cursor, 'medical_documents', col, coldef)
+    file_data = _column(cursor, 'medical_documents', 'file_data')
+    if file_data and file_data[0] != 'YES':
+        cursor.execute('ALTER TABLE medical_documents MODIFY file_data LONGTEXT NULL')
+    _add_index(cursor, 'medical_documents', 'idx_documents_blob', 'blob_sha256')
+    _add_index(cursor, 'medical_documents', 'idx_documents_student', 'student_id, uploaded_at')
+
+    # The first admins table keyed on username; replace it (was fix_admin_table.py)
+    if _table_exists(cursor, 'admins') and not _column(cursor, 'admins', 'email'):
+        cursor.execute('DROP TABLE admins')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT IGNORE INTO admins (email, password)
+        VALUES ('admin@lifelineqr.com', 'admin@123')
+    """)
+
+    for stmt in stats.SCHEMA:
+        cursor.execute(stmt)
+
+    # Listing indexes: every filter combination pages over (…, created_at, id)
+    for table, index, columns in [
+        ('students', 'idx_students_created', 'created_at, id'),
+        ('students', 'idx_students_class', 'student_class, section, created_at, id'),
+        ('students', 'idx_students_blood', 'blood_group, created_at, id'),
+        ('doctors', 'idx_doctors_created', 'created_at, id'),
+        ('doctors', 'idx_doctors_verified', 'is_verified, created_at, id'),
+    ]:
+        _add_index(cursor, table, index, columns)
+
+    if backfill_doc_counts:
+        stats.backfill_doc_counts(cursor)
+    conn.commit()
+
+    # Seed the dashboard counters from the tables once
+    cursor.execute('SELECT COUNT(*) FROM stats_counters')
+    if not cursor.fetchone()[0]:
+        stats.reconcile(conn)
+
+
+def _m002_student_versions(conn):
+    """Version counters behind the ETag / Last-Modified of profiles and document lists."""
+    cursor = conn.cursor()
+    for col, coldef in [
+        ('version', 'INT NOT NULL DEFAULT 1'),
+        ('updated_at', 'DATETIME'),
+        ('docs_version', 'INT NOT NULL DEFAULT 1'),
+        ('docs_updated_at', 'DATETIME'),
+    ]:
+        _add_column(cursor, 'students', col, coldef)
+    conn.commit()
+
+
+def _m003_search_indexes(conn):
+    """Indexes behind /api/search: one FULLTEXT per table plus a B-tree per lookup (search.py)."""
+    cursor = conn.cursor()
+    _add_index(cursor, 'students', 'ft_students_search',
+               'name, email, roll_number, parent_name', kind='FULLTEXT INDEX')
+    _add_index(cursor, 'doctors', 'ft_doctors_search',
+               'name, specialization, hospital', kind='FULLTEXT INDEX')
+
+    # Prefix (LIKE 'abc%') lookups; the first 20 characters are selective
+    # enough and keep the indexes small. email is covered by its UNIQUE key,
+    # student_class by idx_students_class.
+    for table, index, columns in [
+        ('students', 'idx_students_name', 'name(20)'),
+        ('students', 'idx_students_roll', 'roll_number'),
+        ('students', 'idx_students_parent', 'parent_name(20)'),
+        ('doctors', 'idx_doctors_name', 'name(20)'),
+        ('doctors', 'idx_doctors_specialization', 'specialization(20)'),
+        ('doctors', 'idx_doctors_hospital', 'hospital(20)'),
+    ]:
+        _add_index(cursor, table, index, columns)
+    conn.commit()
+
+
+def _m004_emergency_payload(conn):
+    """Signed offline payload issued for each student's QR code (emergency_payload.py)."""
+    cursor = conn.cursor()
+    _add_column(cursor, 'students', 'emergency_payload', 'VARCHAR(2048)')
+    conn.commit()
+
+
+def _m005_document_previews(conn):
+    """Thumbnail / first-page preview blobs of each document (previews.py)."""
+    cursor = conn.cursor()
+    for col, coldef in [
+        ('preview_state', 'VARCHAR(10)'),
+        ('thumb_sha256', 'CHAR(64)'),
+        ('preview_sha256', 'CHAR(64)'),
+    ]:
+        _add_column(cursor, 'medical_documents', col, coldef)
+    # Blob deletes and gc-blobs check every digest column for references
+    _add_index(cursor, 'medical_documents', 'idx_documents_thumb', 'thumb_sha256')
+    _add_index(cursor, 'medical_documents', 'idx_documents_preview', 'preview_sha256')
+    conn.commit()
+
+
+def _m006_jobs(conn):
+    """Durable background job queue (jobs.py)."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(64) NOT NULL,
+            payload TEXT,
+            idempotency_key VARCHAR(191) UNIQUE,
+            priority INT NOT NULL DEFAULT 0,
+            state VARCHAR(10) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 5,
+            run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(100),
+            locked_until DATETIME,
+            progress_done INT,
+            progress_total INT,
+            result MEDIUMTEXT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME,
+            INDEX idx_jobs_ready (state, priority DESC, run_after, id),
+            INDEX idx_jobs_lease (state, locked_until),
+            INDEX idx_jobs_finished (state, finished_at)
+        )
+    """)
+    conn.commit()
+
+
+def _m007_access_log(conn):
+    """Who viewed which student's records (access_log.py).
+
+    No foreign key: the history outlives a deleted student, and the batched
+    inserts skip a parent lookup per row.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS access_log (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            document_id INT,
+            action VARCHAR(20) NOT NULL,
+            viewer_role VARCHAR(10),
+            viewer_id INT,
+            ip VARCHAR(45),
+            user_agent VARCHAR(255),
+            status SMALLINT,
+            accessed_at DATETIME(3) NOT NULL,
+            INDEX idx_access_student (student_id, accessed_at, id)
+        )
+    """)
+    conn.commit()
+
+
+# (version, description, function). Append new migrations; never renumber.
+# sqlite_db.SCHEMA is the schema these produce, for the embedded backend:
+# change it alongside any new migration (and add to sqlite_db.UPGRADES any
+# change to a table that already exists).
+MIGRATIONS = [
+    (1, 'baseline schema', _m001_baseline),
+    (2, 'student profile and document list versions', _m002_student_versions),
+    (3, 'search indexes', _m003_search_indexes),
+    (4, 'signed emergency payload', _m004_emergency_payload),
+    (5, 'document previews', _m005_document_previews),
+    (6, 'background jobs', _m006_jobs),
+    (7, 'access log', _m007_access_log),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+# ── Runner ───────────────────────────────────────────────────────────────────
+
+def current_version(cursor):
+    """Highest applied migration, or 0 for a database that has never been migrated."""
+    try:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+    except mysql.connector.Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    return cursor.fetchone()[0] or 0
+
+
+def create_database(db_config):
+    """CREATE DATABASE IF NOT EXISTS for the configured database name."""
+    server_config = {k: v for k, v in db_config.items() if k != 'database'}
+    conn = mysql.connector.connect(**server_config)
+    try:
+        conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{db_config['database']}`")
+    finally:
+        conn.close()
+
+
+def migrate(conn, target=None, log=print):
+    """Apply pending migrations up to ``target`` (default: all). Returns versions applied."""
+    cursor = conn.cursor()
+    cursor.execute(SCHEMA_VERSION_TABLE)
+    version = current_version(cursor)
+    if getattr(conn, 'dialect', 'mysql') == 'sqlite':
+        if target is not None and target < LATEST:
+            raise ValueError('SQLite databases are always migrated to the latest schema; '
+                             'drop --target')
+        return _migrate_sqlite(conn, version, log)
+
+    applied = []
+    for number, description, func in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        func(conn)
+        cursor.execute('INSERT INTO schema_version (version, description) VALUES (%s, %s)',
+                       (number, description))
+        conn.commit()
+        applied.append(number)
+        log(f'  [OK] Applied migration {number}: {description}')
+    return applied
+
+
+def _migrate_sqlite(conn, version, log):
+    """Bring an embedded database to LATEST (sqlite_db.SCHEMA).
+
+    The schema is created idempotently, so a new database gets every table
+    at once and an older one gains the tables added since; changes to
+    existing tables are applied from sqlite_db.UPGRADES.
+    """
+    pending = [(number, description) for number, description, _ in MIGRATIONS
+               if number > version]
+    if not pending:
+        return []
+    cursor = conn.cursor()
+    if version:
+        for number, _ in pending:
+            for statement in sqlite_db.UPGRADES.get(number, ()):
+                cursor.execute(statement)
+    sqlite_db.create_schema(conn, seed=not version)
+    cursor.executemany('INSERT INTO schema_version (version, description) VALUES (%s, %s)',
+                       pending)
+    conn.commit()
+    if not version:
+        stats.reconcile(conn)
+    for number, description in pending:
+        log(f'  [OK] Applied migration {number}: {description}')
+    return [number for number, _ in pending]
@@ -0,0 +1,208 @@
+"""
+LifelineQR - Thumbnails and first-page previews of uploaded documents.
+Uploads enqueue a ``previews`` job for their document (jobs.py); images and
+PDFs are decoded and scaled in worker processes, and the resulting JPEGs go
+into the blob store with their digests recorded on the document row, off
+the request path.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional; no previews without it
+    Image = ImageOps = None
+
+try:
+    import pypdfium2
+except ImportError:  # optional; images only without it
+    pypdfium2 = None
+
+THUMB_SIZE = 160
+PREVIEW_SIZE = 800
+JPEG_QUALITY = 80
+# Images with more pixels than this are not decoded (decompression bombs)
+MAX_PIXELS = 50 * 1000 * 1000
+# Seconds one document may take in a worker before it is marked failed
+RENDER_TIMEOUT = 60
+
+IMAGE_TYPES = frozenset(('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp',
+                         'image/tiff'))
+PDF_TYPES = frozenset(('application/pdf',))
+
+# medical_documents.preview_state
+PENDING, READY, FAILED, NONE = 'pending', 'ready', 'failed', 'none'
+
+
+def previewable(content_type):
+    """Whether previews can be made for this content type with what is installed."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if Image is None:
+        return False
+    return content_type in IMAGE_TYPES or (content_type in PDF_TYPES and pypdfium2 is not None)
+
+
+def _first_page(path, content_type):
+    if content_type in PDF_TYPES:
+        pdf = pypdfium2.PdfDocument(path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = PREVIEW_SIZE / max(width, height, 1)
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with Image.open(path) as image:
+        image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))   # JPEG: decode at reduced size
+        return ImageOps.exif_transpose(image)
+
+
+def _jpeg(image, size):
+    image = image.copy()
+    image.thumbnail((size, size))
+    if image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def render(path, content_type):
+    """(thumbnail, preview) JPEG bytes for the file at ``path``. Runs in a worker process."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    page = _first_page(path, content_type)
+    return _jpeg(page, THUMB_SIZE), _jpeg(page, PREVIEW_SIZE)
+
+
+class PreviewQueue:
+    """Generates previews for documents, one ``process`` call per document.
+
+    store   -- the document blob store; previews are stored in it too
+    get_db  -- callable returning a pooled connection context manager
+    workers -- render processes
+    on_done -- called with the student id once a document's previews are saved
+
+    The server calls ``process`` from its job workers, which survive restarts;
+    ``manage.py previews`` covers documents uploaded before previews existed.
+    """
+
+    def __init__(self, store, get_db, workers=2, on_done=None):
+        self.store = store
+        self.get_db = get_db
+        self.workers = max(1, workers)
+        self.on_done = on_done
+        self._processes = None
+        self._lock = threading.Lock()
+        self._ready = 0
+        self._failed = 0
+        self._reused = 0
+        self._seconds = 0.0
+
+    def _pool(self):
+        with self._lock:
+            if self._processes is None:
+                # spawn, not fork: the server process has threads and open sockets
+                self._processes = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._processes
+
+    def process(self, doc_id):
+        """Generate and record previews for one document; returns its new preview_state."""
+        with self.get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT student_id, blob_sha256, content_type FROM medical_documents '
+                           'WHERE id = %s', (doc_id,))
+            doc = cursor.fetchone()
+            if not doc:
+                return None
+            if not doc['blob_sha256'] or not previewable(doc['content_type']):
+                return self._save(conn, doc_id, doc['student_id'], NONE)
+
+            # Identical files share a blob, and so can share its previews
+            cursor.execute('SELECT thumb_sha256, preview_sha256 FROM medical_documents '
+                           'WHERE blob_sha256 = %s AND preview_state = %s LIMIT 1',
+                           (doc['blob_sha256'], READY))
+            done = cursor.fetchone()
+        if done:
+            with self._lock:
+                self._reused += 1
+            with self.get_db() as conn:
+                return self._save(conn, doc_id, doc['student_id'], READY,
+                                  done['thumb_sha256'], done['preview_sha256'])
+
+        started = time.perf_counter()
+        try:
+            with self._local_copy(doc['blob_sha256']) as path:
+                thumb, preview = self._pool().submit(
+                    render, path, doc['content_type']).result(RENDER_TIMEOUT)
+            digests = self.store.put_bytes(thumb), self.store.put_bytes(preview)
+            state = READY
+        except Exception as err:
+            print(f'  [ERR] previews for document {doc_id}: {err}')
+            digests, state = (None, None), FAILED
+        with self._lock:
+            self._seconds += time.perf_counter() - started
+
+        with self.get_db() as conn:
+            return self._save(conn, doc_id, doc['student_id'], state, *digests)
+
+    def _save(self, conn, doc_id, student_id, state, thumb=None, preview=None):
+        cursor = conn.cursor()
+        # Student row first (the order every document write uses); the list
+        # ETag changes so clients pick up the new thumbnail
+        cursor.execute('UPDATE students SET docs_version = docs_version + 1, '
+                       'docs_updated_at = NOW() WHERE id = %s', (student_id,))
+        cursor.execute('UPDATE medical_documents SET preview_state = %s, thumb_sha256 = %s, '
+                       'preview_sha256 = %s WHERE id = %s', (state, thumb, preview, doc_id))
+        conn.commit()
+        with self._lock:
+            if state == READY:
+                self._ready += 1
+            elif state == FAILED:
+                self._failed += 1
+        if self.on_done:
+            self.on_done(student_id)
+        return state
+
+    @contextlib.contextmanager
+    def _local_copy(self, digest):
+        """A filesystem path holding the blob, for the worker process to open."""
+        path = self.store.local_path(digest)
+        if path:
+            yield path
+            return
+        with tempfile.NamedTemporaryFile(delete=False) as tmp, self.store.open(digest) as source:
+            shutil.copyfileobj(source, tmp)
+        try:
+            yield tmp.name
+        finally:
+            os.unlink(tmp.name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'ready': self._ready,
+                'reused': self._reused,
+                'failed': self._failed,
+                'render_seconds': round(self._seconds, 6),
+                'images': Image is not None,
+                'pdf': Image is not None and pypdfium2 is not None,
+            }
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
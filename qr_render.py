@@ -0,0 +1,106 @@
+"""
+LifelineQR - Server-side QR code rendering with an on-disk cache.
+Images are stored under a digest of the encoded text and the rendering
+options, so a student's code is rendered once and reused until their
+emergency payload is reissued (which changes the text, and so the key).
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import segno
+except ImportError:  # optional; QR images cannot be rendered server-side without it
+    segno = None
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# Fallback text when no signed payload is available (js/qr-handler.js format)
+PLAIN_PREFIX = 'LIFELINE-QR-'
+
+
+def qr_text(student_id, payload=None):
+    """What a student's code encodes: the signed payload, else the plain ID."""
+    return payload or f'{PLAIN_PREFIX}{student_id}'
+
+
+def error_level(text):
+    """H for the short ID codes; M keeps the longer payload's modules large enough to scan."""
+    return 'h' if text.startswith(PLAIN_PREFIX) else 'm'
+
+
+def render(text, fmt, scale=8, border=4):
+    """PNG or SVG bytes for ``text``."""
+    if segno is None:
+        raise RuntimeError('QR rendering needs the segno package (pip install segno)')
+    qr = segno.make(text, error=error_level(text), micro=False)
+    out = io.BytesIO()
+    if fmt == 'svg':
+        qr.save(out, kind='svg', scale=scale, border=border, xmldecl=False)
+    else:
+        qr.save(out, kind='png', scale=scale, border=border)
+    return out.getvalue()
+
+
+class QRCache:
+    """Rendered codes as files under root/ab/<key>.<format>, written atomically.
+
+    Safe to share between threads and processes: concurrent renders of the
+    same key write identical bytes and the last rename wins.
+    """
+
+    def __init__(self, root, scale=8, border=4):
+        self.root = os.path.abspath(root)
+        self.scale = scale
+        self.border = border
+        self._tmp = os.path.join(self.root, 'tmp')
+        os.makedirs(self._tmp, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._render_seconds = 0.0
+
+    def key(self, text, fmt):
+        options = f'{fmt}:{self.scale}:{self.border}:{error_level(text)}:'
+        return hashlib.sha256((options + text).encode('utf-8')).hexdigest()
+
+    def path(self, key, fmt):
+        return os.path.join(self.root, key[:2], f'{key}.{fmt}')
+
+    def get(self, text, fmt):
+        """(path, key) of the rendered image, rendering it on a miss."""
+        key = self.key(text, fmt)
+        path = self.path(key, fmt)
+        if os.path.exists(path):
+            with self._lock:
+                self._hits += 1
+            return path, key
+
+        started = time.perf_counter()
+        data = render(text, fmt, self.scale, self.border)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self._tmp, delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        with self._lock:
+            self._misses += 1
+            self._render_seconds += time.perf_counter() - started
+        return path, key
+
+    def read(self, text, fmt):
+        path, _ = self.get(text, fmt)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'render_seconds': round(self._render_seconds, 6),
+            }
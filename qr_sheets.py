@@ -0,0 +1,186 @@
+"""
+LifelineQR - Printable QR card sheets for a whole class.
+Codes are rendered across a process pool (QR encoding is CPU-bound pure
+Python) through the shared on-disk cache, then laid out as an A4 HTML page
+ready to print. Jobs run in the background and keep their progress on disk
+so any server process can report on them.
+"""
+
+import html
+import json
+import math
+import multiprocessing
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from qr_render import QRCache
+
+# Cards per task sent to a worker process: large enough to amortise the
+# round trip, small enough that progress moves steadily
+MAX_CHUNK = 50
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+SHEET_STYLE = """
+@page { size: A4; margin: 10mm; }
+body { font-family: Arial, sans-serif; margin: 0; }
+h1 { font-size: 14pt; margin: 0 0 4mm; }
+.sheet { display: grid; grid-template-columns: repeat(3, 1fr); gap: 4mm; }
+.card { border: 1px dashed #999; padding: 3mm; text-align: center; break-inside: avoid; }
+.card svg { width: 48mm; height: 48mm; }
+.name { font-weight: bold; font-size: 10pt; margin-top: 1mm; }
+.meta { font-size: 8pt; color: #444; }
+"""
+
+
+def _render_cards(cache_root, scale, border, cards):
+    """Worker: [(student id, SVG markup)] for a chunk of (id, text) pairs."""
+    cache = QRCache(cache_root, scale, border)
+    return [(student_id, cache.read(text, 'svg').decode('utf-8')) for student_id, text in cards]
+
+
+def render_sheet(title, cards, cache, executor=None, workers=1, progress=None):
+    """HTML sheet for ``cards`` (dicts with id, name, student_class, section, roll_number, text).
+
+    With an ``executor`` the codes are rendered in ``workers``-way parallel
+    chunks; ``progress(done, total)`` is called as chunks finish.
+    """
+    total = len(cards)
+    pairs = [(card['id'], card['text']) for card in cards]
+    svgs = {}
+
+    if executor is None or total <= MAX_CHUNK:
+        for start in range(0, total, MAX_CHUNK):
+            for student_id, svg in _render_cards(cache.root, cache.scale, cache.border,
+                                                 pairs[start:start + MAX_CHUNK]):
+                svgs[student_id] = svg
+            if progress:
+                progress(len(svgs), total)
+    else:
+        size = max(1, min(MAX_CHUNK, math.ceil(total / (workers * 4))))
+        futures = [executor.submit(_render_cards, cache.root, cache.scale, cache.border,
+                                   pairs[start:start + size])
+                   for start in range(0, total, size)]
+        for future in as_completed(futures):
+            svgs.update(future.result())
+            if progress:
+                progress(len(svgs), total)
+
+    out = ['<!DOCTYPE html><html><head><meta charset="utf-8">',
+           f'<title>{html.escape(title)}</title><style>{SHEET_STYLE}</style></head><body>',
+           f'<h1>{html.escape(title)} &middot; {total} students</h1><div class="sheet">']
+    for card in cards:
+        klass = ' - '.join(filter(None, [card.get('student_class'), card.get('section')]))
+        meta = ' &middot; '.join(html.escape(v) for v in filter(None, [
+            f'Class {klass}' if klass else None,
+            f"Roll {card['roll_number']}" if card.get('roll_number') else None,
+        ]))
+        out.append(f'<div class="card">{svgs[card["id"]]}'
+                   f'<div class="name">{html.escape(card.get("name") or "")}</div>'
+                   f'<div class="meta">{meta}</div></div>')
+    out.append('</div></body></html>')
+    return ''.join(out)
+
+
+class SheetJobs:
+    """Class sheets rendered in the background.
+
+    Each job is <id>.json (status, rewritten as it progresses) plus <id>.html
+    once done, in ``directory``; both are removed ``expire_after`` seconds
+    after they were last written.
+    """
+
+    def __init__(self, directory, cache, workers=None, expire_after=3600):
+        self.directory = directory
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        self.expire_after = expire_after
+        self._lock = threading.Lock()
+        self._executor = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, job_id):
+        if not _JOB_ID.match(job_id or ''):
+            raise KeyError(job_id)
+        base = os.path.join(self.directory, job_id)
+        return base + '.json', base + '.html'
+
+    def executor(self):
+        """The worker pool, started on first use and kept for later jobs."""
+        with self._lock:
+            if self._executor is None and self.workers > 1:
+                # spawn, not fork: the server process has threads and open sockets
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def start(self, title, cards):
+        """Queue a sheet for ``cards``; returns the job's initial status."""
+        self.purge_expired()
+        job_id = secrets.token_hex(16)
+        status = {'job_id': job_id, 'title': title, 'state': 'running', 'total': len(cards),
+                  'done': 0, 'created': time.time(), 'seconds': None, 'error': None}
+        self._write(status)
+        threading.Thread(target=self._run, args=(status, cards), daemon=True,
+                         name=f'qr-sheet-{job_id[:8]}').start()
+        return dict(status)
+
+    def _run(self, status, cards):
+        started = time.perf_counter()
+        last_write = [0.0]
+
+        def progress(done, total):
+            status['done'] = done
+            # Bounded status rewrites however small the chunks are
+            if done == total or time.monotonic() - last_write[0] >= 0.25:
+                last_write[0] = time.monotonic()
+                self._write(status)
+
+        try:
+            sheet = render_sheet(status['title'], cards, self.cache, self.executor(),
+                                 self.workers, progress)
+            _, html_path = self._paths(status['job_id'])
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.directory,
+                                             delete=False) as tmp:
+                tmp.write(sheet)
+            os.replace(tmp.name, html_path)
+            status['state'] = 'done'
+        except Exception as err:
+            status.update(state='failed', error=str(err))
+        status['seconds'] = round(time.perf_counter() - started, 3)
+        self._write(status)
+
+    def _write(self, status):
+        meta_path, _ = self._paths(status['job_id'])
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, delete=False) as tmp:
+            json.dump(status, tmp)
+        os.replace(tmp.name, meta_path)
+
+    def status(self, job_id):
+        meta_path, _ = self._paths(job_id)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def sheet_path(self, job_id):
+        """Path of a finished sheet; KeyError while missing or unfinished."""
+        if self.status(job_id)['state'] != 'done':
+            raise KeyError(job_id)
+        return self._paths(job_id)[1]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.expire_after
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,201 @@
+"""
+LifelineQR - Read/write splitting between the MySQL primary and a replica.
+Read-only endpoints check out connections through ReplicaRouter, which hands
+out a replica connection while the replica is reachable and no further
+behind than max_lag, and a primary one otherwise. A client that has just
+written is pinned to the primary for a few seconds, so it reads its own
+writes however far the replica lags. With SharedPins the pin holds in every
+server process, whichever worker the follow-up read lands on.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import mysql.connector
+from mysql.connector import errorcode
+
+# Clients remembered as having written recently; the oldest are forgotten first
+MAX_SESSIONS = 10000
+
+_EXPIRY = struct.Struct('<d')
+
+
+class SharedPins:
+    """Pin expiry times in a memory-mapped file every server process maps.
+
+    Sessions share the ``slots`` entries by hash; a collision only sends an
+    unrelated client's reads to the primary for a few seconds.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        size = slots * _EXPIRY.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, session):
+        return zlib.crc32(repr(session).encode()) % self.slots * _EXPIRY.size
+
+    def pin(self, session, until):
+        # Concurrent pins of one slot all expire within a write's sticky window
+        # of each other, so the last writer winning is fine without a lock
+        _EXPIRY.pack_into(self._map, self._offset(session), until)
+
+    def pinned(self, session):
+        return _EXPIRY.unpack_from(self._map, self._offset(session))[0] > time.time()
+
+    def count(self):
+        now = time.time()
+        return sum(1 for (until,) in _EXPIRY.iter_unpack(self._map) if until > now)
+
+
+def replica_lag(conn):
+    """Seconds the replica behind ``conn`` lags its source (None: not replicating)."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('SHOW REPLICA STATUS')
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_PARSE_ERROR:
+            raise
+        cursor.execute('SHOW SLAVE STATUS')  # MySQL before 8.0.22, MariaDB
+    row = cursor.fetchone()
+    cursor.fetchall()
+    if row is None:
+        return None
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    """Chooses between the primary and replica pools for each read.
+
+    primary        -- pool every write and every fallback read uses
+    replica        -- pool of the read replica
+    max_lag        -- seconds of replication lag beyond which reads go to the primary
+    check_interval -- seconds between replication lag checks
+    sticky_seconds -- how long a client that wrote keeps reading from the primary;
+                      keep it above max_lag + check_interval
+    shared_pins    -- SharedPins seen by every server process (None: pins stay in
+                      this process, enough for a single-process server)
+
+    The lag is checked on the request path, by the first read after
+    check_interval has passed; concurrent reads use the last result.
+    """
+
+    def __init__(self, primary, replica, max_lag=2.0, check_interval=1.0, sticky_seconds=5.0,
+                 shared_pins=None):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.shared_pins = shared_pins
+
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._pinned = OrderedDict()    # session -> monotonic time its pin expires
+        self._next_check = 0.0
+        self._lag = None
+        self._healthy = False
+        self._reason = 'not checked yet'
+        self._reads = {'replica': 0, 'primary_pinned': 0, 'primary_lagging': 0}
+
+    # ── Sessions ─────────────────────────────────────────────────────────
+
+    def pin(self, session):
+        """Send ``session``'s reads to the primary for sticky_seconds (after a write)."""
+        if self.shared_pins is not None:
+            self.shared_pins.pin(session, time.time() + self.sticky_seconds)
+            return
+        with self._lock:
+            self._pinned[session] = time.monotonic() + self.sticky_seconds
+            self._pinned.move_to_end(session)
+            while len(self._pinned) > MAX_SESSIONS:
+                self._pinned.popitem(last=False)
+
+    def pinned(self, session):
+        if self.shared_pins is not None:
+            return self.shared_pins.pinned(session)
+        with self._lock:
+            until = self._pinned.get(session)
+            if until is None:
+                return False
+            if until > time.monotonic():
+                return True
+            del self._pinned[session]
+            return False
+
+    # ── Replica health ───────────────────────────────────────────────────
+
+    def check_due(self):
+        return time.monotonic() >= self._next_check
+
+    def check(self):
+        """Measure replication lag now, unless another thread already is."""
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                with self.replica.connection() as conn:
+                    lag = replica_lag(conn)
+            except mysql.connector.Error as err:
+                healthy, lag, reason = False, None, f'unreachable: {err}'
+            else:
+                if lag is None:
+                    healthy, reason = False, 'replication is not running'
+                elif lag > self.max_lag:
+                    healthy, reason = False, f'lagging {lag:g}s'
+                else:
+                    healthy, reason = True, None
+            if healthy != self._healthy:
+                print(f"  [{'OK' if healthy else 'ERR'}] Read replica "
+                      f"{'in use' if healthy else 'bypassed: ' + reason}")
+            self._lag, self._healthy, self._reason = lag, healthy, reason
+            self._next_check = time.monotonic() + self.check_interval
+        finally:
+            self._check_lock.release()
+
+    # ── Routing ──────────────────────────────────────────────────────────
+
+    def use_replica(self, session):
+        """Whether a read by ``session`` may go to the replica (no I/O; see check)."""
+        if self.pinned(session):
+            outcome = 'primary_pinned'
+        elif not self._healthy:
+            outcome = 'primary_lagging'
+        else:
+            outcome = 'replica'
+        with self._lock:
+            self._reads[outcome] += 1
+        return outcome == 'replica'
+
+    def connection(self, session):
+        """A connection for a read-only request by ``session``."""
+        if self.check_due():
+            self.check()
+        pool = self.replica if self.use_replica(session) else self.primary
+        return pool.connection()
+
+    def stats(self):
+        pinned = self.shared_pins.count() if self.shared_pins is not None else None
+        with self._lock:
+            return {
+                'healthy': self._healthy,
+                'lag_seconds': self._lag,
+                'reason': self._reason,
+                'max_lag_seconds': self.max_lag,
+                'sticky_seconds': self.sticky_seconds,
+                'pinned_sessions': len(self._pinned) if pinned is None else pinned,
+                'reads': dict(self._reads),
+            }
@@ -0,0 +1,241 @@
+"""
+LifelineQR - Bulk student roster import and export.
+Imports read a CSV or NDJSON roster row by row, validate each student, check
+a whole batch of emails with one query and insert the batch with a single
+multi-row INSERT. Bad rows are reported by line number; the rest go in.
+Exports stream rows from an unbuffered cursor a few hundred at a time.
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import date
+
+import mysql.connector
+
+import stats
+
+DEFAULT_BATCH_SIZE = 500
+EXPORT_FETCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUMNS = (
+    'name', 'age', 'email', 'password', 'blood_group', 'allergies', 'medical_conditions',
+    'regular_medications', 'address', 'emergency_contacts', 'student_class', 'section',
+    'roll_number', 'parent_name',
+)
+REQUIRED = ('name', 'age', 'email', 'password')
+
+# VARCHAR limits from the students table; longer values are row errors, not batch failures
+MAX_LENGTHS = {
+    'name': 255, 'email': 255, 'password': 255, 'blood_group': 5, 'emergency_contacts': 20,
+    'student_class': 10, 'section': 5, 'roll_number': 20, 'parent_name': 255,
+}
+
+# Header / key spellings: student_class, studentClass, "Student Class" and class all match
+_ALIASES = {c.replace('_', ''): c for c in COLUMNS}
+_ALIASES['class'] = 'student_class'
+
+INSERT_SQL = (f"INSERT INTO students ({', '.join(COLUMNS)}) "
+              f"VALUES ({', '.join(['%s'] * len(COLUMNS))})")
+
+
+class RowError(ValueError):
+    """A roster row that cannot be imported."""
+
+
+def _column_for(key):
+    return _ALIASES.get(re.sub(r'[^a-z]', '', str(key).lower()))
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, record_or_None, error_or_None) from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                yield line_no, None, f'Invalid JSON: {err}'
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, 'Expected a JSON object'
+                continue
+            yield line_no, record, None
+    else:
+        raise ValueError(f'Unsupported roster format: {fmt}')
+
+
+def validate(record, default_password=None):
+    """Map a raw record onto COLUMNS; returns the INSERT value tuple."""
+    row = {}
+    for key, value in record.items():
+        column = _column_for(key)
+        if column and value is not None:
+            row[column] = str(value).strip()
+    if default_password and not row.get('password'):
+        row['password'] = default_password
+
+    for field in REQUIRED:
+        if not row.get(field):
+            raise RowError(f'{field} is required')
+    try:
+        row['age'] = int(row['age'])
+    except ValueError:
+        raise RowError('age must be a whole number')
+    if row['age'] <= 0:
+        raise RowError('age must be positive')
+    row['email'] = row['email'].lower()
+    if '@' not in row['email']:
+        raise RowError('email is not valid')
+    for field, limit in MAX_LENGTHS.items():
+        if len(row.get(field, '')) > limit:
+            raise RowError(f'{field} is longer than {limit} characters')
+
+    return tuple(row.get(c, '') for c in COLUMNS)
+
+
+class RosterImporter:
+    """Insert validated roster rows in batches of ``batch_size``.
+
+    Each batch is one transaction: an IN (...) lookup for existing emails,
+    one multi-row INSERT (mysql.connector rewrites ``executemany`` into a
+    single statement) and the dashboard counter bump. ``progress(rows)``,
+    if given, is called with the number of rows handled after each batch.
+    """
+
+    def __init__(self, conn, batch_size=DEFAULT_BATCH_SIZE, default_password=None,
+                 progress=None):
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.default_password = default_password
+        self.progress = progress
+        self.inserted = 0
+        self.errors = []
+        self._seen = set()
+
+    def run(self, rows):
+        """Import (line, record, error) tuples from ``read_rows``; returns the report."""
+        batch = []
+        for line, record, error in rows:
+            if error:
+                self._fail(line, None, error)
+                continue
+            try:
+                values = validate(record, self.default_password)
+            except RowError as err:
+                email = next((v for k, v in record.items() if _column_for(k) == 'email'), None)
+                self._fail(line, email, str(err))
+                continue
+            email = values[2]
+            if email in self._seen:
+                self._fail(line, email, 'Duplicate email in roster')
+                continue
+            self._seen.add(email)
+            batch.append((line, values))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self.report()
+
+    def _flush(self, batch):
+        self._insert(batch)
+        if self.progress:
+            self.progress(self.inserted + len(self.errors))
+
+    def report(self):
+        return {
+            'inserted': self.inserted,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def _fail(self, line, email, error):
+        self.errors.append({'line': line, 'email': email, 'error': error})
+
+    def _insert(self, batch):
+        cursor = self.conn.cursor()
+        emails = [values[2] for _, values in batch]
+        placeholders = ', '.join(['%s'] * len(emails))
+        cursor.execute(f'SELECT email FROM students WHERE email IN ({placeholders})', emails)
+        taken = {email.lower() for (email,) in cursor.fetchall()}
+
+        pending = []
+        for line, values in batch:
+            if values[2] in taken:
+                self._fail(line, values[2], 'Email already registered')
+            else:
+                pending.append((line, values))
+        if not pending:
+            self.conn.rollback()
+            return
+
+        try:
+            cursor.executemany(INSERT_SQL, [values for _, values in pending])
+            inserted = len(pending)
+        except mysql.connector.Error:
+            # Registered concurrently, or a value MySQL rejects: redo row by row
+            # so only the offending rows are reported
+            self.conn.rollback()
+            inserted = 0
+            for line, values in pending:
+                try:
+                    cursor.execute(INSERT_SQL, values)
+                    inserted += 1
+                except mysql.connector.Error as err:
+                    self._fail(line, values[2], str(err))
+
+        if inserted:
+            stats.bump(cursor, {'total_students': inserted})
+            stats.bump_daily(cursor, stats.DAILY_REGISTRATIONS, inserted)
+        self.conn.commit()
+        self.inserted += inserted
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def export_header(fields, fmt):
+    """Text that precedes the rows: the CSV header line, nothing for NDJSON."""
+    if fmt != 'csv':
+        return ''
+    buf = io.StringIO()
+    csv.writer(buf).writerow(fields)
+    return buf.getvalue()
+
+
+def iter_export(cursor, fields, fmt, fetch_size=EXPORT_FETCH_SIZE):
+    """Yield text chunks for the rows of an executed, unbuffered cursor.
+
+    Rows are pulled ``fetch_size`` at a time, so memory stays flat no matter
+    how many students match.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for row in rows:
+            values = [_plain(v) for v in row]
+            if fmt == 'csv':
+                writer.writerow(values)
+            else:
+                buf.write(json.dumps(dict(zip(fields, values))))
+                buf.write('\n')
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
@@ -0,0 +1,239 @@
+"""
+LifelineQR - In-process LRU + TTL cache for the emergency scan path.
+Entries past their TTL are reloaded on the next read, but are kept around
+(up to stale_ttl) so a scan can still be answered if MySQL is unreachable.
+With a SharedGenerations file, an invalidation in one server process also
+drops the entry in every other process before its next hit.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single waitress process, a thread lock is enough
+    fcntl = None
+
+_COUNTER = struct.Struct('<Q')
+
+
+class SharedGenerations:
+    """Per-key invalidation counters in a memory-mapped file every process maps.
+
+    A cached entry remembers the counter of its key when its load began; a
+    bump from any process makes it unusable. Keys share the ``slots``
+    counters by hash, so a collision only costs an extra reload.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self._thread_lock = threading.Lock()
+        size = slots * _COUNTER.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, key):
+        return zlib.crc32(str(key).encode()) % self.slots * _COUNTER.size
+
+    def get(self, key):
+        return _COUNTER.unpack_from(self._map, self._offset(key))[0]
+
+    def bump(self, key):
+        offset = self._offset(key)
+        # Read-increment-write must not lose a bump to another process; the
+        # lock file is opened per call, as a descriptor inherited across
+        # fork would be one lock shared by parent and child
+        with self._thread_lock, open(self.path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            _COUNTER.pack_into(self._map, offset, _COUNTER.unpack_from(self._map, offset)[0] + 1)
+
+
+class _Load:
+    """A load in flight for one key; concurrent readers wait on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = []     # futures of coroutines awaiting this load
+        self.value = None
+        self.error = None
+        self.invalidated = False
+        self.generation = 0    # of the key when the load began
+
+    def finish(self):
+        """Wake every waiter; call with the cache lock held."""
+        self.done.set()
+        for fut in self.waiters:
+            fut.get_loop().call_soon_threadsafe(_resolve, fut)
+
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class ScanCache:
+    """Thread-safe read-through cache.
+
+    maxsize   -- number of entries kept (least recently used evicted first)
+    ttl       -- seconds an entry is served without reloading
+    stale_ttl -- seconds an expired entry may still be served if reloading fails
+    shared    -- SharedGenerations carrying invalidations between processes
+    """
+
+    def __init__(self, maxsize=2048, ttl=60, stale_ttl=86400, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, stored_at, generation)
+        self._loading = {}              # key -> _Load
+
+        self._hits = 0
+        self._misses = 0
+        self._stale_served = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """Return (value, state) where state is 'hit', 'miss' or 'stale'.
+
+        ``loader()`` is called at most once per key at a time; a loader that
+        returns None is not cached.
+        """
+        value, load, owner = self._begin(key)
+        if load is None:
+            return value, 'hit'
+
+        if owner:
+            try:
+                load.value = loader()
+            except Exception as err:
+                load.error = err
+            self._finish(key, load)
+        else:
+            load.done.wait()
+        return self._result(key, load)
+
+    async def aget_or_load(self, key, loader):
+        """Coroutine form of ``get_or_load`` for the ASGI app; ``loader`` is async.
+
+        Shares entries, single-flight loads and invalidation with the
+        threaded callers.
+        """
+        value, load, owner = self._begin(key)
+        if load is None:
+            return value, 'hit'
+
+        if owner:
+            try:
+                load.value = await loader()
+            except Exception as err:
+                load.error = err
+            self._finish(key, load)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            with self._lock:
+                if not load.done.is_set():
+                    load.waiters.append(fut)
+                else:
+                    fut.set_result(None)
+            await fut
+        return self._result(key, load)
+
+    def _begin(self, key):
+        """(value, None, False) on a fresh hit, else (None, load, is_owner)."""
+        # Read before loading: a write committed after this point bumps past it
+        generation = self.shared.get(key) if self.shared is not None else 0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] != generation:
+                # Invalidated by another process: gone, as if invalidated here
+                del self._entries[key]
+                entry = None
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0], None, False
+            load = self._loading.get(key)
+            owner = load is None
+            if owner:
+                load = self._loading[key] = _Load()
+                load.generation = generation
+            self._misses += 1
+        return None, load, owner
+
+    def _finish(self, key, load):
+        with self._lock:
+            del self._loading[key]
+            if load.error is None and load.value is not None and not load.invalidated:
+                self._store(key, load.value, load.generation)
+            load.finish()
+
+    def _result(self, key, load):
+        if load.error is None:
+            return load.value, 'miss'
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.stale_ttl:
+                self._stale_served += 1
+                return entry[0], 'stale'
+        raise load.error
+
+    def _store(self, key, value, generation):
+        self._entries[key] = (value, time.monotonic(), generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, key):
+        """Drop key, and stop any in-flight load from storing its stale result.
+
+        Call it after the write has committed.
+        """
+        if self.shared is not None:
+            self.shared.bump(key)
+        with self._lock:
+            self._entries.pop(key, None)
+            load = self._loading.get(key)
+            if load is not None:
+                load.invalidated = True
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for load in self._loading.values():
+                load.invalidated = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'stale_served': self._stale_served,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
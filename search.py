@@ -0,0 +1,200 @@
+"""
+LifelineQR - Ranked search over students and doctors for /api/search.
+Candidates come only from index-backed lookups (FULLTEXT word prefixes, or
+FTS5 on SQLite, plus B-tree prefix / equality matches), each capped at
+CANDIDATE_LIMIT rows, so a query's cost stays bounded however large the
+tables grow. Candidates are then scored and paged in one statement.
+"""
+
+import base64
+import binascii
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from listing import ListingError, parse_fields, parse_filters, parse_limit, select_list
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+# Rows fetched per index lookup; also the deepest result a client can page to
+CANDIDATE_LIMIT = 1000
+# InnoDB ignores shorter words (innodb_ft_min_token_size)
+FULLTEXT_MIN_TOKEN = 3
+
+# type -> FULLTEXT column list and (column, match, boost) lookups. Each lookup
+# is a candidate source with its own index (created by migrations.py) and
+# adds its boost to the full-text relevance of the rows it matches.
+TARGETS = {
+    'students': {
+        'fulltext': 'name, email, roll_number, parent_name',
+        'lookups': [
+            ('email', 'exact', 100),
+            ('roll_number', 'exact', 80),
+            ('name', 'prefix', 40),
+            ('email', 'prefix', 30),
+            ('parent_name', 'prefix', 20),
+            ('student_class', 'exact', 10),
+        ],
+    },
+    'doctors': {
+        'fulltext': 'name, specialization, hospital',
+        'lookups': [
+            ('name', 'prefix', 40),
+            ('specialization', 'prefix', 30),
+            ('hospital', 'prefix', 20),
+        ],
+    },
+}
+
+_WORD = re.compile(r'\w+')
+
+# A parsed /api/search request and the statement that answers it
+SearchPage = namedtuple('SearchPage', 'target fields limit offset sql params')
+
+
+def parse_target(args):
+    target = args.get('type', 'students')
+    if target not in TARGETS:
+        raise ListingError(f"type must be one of: {', '.join(TARGETS)}")
+    return target
+
+
+def parse_query(args):
+    q = ' '.join(args.get('q', '').split())
+    if len(q) < MIN_QUERY_LENGTH:
+        raise ListingError(f'q must be at least {MIN_QUERY_LENGTH} characters')
+    return q[:MAX_QUERY_LENGTH]
+
+
+def encode_offset(offset):
+    return base64.urlsafe_b64encode(f'o{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_offset(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        if not raw.startswith('o'):
+            raise ValueError(raw)
+        offset = int(raw[1:])
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ListingError('Invalid cursor')
+    if not 0 <= offset < CANDIDATE_LIMIT:
+        raise ListingError('Invalid cursor')
+    return offset
+
+
+def fulltext_terms(q, dialect='mysql'):
+    """Boolean-mode query requiring every indexable word, each as a prefix.
+
+    For SQLite it is the same query in FTS5 syntax, e.g. ``"ann"* "lee"*``.
+    """
+    words = [w for w in _WORD.findall(q) if len(w) >= FULLTEXT_MIN_TOKEN]
+    if dialect == 'sqlite':
+        return ' '.join(f'"{w}"*' for w in words)
+    return ' '.join(f'+{w}*' for w in words)
+
+
+def _like_prefix(q):
+    return q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_query(target, q, columns, filters, offset, limit, dialect='mysql'):
+    """SELECT one ranked page (plus one row, to detect whether another follows).
+
+    columns maps each output field to its SQL expression; filters are
+    (sql, params) equality predicates from listing.parse_filters. With
+    dialect='sqlite' the full-text part uses the FTS5 table kept by
+    sqlite_db.py (``<table>_fts``) and its bm25 rank instead of MATCH().
+    """
+    spec = TARGETS[target]
+    table = target
+    terms = fulltext_terms(q, dialect)
+    match = f"MATCH({spec['fulltext']}) AGAINST (%s IN BOOLEAN MODE)"
+    if dialect == 'sqlite':
+        fts = f'{table}_fts'
+        match = (f'COALESCE((SELECT -bm25({fts}) FROM {fts} '
+                 f'WHERE {fts} MATCH %s AND rowid = {table}.id), 0)')
+
+    # Filters go inside every branch, so the per-branch cap counts only
+    # rows the client can actually get back
+    filter_sql = ''.join(f' AND {clause}' for clause, _ in filters)
+    filter_params = [p for _, ps in filters for p in ps]
+
+    branches, branch_params = [], []
+    score, score_params = [], []
+    if terms and dialect == 'sqlite':
+        branches.append(f'SELECT {table}.id FROM {fts} JOIN {table} ON {table}.id = {fts}.rowid '
+                        f'WHERE {fts} MATCH %s{filter_sql} '
+                        f'ORDER BY {fts}.rank LIMIT {CANDIDATE_LIMIT}')
+        branch_params += [terms] + filter_params
+        score.append(match)
+        score_params.append(terms)
+    elif terms:
+        branches.append(f'SELECT id FROM {table} WHERE {match}{filter_sql} '
+                        f'ORDER BY {match} DESC LIMIT {CANDIDATE_LIMIT}')
+        branch_params += [terms] + filter_params + [terms]
+        score.append(match)
+        score_params.append(terms)
+    for column, kind, boost in spec['lookups']:
+        predicate = f'{column} LIKE %s' if kind == 'prefix' else f'{column} = %s'
+        value = _like_prefix(q) if kind == 'prefix' else q
+        branches.append(f'SELECT id FROM {table} WHERE {predicate}{filter_sql} '
+                        f'LIMIT {CANDIDATE_LIMIT}')
+        branch_params += [value] + filter_params
+        score.append(f'IF({predicate}, {boost}, 0)')
+        score_params.append(value)
+
+    select = select_list(columns)
+    if 'id' not in columns:
+        select.append('id')
+    select.append(f"({' + '.join(score)}) AS score")
+
+    if dialect == 'sqlite':
+        # A compound SELECT takes no parenthesised members; subqueries keep their LIMITs
+        candidates = ' UNION '.join(f'SELECT id FROM ({sql})' for sql in branches)
+    else:
+        candidates = ' UNION '.join(f'({sql})' for sql in branches)
+    sql = (f"SELECT {', '.join(select)} FROM {table} "
+           f"JOIN ({candidates}) AS candidates USING (id) "
+           f"ORDER BY score DESC, id LIMIT %s OFFSET %s")
+    return sql, score_params + branch_params + [limit + 1, offset]
+
+
+def parse_request(args, columns_by_target, filters_by_target, dialect='mysql'):
+    """Validate the query string (a 400 via ListingError) and build its SearchPage.
+
+    columns_by_target / filters_by_target map 'students' / 'doctors' to the
+    same column and filter specs the list endpoints use; dialect is the
+    database backend ('mysql' or 'sqlite').
+    """
+    target = parse_target(args)
+    q = parse_query(args)
+    columns = columns_by_target[target]
+    fields = parse_fields(args, columns)
+    limit = parse_limit(args, DEFAULT_LIMIT, MAX_LIMIT)
+    offset = decode_offset(args['cursor']) if args.get('cursor') else 0
+    sql, params = search_query(target, q, {f: columns[f] for f in fields},
+                               parse_filters(args, filters_by_target[target]), offset, limit,
+                               dialect)
+    return SearchPage(target, fields, limit, offset, sql, params)
+
+
+def finish_page(rows, page):
+    """Trim the look-ahead row, build next_cursor and serialise values."""
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        if page.offset + page.limit < CANDIDATE_LIMIT:
+            next_cursor = encode_offset(page.offset + page.limit)
+
+    for row in rows:
+        if 'id' not in page.fields:
+            row.pop('id', None)
+        row['score'] = round(float(row['score'] or 0), 4)
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+
+    return rows, next_cursor
@@ -4,194 +4,586 @@ Handles doctor and student registration via REST API,
 stores data in MySQL 'lifelineqr' database.
 """
 
-from flask import Flask, request, jsonify
+import atexit
+import base64
+import csv
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import secrets
+import shutil
+import sys
+import tempfile
+
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import mysql.connector
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
+import access_log
+from blob_store import BlobNotFound, decode_data_url, make_blob_store
+from compression import DEFAULT_TYPES as COMPRESS_DEFAULT_TYPES, ResponseCompressor
+import config
+from db_pool import ConnectionPool
+import emergency_payload
+import http_cache
+import jobs
+from listing import (ListingError, decode_cursor, encode_cursor, export_query, finish_page,
+                     keyset_query, parse_bool, parse_fields, parse_filters, parse_limit)
+import metrics
+import migrations
+import previews
+import qr_render
+from qr_sheets import SheetJobs
+from replicas import ReplicaRouter, SharedPins
+import roster
+from scan_cache import ScanCache, SharedGenerations
+import search
+import sql_profile
+from sqlite_db import SQLitePool
+import stats
+from uploads import (ResumableUploads, UploadConflict, UploadTooLarge,
+                     spool_multipart, spool_stream)
+
 app = Flask(__name__)
 CORS(app)  # Allow requests from the frontend
 
 # ── MySQL connection config ──────────────────────────────────────────────────
-# Try common MySQL root passwords so the app works on any machine.
-# The first password that connects successfully will be used.
-# If none work, update the password below to match YOUR MySQL root password.
-_MYSQL_HOST = 'localhost'
-_MYSQL_USER = 'root'
-_MYSQL_DB   = 'lifelineqr'
-_MYSQL_PASSWORDS_TO_TRY = [
-    '',           # XAMPP / WAMP default (no password)
-    'sjssjs',     # Original developer password
-    'root',       # Common default
-    'mysql',      # Common default
-    'password',   # Common default
-    'MC9044PKM',  # Client's password
-]
-
-# Auto-detect the correct password
-_detected_password = None
-_detection_errors = []
-
-for _pwd in _MYSQL_PASSWORDS_TO_TRY:
-    try:
-        _test = mysql.connector.connect(
-            host=_MYSQL_HOST, user=_MYSQL_USER, password=_pwd
-        )
-        _test.close()
-        _detected_password = _pwd
-        break
-    except mysql.connector.Error as err:
-        _detection_errors.append((_pwd, str(err)))
-        continue
-
-if _detected_password is None:
-    print("=" * 60)
-    print("  ERROR: Could not connect to MySQL with any known password!")
-    print(f"  We tried checking for user '{_MYSQL_USER}' but got these errors:")
-    for _pwd, err in _detection_errors:
-        display_pwd = "***" if _pwd else "(empty)"
-        # We explicitly show if MC9044PKM was attempted so the client can see exactly why it failed
-        if _pwd == 'MC9044PKM': display_pwd = 'MC9044PKM'
-        print(f"  - Password [{display_pwd}]: {err}")
-    print("=" * 60)
-    
-    import sys
-    if sys.stdin.isatty() or True:  # Attempt interactive prompt if possible
+# LIFELINEQR_DB_HOST / _PORT / _USER / _PASSWORD / _NAME, from the environment
+# or lifelineqr.env (see config.py). `python manage.py init-config` writes one.
+config.load()
+DB_CONFIG = config.db_config()
+# LIFELINEQR_DB_BACKEND=sqlite keeps everything in one local file instead
+# (sqlite_db.py), for a single-machine site without a MySQL server.
+DB_BACKEND = config.db_backend()
+
+# ── Connection pool ──────────────────────────────────────────────────────────
+# Tunable per deployment; defaults suit a single school server.
+DB_POOL_SIZE       = int(os.environ.get('LIFELINEQR_DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT    = float(os.environ.get('LIFELINEQR_DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE    = int(os.environ.get('LIFELINEQR_DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING   = os.environ.get('LIFELINEQR_DB_POOL_PRE_PING', '1') != '0'
+# SQLite: one connection per thread, each with its own page cache and mmap
+SQLITE_PATH        = config.sqlite_path()
+SQLITE_CACHE_MB    = int(os.environ.get('LIFELINEQR_SQLITE_CACHE_MB', 64))
+SQLITE_MMAP_MB     = int(os.environ.get('LIFELINEQR_SQLITE_MMAP_MB', 256))
+
+if DB_BACKEND == 'sqlite':
+    _pool = SQLitePool(
+        SQLITE_PATH,
+        timeout=DB_POOL_TIMEOUT,
+        cache_mb=SQLITE_CACHE_MB,
+        mmap_mb=SQLITE_MMAP_MB,
+    )
+else:
+    _pool = ConnectionPool(
+        DB_CONFIG,
+        size=DB_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        recycle=DB_POOL_RECYCLE,
+        pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+def get_db():
+    """Check out a pooled database connection.
+
+    Use it as ``with get_db() as conn:`` so the connection always goes back
+    to the pool, including on early returns and exceptions.
+    """
+    return _pool.connection()
+
+
+# ── Read replica ─────────────────────────────────────────────────────────────
+# Optional (MySQL only). With LIFELINEQR_DB_REPLICA_HOST set, the read-only
+# list, profile, document-list and dashboard endpoints read from the replica
+# while it is reachable and within DB_REPLICA_MAX_LAG seconds of the primary
+# (replicas.py). After a write, the same client reads from the primary for
+# DB_STICKY_SECONDS so it always sees its own change, whichever worker process
+# serves the read: pins live in DB_STICKY_FILE ('' = this process only, for a
+# single-process server). Scans stay on the primary.
+DB_REPLICA_CONFIG        = config.replica_config() if DB_BACKEND == 'mysql' else None
+DB_REPLICA_POOL_SIZE     = int(os.environ.get('LIFELINEQR_DB_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+DB_REPLICA_MAX_LAG       = float(os.environ.get('LIFELINEQR_DB_REPLICA_MAX_LAG', 2))
+DB_REPLICA_CHECK_SECONDS = float(os.environ.get('LIFELINEQR_DB_REPLICA_CHECK_SECONDS', 1))
+DB_STICKY_SECONDS        = float(os.environ.get('LIFELINEQR_DB_STICKY_SECONDS', 5))
+DB_STICKY_FILE           = os.environ.get(
+    'LIFELINEQR_DB_STICKY_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'replica_pins.bin'),
+)
+
+if DB_REPLICA_CONFIG:
+    if DB_STICKY_FILE:
+        os.makedirs(os.path.dirname(os.path.abspath(DB_STICKY_FILE)), exist_ok=True)
+    _replica_pool = ConnectionPool(
+        DB_REPLICA_CONFIG,
+        size=DB_REPLICA_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        recycle=DB_POOL_RECYCLE,
+        pre_ping=DB_POOL_PRE_PING,
+        timer=_pool.timer,    # replica queries count towards the request's DB time
+    )
+    _router = ReplicaRouter(
+        _pool,
+        _replica_pool,
+        max_lag=DB_REPLICA_MAX_LAG,
+        check_interval=DB_REPLICA_CHECK_SECONDS,
+        sticky_seconds=DB_STICKY_SECONDS,
+        shared_pins=SharedPins(DB_STICKY_FILE) if DB_STICKY_FILE else None,
+    )
+else:
+    _replica_pool = _router = None
+
+
+def _session():
+    """Who is asking, for read-your-writes; the app has no login session to key on."""
+    return request.remote_addr, request.headers.get('User-Agent', '')
+
+
+def get_read_db():
+    """Check out a connection for a read-only request (the replica when it may serve it).
+
+    Only for handlers that write nothing; everything else uses get_db().
+    """
+    if _router is None:
+        return _pool.connection()
+    return _router.connection(_session())
+
+
+@app.after_request
+def _pin_writer(response):
+    """Keep a client that just wrote on the primary for its next reads."""
+    if _router is not None and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        _router.pin(_session())
+    return response
+
+
+# ── Emergency scan cache ─────────────────────────────────────────────────────
+# Profiles + document lists served by /api/scan/<id>. Writes that touch a
+# student invalidate their entry in every server process, through counters in
+# SCAN_CACHE_GENERATIONS ('' = this process only, for a single-process server).
+SCAN_CACHE_SIZE        = int(os.environ.get('LIFELINEQR_SCAN_CACHE_SIZE', 2048))
+SCAN_CACHE_TTL         = float(os.environ.get('LIFELINEQR_SCAN_CACHE_TTL', 60))
+SCAN_CACHE_STALE_TTL   = float(os.environ.get('LIFELINEQR_SCAN_CACHE_STALE_TTL', 86400))
+SCAN_CACHE_GENERATIONS = os.environ.get(
+    'LIFELINEQR_SCAN_CACHE_GENERATIONS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'scan_cache.gen'),
+)
+
+if SCAN_CACHE_GENERATIONS:
+    os.makedirs(os.path.dirname(os.path.abspath(SCAN_CACHE_GENERATIONS)), exist_ok=True)
+
+_scan_cache = ScanCache(
+    maxsize=SCAN_CACHE_SIZE,
+    ttl=SCAN_CACHE_TTL,
+    stale_ttl=SCAN_CACHE_STALE_TTL,
+    shared=SharedGenerations(SCAN_CACHE_GENERATIONS) if SCAN_CACHE_GENERATIONS else None,
+)
+
+
+# ── Document blob store ──────────────────────────────────────────────────────
+# Document bytes live outside MySQL, addressed by SHA-256 digest.
+BLOB_STORE_URL = os.environ.get(
+    'LIFELINEQR_BLOB_STORE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'blobs'),
+)
+
+_blob_store = make_blob_store(BLOB_STORE_URL)
+
+
+# ── Uploads ──────────────────────────────────────────────────────────────────
+# Streamed uploads are spooled here before moving into the blob store; keep it
+# on the same filesystem as the store so the move is a rename.
+UPLOAD_DIR = os.environ.get(
+    'LIFELINEQR_UPLOAD_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'uploads'),
+)
+MAX_UPLOAD_BYTES   = int(os.environ.get('LIFELINEQR_MAX_UPLOAD_MB', 20)) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = int(os.environ.get('LIFELINEQR_UPLOAD_CHUNK_KB', 1024)) * 1024
+
+# Whole-request cap; leaves room for the base64 inflation of legacy JSON uploads
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+
+_resumable = ResumableUploads(UPLOAD_DIR, MAX_UPLOAD_BYTES)
+
+
+# ── Document previews ────────────────────────────────────────────────────────
+# Thumbnails / first-page previews of uploaded images and PDFs, rendered in
+# LIFELINEQR_PREVIEW_WORKERS background processes per server process.
+PREVIEW_WORKERS = int(os.environ.get('LIFELINEQR_PREVIEW_WORKERS', 2))
+
+_previews = previews.PreviewQueue(_blob_store, get_db, workers=PREVIEW_WORKERS,
+                                  on_done=_scan_cache.invalidate)
+
+
+# ── Roster import ────────────────────────────────────────────────────────────
+# Students inserted per transaction by /api/admin/students/import.
+IMPORT_BATCH_SIZE = int(os.environ.get('LIFELINEQR_IMPORT_BATCH_SIZE', roster.DEFAULT_BATCH_SIZE))
+
+
+# ── Response compression ─────────────────────────────────────────────────────
+# gzip / brotli (when installed) for text bodies of at least COMPRESS_MIN_BYTES.
+COMPRESS_MIN_BYTES      = int(os.environ.get('LIFELINEQR_COMPRESS_MIN_BYTES', 1024))
+COMPRESS_TYPES          = os.environ.get('LIFELINEQR_COMPRESS_TYPES',
+                                         ','.join(COMPRESS_DEFAULT_TYPES)).split(',')
+COMPRESS_GZIP_LEVEL     = int(os.environ.get('LIFELINEQR_COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('LIFELINEQR_COMPRESS_BROTLI_QUALITY', 4))
+
+_compression = ResponseCompressor(
+    min_bytes=COMPRESS_MIN_BYTES,
+    types=COMPRESS_TYPES,
+    gzip_level=COMPRESS_GZIP_LEVEL,
+    brotli_quality=COMPRESS_BROTLI_QUALITY,
+)
+
+
+@app.after_request
+def _compress_response(response):
+    """Compress eligible responses with the encoding the client prefers."""
+    if request.method == 'HEAD' or not _compression.compressible(
+            response.status_code, response.mimetype, response.headers.get('Content-Encoding')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _compression.negotiate(request.headers.get('Accept-Encoding'))
+    length = response.content_length
+    if not encoding or request.range or (length is not None and length < COMPRESS_MIN_BYTES):
+        return response
+
+    endpoint = request.endpoint or 'unknown'
+    if response.is_streamed or response.direct_passthrough:
+        # Streamed exports and file downloads: compress as the body is sent
+        response.response = _compression.compress_stream(endpoint, response.response, encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(_compression.compress(endpoint, response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # The encoded body differs byte for byte, so its validator can only be weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# ── Request metrics ──────────────────────────────────────────────────────────
+# Latency / size / DB time histograms per route, served at /metrics. Server
+# processes share their totals through METRICS_DIR ('' = each process reports
+# only itself).
+METRICS_DIR = os.environ.get(
+    'LIFELINEQR_METRICS_DIR',
+    '' if sys.platform == 'win32'
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'metrics'),
+)
+
+_metrics = metrics.Metrics(METRICS_DIR or None)
+app.wsgi_app = metrics.WSGIMiddleware(app.wsgi_app, _metrics, _pool.timer)
+
+
+@app.before_request
+def _label_route():
+    """Label the request's metrics with its URL rule rather than the raw path."""
+    if request.url_rule is not None:
+        request.environ[metrics.ROUTE_KEY] = request.url_rule.rule
+
+
+# ── SQL profiling ────────────────────────────────────────────────────────────
+# Off by default; a staging aid. LIFELINEQR_SQL_PROFILE=1 records the SQL each
+# request runs (sql_profile.py), sends it back as a Server-Timing header and
+# keeps the dumps for /api/admin/sql-profile. LIFELINEQR_SQL_PROFILE_EXPLAIN=1
+# also captures EXPLAIN for slow and N+1 statements.
+SQL_PROFILE            = os.environ.get('LIFELINEQR_SQL_PROFILE', '0') == '1'
+SQL_PROFILE_SLOW_MS    = float(os.environ.get('LIFELINEQR_SQL_PROFILE_SLOW_MS', 100))
+SQL_PROFILE_N_PLUS_ONE = int(os.environ.get('LIFELINEQR_SQL_PROFILE_N_PLUS_ONE', 5))
+SQL_PROFILE_EXPLAIN    = os.environ.get('LIFELINEQR_SQL_PROFILE_EXPLAIN', '0') == '1'
+SQL_PROFILE_KEEP       = int(os.environ.get('LIFELINEQR_SQL_PROFILE_KEEP', 200))
+
+_sql_profiler = sql_profile.SQLProfiler(
+    _pool.timer,
+    get_db,
+    slow_ms=SQL_PROFILE_SLOW_MS,
+    n_plus_one=SQL_PROFILE_N_PLUS_ONE,
+    explain=SQL_PROFILE_EXPLAIN,
+    keep=SQL_PROFILE_KEEP,
+) if SQL_PROFILE else None
+
+
+@app.before_request
+def _start_sql_profile():
+    # The profile endpoints would only fill the list they are read from
+    if _sql_profiler is not None and request.endpoint not in (
+            'admin_sql_profile', 'admin_sql_profile_request'):
+        _sql_profiler.start(request.method, request.path)
+
+
+@app.after_request
+def _finish_sql_profile(response):
+    """Attach the request's DB time as Server-Timing and the id of its profile dump.
+
+    Statements a streamed response runs while its body is being sent come
+    after this point and are not recorded.
+    """
+    if _sql_profiler is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else metrics.UNMATCHED
+    dump = _sql_profiler.finish(route, response.status_code)
+    if dump is not None:
+        response.headers.add('Server-Timing', _sql_profiler.server_timing(dump))
+        response.headers['X-SQL-Profile'] = str(dump['id'])
+    return response
+
+
+@app.teardown_request
+def _stop_sql_profile(exc):
+    # A handler that raised skips after_request; don't leave the thread recording
+    if _sql_profiler is not None:
+        _sql_profiler.stop()
+
+
+# ── Access log ───────────────────────────────────────────────────────────────
+# Every profile, document list, document and scan read is logged for
+# accountability without a write on the read path: events are buffered in
+# memory and inserted in batches (access_log.py). Clients name the viewer with
+# ?viewer_role=admin|doctor|student&viewer_id=N (query parameters, not headers,
+# so a browser scan needs no CORS preflight); these are recorded as sent,
+# alongside the client address and user agent.
+ACCESS_LOG_CAPACITY      = int(os.environ.get('LIFELINEQR_ACCESS_LOG_CAPACITY', 10000))
+ACCESS_LOG_BATCH_SIZE    = int(os.environ.get('LIFELINEQR_ACCESS_LOG_BATCH_SIZE', 500))
+ACCESS_LOG_FLUSH_SECONDS = float(os.environ.get('LIFELINEQR_ACCESS_LOG_FLUSH_SECONDS', 2))
+ACCESS_LOG_POLICY        = os.environ.get('LIFELINEQR_ACCESS_LOG_POLICY', access_log.DROP_OLDEST)
+ACCESS_LOG_BLOCK_MS      = float(os.environ.get('LIFELINEQR_ACCESS_LOG_BLOCK_MS', 50))
+
+_access_log = access_log.AccessLog(
+    get_db,
+    capacity=ACCESS_LOG_CAPACITY,
+    batch_size=ACCESS_LOG_BATCH_SIZE,
+    flush_interval=ACCESS_LOG_FLUSH_SECONDS,
+    policy=ACCESS_LOG_POLICY,
+    block_timeout=ACCESS_LOG_BLOCK_MS / 1000,
+)
+
+
+# Write what is still buffered when a process exits (gunicorn workers also stop it on exit)
+atexit.register(_access_log.stop)
+
+
+def _log_access(action, student_id, document_id=None, status=200):
+    """Queue an access event for the current request (never touches the database)."""
+    role, viewer_id = access_log.viewer(request.args.get('viewer_role'),
+                                        request.args.get('viewer_id'))
+    _access_log.record(action, student_id, document_id, role, viewer_id, request.remote_addr,
+                       request.headers.get('User-Agent'), status)
+
+
+# ── Emergency payload ────────────────────────────────────────────────────────
+# Ed25519 key that signs the offline payload printed in each student's QR
+# code. Create it with `python manage.py payload-keygen`; until it exists the
+# payload endpoints answer 503 and scans fall back to the online lookup.
+PAYLOAD_KEY = os.environ.get(
+    'LIFELINEQR_PAYLOAD_KEY',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'keys',
+                 'emergency-payload.pem'),
+)
+
+_payload_signer = None
+
+
+def payload_signer():
+    """The PayloadSigner for PAYLOAD_KEY, or None while there is no key to sign with."""
+    global _payload_signer
+    if _payload_signer is None and os.path.exists(PAYLOAD_KEY):
         try:
-            print("\nLet's configure it manually.")
-            _MYSQL_USER = input(f"MySQL Username [{_MYSQL_USER}]: ").strip() or _MYSQL_USER
-            import getpass
-            _detected_password = getpass.getpass(f"MySQL Password for {_MYSQL_USER}: ")
-            
-            # verify immediately
-            _test = mysql.connector.connect(host=_MYSQL_HOST, user=_MYSQL_USER, password=_detected_password)
-            _test.close()
-            print("  [OK] Connected successfully!")
-        except Exception as e:
-            print(f"  [ERR] Connection testing failed: {e}")
-            _detected_password = ''  # fallback – will fail later
-
-DB_CONFIG = {
-    'host': _MYSQL_HOST,
-    'user': _MYSQL_USER,
-    'password': _detected_password,
-    'database': _MYSQL_DB
+            _payload_signer = emergency_payload.PayloadSigner.from_file(PAYLOAD_KEY)
+        except RuntimeError as err:  # cryptography not installed
+            print(f'  [ERR] {err}')
+    return _payload_signer
+
+
+# ── QR codes ─────────────────────────────────────────────────────────────────
+# Rendered codes are cached on disk under a digest of their text, so they are
+# reused until a student's payload is reissued. Class sheets render across
+# LIFELINEQR_QR_WORKERS processes (0 = one per CPU).
+QR_CACHE_DIR = os.environ.get(
+    'LIFELINEQR_QR_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'qr-cache'),
+)
+QR_SHEET_DIR = os.environ.get(
+    'LIFELINEQR_QR_SHEET_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'qr-sheets'),
+)
+QR_SCALE   = int(os.environ.get('LIFELINEQR_QR_SCALE', 8))
+QR_WORKERS = int(os.environ.get('LIFELINEQR_QR_WORKERS', 0))
+
+_qr_cache = qr_render.QRCache(QR_CACHE_DIR, scale=QR_SCALE)
+_sheet_jobs = SheetJobs(QR_SHEET_DIR, _qr_cache, workers=QR_WORKERS or None)
+
+
+# ── Background jobs ──────────────────────────────────────────────────────────
+# Durable queue in the jobs table (jobs.py). Every server process runs
+# LIFELINEQR_JOB_THREADS workers; set it to 0 to leave the work to dedicated
+# `python manage.py jobs-worker` processes. Roster imports / exports made as
+# jobs keep their files in JOB_FILES_DIR.
+JOB_THREADS        = int(os.environ.get('LIFELINEQR_JOB_THREADS', 2))
+JOB_LEASE_SECONDS  = int(os.environ.get('LIFELINEQR_JOB_LEASE_SECONDS', 300))
+JOB_RETENTION_DAYS = int(os.environ.get('LIFELINEQR_JOB_RETENTION_DAYS', 7))
+JOB_FILES_DIR = os.environ.get(
+    'LIFELINEQR_JOB_FILES_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'job-files'),
+)
+# Handlers keep stats_counters current; a periodic job recounts to fix drift.
+STATS_RECONCILE_SECONDS = int(os.environ.get('LIFELINEQR_STATS_RECONCILE_SECONDS', 900))
+
+_jobs = jobs.JobQueue(get_db, threads=JOB_THREADS, lease_seconds=JOB_LEASE_SECONDS)
+os.makedirs(JOB_FILES_DIR, exist_ok=True)
+
+
+def _check_schema():
+    """Confirm the database has every migration this code expects.
+
+    One SELECT, no DDL: schema changes are applied by `python manage.py migrate`.
+    """
+    try:
+        with get_db() as conn:
+            version = migrations.current_version(conn.cursor())
+    except mysql.connector.Error as err:
+        if DB_BACKEND == 'sqlite':
+            print(f"  [ERR] Cannot open SQLite database {SQLITE_PATH}: {err}")
+            print("  Set LIFELINEQR_SQLITE_PATH or run: python manage.py migrate")
+        else:
+            print(f"  [ERR] Cannot reach MySQL: {err}")
+            print("  Set LIFELINEQR_DB_* or run: python manage.py init-config")
+        return False
+    if version < migrations.LATEST:
+        print(f"  [ERR] Database schema is at version {version}, this server needs "
+              f"{migrations.LATEST}. Run: python manage.py migrate")
+        return False
+    if version > migrations.LATEST:
+        print(f"  [ERR] Database schema version {version} is newer than this server "
+              f"({migrations.LATEST}); deploy the matching code")
+        return False
+    print(f"  [OK] Database schema at version {version}")
+    return True
+
+
+# ── Listing helpers ──────────────────────────────────────────────────────────
+# Fields a client may project with ?fields=, mapped to their SQL expression.
+
+STUDENT_LIST_COLUMNS = {c: c for c in (
+    'id', 'name', 'age', 'email', 'blood_group', 'allergies', 'medical_conditions',
+    'regular_medications', 'address', 'emergency_contacts', 'student_class',
+    'section', 'roll_number', 'parent_name', 'created_at',
+)}
+
+# doc_count / last_upload_at are kept on the student row by the document
+# write paths, so the admin roster never reads medical_documents.
+ADMIN_STUDENT_LIST_COLUMNS = dict(
+    STUDENT_LIST_COLUMNS,
+    doc_count='doc_count',
+    last_upload_at='last_upload_at',
+)
+
+DOCTOR_LIST_COLUMNS = {c: c for c in (
+    'id', 'name', 'age', 'email', 'specialization', 'experience', 'hospital',
+    'contact_number', 'working_hours', 'is_verified', 'created_at',
+)}
+
+# Query parameter -> (column, converter). Each filter has a matching
+# (filter columns..., created_at, id) index created by migrations.py.
+STUDENT_LIST_FILTERS = {
+    'class': ('student_class', str),
+    'section': ('section', str),
+    'blood_group': ('blood_group', str),
 }
 
-def get_db():
-    """Create and return a new MySQL connection."""
-    return mysql.connector.connect(**DB_CONFIG)
+DOCTOR_LIST_FILTERS = {
+    'verified': ('is_verified', parse_bool),
+}
 
 
-def _bootstrap_database():
-    """Create the database and tables if they do not exist."""
-    try:
-        conn = mysql.connector.connect(
-            host=_MYSQL_HOST, user=_MYSQL_USER, password=_detected_password
-        )
-        cursor = conn.cursor()
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{_MYSQL_DB}`")
-        cursor.close()
-        conn.close()
+def _list_page(conn, table, columns, filters):
+    """Fetch one keyset page described by the request's query string."""
+    args = request.args
+    fields = parse_fields(args, columns)
+    limit = parse_limit(args)
+    page_cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
 
-        conn = get_db()
-        cursor = conn.cursor()
+    sql, params = keyset_query(table, {f: columns[f] for f in fields},
+                               parse_filters(args, filters), page_cursor, limit)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    return finish_page(cursor.fetchall(), limit, fields)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                age INT NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                blood_group VARCHAR(5),
-                allergies TEXT,
-                medical_conditions TEXT,
-                regular_medications TEXT,
-                address TEXT,
-                emergency_contacts VARCHAR(20),
-                student_class VARCHAR(10),
-                section VARCHAR(5),
-                roll_number VARCHAR(20),
-                parent_name VARCHAR(255),
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Safely add new columns if they don't exist (for existing databases)
-        for col, coldef in [
-            ('student_class', 'VARCHAR(10)'),
-            ('section', 'VARCHAR(5)'),
-            ('roll_number', 'VARCHAR(20)'),
-            ('parent_name', 'VARCHAR(255)'),
-        ]:
-            try:
-                cursor.execute(f"ALTER TABLE students ADD COLUMN {col} {coldef}")
-            except mysql.connector.Error:
-                pass  # column already exists
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS doctors (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                age INT NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                specialization VARCHAR(100),
-                experience INT,
-                hospital VARCHAR(255),
-                contact_number VARCHAR(20),
-                working_hours VARCHAR(50),
-                is_verified BOOLEAN DEFAULT FALSE,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        for col, coldef in [
-            ('is_verified', 'BOOLEAN DEFAULT FALSE')
-        ]:
-            try:
-                cursor.execute(f"ALTER TABLE doctors ADD COLUMN {col} {coldef}")
-            except mysql.connector.Error:
-                pass  # column already exists
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS medical_documents (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                file_data LONGTEXT NOT NULL,
-                description TEXT,
-                uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admins (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
 
-        # Insert default admin if not exists
-        cursor.execute("""
-            INSERT IGNORE INTO admins (email, password)
-            VALUES ('admin@lifelineqr.com', 'admin@123')
-        """)
+SEARCH_FILTERS = {'students': STUDENT_LIST_FILTERS, 'doctors': DOCTOR_LIST_FILTERS}
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("  [OK] Database and tables verified / created")
-    except mysql.connector.Error as err:
-        print(f"  [ERR] Database bootstrap error: {err}")
 
+def _search_page(conn, columns_by_target):
+    """Run one ranked /api/search page; returns (type, rows, next_cursor)."""
+    page = search.parse_request(request.args, columns_by_target, SEARCH_FILTERS, DB_BACKEND)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(page.sql, page.params)
+    return (page.target,) + search.finish_page(cursor.fetchall(), page)
 
-_bootstrap_database()
+
+# Statements shared with the async handlers in asgi.py
+STUDENT_PROFILE_SQL = ('SELECT id, name, age, email, blood_group, allergies, '
+                       'medical_conditions, regular_medications, address, '
+                       'emergency_contacts, student_class, section, roll_number, '
+                       'parent_name, created_at FROM students WHERE id = %s')
+
+# Login returns the account as the client sees it; the bookkeeping columns
+# (counters, versions, the signed payload) stay out of the response
+STUDENT_LOGIN_SQL = ('SELECT id, name, age, email, password, blood_group, allergies, '
+                     'medical_conditions, regular_medications, address, emergency_contacts, '
+                     'student_class, section, roll_number, parent_name, created_at '
+                     'FROM students WHERE email = %s')
+DOCTOR_LOGIN_SQL = ('SELECT id, name, age, email, password, specialization, experience, '
+                    'hospital, contact_number, working_hours, is_verified, created_at '
+                    'FROM doctors WHERE email = %s')
+ADMIN_LOGIN_SQL = 'SELECT id, email, password FROM admins WHERE email = %s'
+
+DOCUMENT_LIST_SQL = ('SELECT id, filename, description, content_type, uploaded_at, '
+                     'preview_state, thumb_sha256, preview_sha256 FROM medical_documents '
+                     'WHERE student_id = %s ORDER BY uploaded_at DESC')
+
+DOCUMENT_META_SQL = ('SELECT id, student_id, filename, description, blob_sha256, '
+                     'content_type, size_bytes, uploaded_at, '
+                     'preview_state, thumb_sha256, preview_sha256 '
+                     'FROM medical_documents WHERE id = %s')
+
+
+def preview_links(doc):
+    """Swap a document row's preview digests for the URLs serving them.
+
+    The digest is part of the URL, so the images can be cached as immutable.
+    """
+    thumb, preview = doc.pop('thumb_sha256', None), doc.pop('preview_sha256', None)
+    doc['preview_state'] = doc.get('preview_state') or previews.PENDING
+    doc['thumbnail_url'] = f"/api/document/{doc['id']}/thumbnail?v={thumb[:16]}" if thumb else None
+    doc['preview_url'] = f"/api/document/{doc['id']}/preview?v={preview[:16]}" if preview else None
+    return doc
+
+
+# ── Conditional GET ──────────────────────────────────────────────────────────
+
+def _validators(conn, sql, student_id, make_etag):
+    """(etag, last_modified) of a student resource, or None if the student is gone.
+
+    Read before the payload, so a concurrent write can only make the payload
+    newer than its ETag (the next request then misses) and never older.
+    """
+    cursor = conn.cursor()
+    cursor.execute(sql, (student_id,))
+    row = cursor.fetchone()
+    return (make_etag(student_id, row[0]), row[1]) if row else None
+
+
+def _not_modified(etag, last_modified=None):
+    return Response(status=304, headers=http_cache.validator_headers(etag, last_modified))
 
 
 # ── Student endpoints ────────────────────────────────────────────────────────
@@ -207,45 +599,45 @@ def register_student():
             return jsonify({'success': False, 'error': f'{field} is required'}), 400
 
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-
-        # Check if email already exists
-        cursor.execute('SELECT id FROM students WHERE email = %s', (data['email'],))
-        if cursor.fetchone():
-            return jsonify({'success': False, 'error': 'Email already registered'}), 409
-
-        hashed_pw = data['password']
-
-        sql = '''INSERT INTO students
-                 (name, age, email, password, blood_group, allergies,
-                  medical_conditions, regular_medications, address, emergency_contacts,
-                  student_class, section, roll_number, parent_name)
-                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'''
-
-        values = (
-            data['name'],
-            int(data['age']),
-            data['email'].lower(),
-            hashed_pw,
-            data.get('bloodGroup', ''),
-            data.get('allergies', ''),
-            data.get('medicalConditions', ''),
-            data.get('regularMedications', ''),
-            data.get('address', ''),
-            data.get('emergencyContacts', ''),
-            data.get('studentClass', ''),
-            data.get('section', ''),
-            data.get('rollNumber', ''),
-            data.get('parentName', '')
-        )
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            # Check if email already exists
+            cursor.execute('SELECT id FROM students WHERE email = %s', (data['email'],))
+            if cursor.fetchone():
+                return jsonify({'success': False, 'error': 'Email already registered'}), 409
+
+            hashed_pw = data['password']
+
+            sql = '''INSERT INTO students
+                     (name, age, email, password, blood_group, allergies,
+                      medical_conditions, regular_medications, address, emergency_contacts,
+                      student_class, section, roll_number, parent_name)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+
+            values = (
+                data['name'],
+                int(data['age']),
+                data['email'].lower(),
+                hashed_pw,
+                data.get('bloodGroup', ''),
+                data.get('allergies', ''),
+                data.get('medicalConditions', ''),
+                data.get('regularMedications', ''),
+                data.get('address', ''),
+                data.get('emergencyContacts', ''),
+                data.get('studentClass', ''),
+                data.get('section', ''),
+                data.get('rollNumber', ''),
+                data.get('parentName', '')
+            )
 
-        cursor.execute(sql, values)
-        conn.commit()
+            cursor.execute(sql, values)
+            student_id = cursor.lastrowid
 
-        student_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+            stats.bump(cursor, {'total_students': 1})
+            stats.bump_daily(cursor, stats.DAILY_REGISTRATIONS, 1)
+            conn.commit()
 
         return jsonify({
             'success': True,
@@ -259,51 +651,48 @@ def register_student():
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
-    """Get all students."""
-    try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, name, age, email, blood_group, allergies, '
-                       'medical_conditions, regular_medications, address, '
-                       'emergency_contacts, student_class, section, roll_number, '
-                       'parent_name, created_at FROM students')
-        students = cursor.fetchall()
-
-        # Convert datetime objects to strings
-        for p in students:
-            if p.get('created_at'):
-                p['created_at'] = p['created_at'].isoformat()
+    """List students, newest first, one keyset page at a time.
 
-        cursor.close()
-        conn.close()
-        return jsonify({'success': True, 'students': students})
+    Query: limit, cursor (from next_cursor), fields=a,b,c, class, section, blood_group.
+    """
+    try:
+        with get_read_db() as conn:
+            students, next_cursor = _list_page(conn, 'students', STUDENT_LIST_COLUMNS,
+                                               STUDENT_LIST_FILTERS)
+        return jsonify({'success': True, 'students': students, 'next_cursor': next_cursor})
 
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
 @app.route('/api/student/<int:student_id>', methods=['GET'])
 def get_student(student_id):
-    """Get a single student by ID."""
+    """Get a single student by ID (304 if the client's ETag is current)."""
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, name, age, email, blood_group, allergies, '
-                       'medical_conditions, regular_medications, address, '
-                       'emergency_contacts, student_class, section, roll_number, '
-                       'parent_name, created_at FROM students WHERE id = %s',
-                       (student_id,))
-        student = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_read_db() as conn:
+            validators = _validators(conn, http_cache.STUDENT_VERSION_SQL, student_id,
+                                     http_cache.student_etag)
+            if not validators:
+                return jsonify({'success': False, 'error': 'Student not found'}), 404
+            if http_cache.not_modified(request.headers, *validators):
+                _log_access(access_log.PROFILE, student_id, status=304)
+                return _not_modified(*validators)
+
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(STUDENT_PROFILE_SQL, (student_id,))
+            student = cursor.fetchone()
 
         if not student:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
+        _log_access(access_log.PROFILE, student_id)
 
         if student.get('created_at'):
             student['created_at'] = student['created_at'].isoformat()
 
-        return jsonify({'success': True, 'student': student})
+        return jsonify({'success': True, 'student': student}), 200, \
+            http_cache.validator_headers(*validators)
 
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
@@ -311,35 +700,48 @@ def get_student(student_id):
 
 @app.route('/api/student/<int:student_id>', methods=['PUT'])
 def update_student(student_id):
-    """Update a student's profile."""
+    """Update a student's profile.
+
+    The signed emergency payload is reissued in the same transaction, but
+    only when one of the fields it carries actually changed.
+    """
     data = request.get_json()
 
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-
-        sql = '''UPDATE students SET
-                 allergies = %s,
-                 medical_conditions = %s,
-                 regular_medications = %s,
-                 address = %s,
-                 emergency_contacts = %s
-                 WHERE id = %s'''
-
-        values = (
-            data.get('allergies', ''),
-            data.get('medical_conditions', ''),
-            data.get('regular_medications', ''),
-            data.get('address', ''),
-            data.get('emergency_contacts', ''),
-            student_id
-        )
-
-        cursor.execute(sql, values)
-        conn.commit()
-        cursor.close()
-        conn.close()
-
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(EMERGENCY_PAYLOAD_SQL + ' FOR UPDATE', (student_id,))
+            current = cursor.fetchone()
+
+            sql = '''UPDATE students SET
+                     allergies = %s,
+                     medical_conditions = %s,
+                     regular_medications = %s,
+                     address = %s,
+                     emergency_contacts = %s,
+                     version = version + 1,
+                     updated_at = NOW()'''
+
+            values = [
+                data.get('allergies', ''),
+                data.get('medical_conditions', ''),
+                data.get('regular_medications', ''),
+                data.get('address', ''),
+                data.get('emergency_contacts', ''),
+            ]
+
+            if current:
+                updated = dict(current, **{f: data.get(f, '') for f in PAYLOAD_EDITABLE_FIELDS})
+                if any((updated[f] or '') != (current[f] or '') for f in PAYLOAD_EDITABLE_FIELDS):
+                    # Without a key the column is cleared and reissued on the next GET
+                    signer = payload_signer()
+                    sql += ', emergency_payload = %s'
+                    values.append(signer.encode(updated) if signer else None)
+
+            cursor.execute(sql + ' WHERE id = %s', values + [student_id])
+            conn.commit()
+
+        _scan_cache.invalidate(student_id)
         return jsonify({'success': True, 'message': 'Profile updated successfully'})
 
     except mysql.connector.Error as err:
@@ -359,39 +761,38 @@ def register_doctor():
             return jsonify({'success': False, 'error': f'{field} is required'}), 400
 
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            # Check if email already exists
+            cursor.execute('SELECT id FROM doctors WHERE email = %s', (data['email'],))
+            if cursor.fetchone():
+                return jsonify({'success': False, 'error': 'Email already registered'}), 409
+
+            hashed_pw = data['password']
+
+            sql = '''INSERT INTO doctors
+                     (name, age, email, password, specialization, experience,
+                      hospital, contact_number, working_hours, is_verified)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, FALSE)'''
+
+            values = (
+                data['name'],
+                int(data['age']),
+                data['email'].lower(),
+                hashed_pw,
+                data.get('specialization', ''),
+                int(data.get('experience', 0)),
+                data.get('hospital', ''),
+                data.get('contactNumber', ''),
+                data.get('workingHours', '')
+            )
 
-        # Check if email already exists
-        cursor.execute('SELECT id FROM doctors WHERE email = %s', (data['email'],))
-        if cursor.fetchone():
-            return jsonify({'success': False, 'error': 'Email already registered'}), 409
-
-        hashed_pw = data['password']
-
-        sql = '''INSERT INTO doctors
-                 (name, age, email, password, specialization, experience,
-                  hospital, contact_number, working_hours, is_verified)
-                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, FALSE)'''
-
-        values = (
-            data['name'],
-            int(data['age']),
-            data['email'].lower(),
-            hashed_pw,
-            data.get('specialization', ''),
-            int(data.get('experience', 0)),
-            data.get('hospital', ''),
-            data.get('contactNumber', ''),
-            data.get('workingHours', '')
-        )
+            cursor.execute(sql, values)
+            doctor_id = cursor.lastrowid
 
-        cursor.execute(sql, values)
-        conn.commit()
-
-        doctor_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+            stats.bump(cursor, {'pending_doctors': 1, 'total_doctors': 1})
+            conn.commit()
 
         return jsonify({
             'success': True,
@@ -405,22 +806,39 @@ def register_doctor():
 
 @app.route('/api/doctors', methods=['GET'])
 def get_doctors():
-    """Get all doctors."""
+    """List doctors, newest first, one keyset page at a time.
+
+    Query: limit, cursor (from next_cursor), fields=a,b,c, verified=true|false.
+    """
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, name, age, email, specialization, experience, '
-                       'hospital, contact_number, working_hours, is_verified, created_at FROM doctors')
-        doctors = cursor.fetchall()
+        with get_read_db() as conn:
+            doctors, next_cursor = _list_page(conn, 'doctors', DOCTOR_LIST_COLUMNS,
+                                              DOCTOR_LIST_FILTERS)
+        return jsonify({'success': True, 'doctors': doctors, 'next_cursor': next_cursor})
+
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
 
-        for d in doctors:
-            if d.get('created_at'):
-                d['created_at'] = d['created_at'].isoformat()
+# ── Search endpoint ──────────────────────────────────────────────────────────
 
-        cursor.close()
-        conn.close()
-        return jsonify({'success': True, 'doctors': doctors})
+@app.route('/api/search', methods=['GET'])
+def search_people():
+    """Ranked search over students or doctors.
 
+    Query: q (2+ characters), type=students|doctors, limit (max 50), cursor,
+    fields=a,b,c and the list filters (class, section, blood_group / verified).
+    """
+    try:
+        with get_read_db() as conn:
+            target, rows, next_cursor = _search_page(conn, {
+                'students': STUDENT_LIST_COLUMNS, 'doctors': DOCTOR_LIST_COLUMNS})
+        return jsonify({'success': True, target: rows, 'next_cursor': next_cursor})
+
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
@@ -440,15 +858,11 @@ def login():
         return jsonify({'success': False, 'error': 'Email, password, and role are required'}), 400
 
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        table = 'doctors' if role == 'doctor' else 'students'
-        cursor.execute(f'SELECT * FROM {table} WHERE email = %s', (email,))
-        user = cursor.fetchone()
-
-        cursor.close()
-        conn.close()
+            cursor.execute(DOCTOR_LOGIN_SQL if role == 'doctor' else STUDENT_LOGIN_SQL, (email,))
+            user = cursor.fetchone()
 
         if not user:
             return jsonify({'success': False, 'error': 'Invalid email or password'}), 401
@@ -471,9 +885,103 @@ def login():
 
 # ── Medical Documents endpoints ──────────────────────────────────────────────
 
+def _save_document(student_id, filename, description, content_type, digest, size, store_blob):
+    """Insert a document row, then put its bytes into the blob store.
+
+    The row is committed first, so a concurrent delete of the last identical
+    document either sees it and keeps the blob, or ``store_blob`` recreates
+    the blob afterwards. Returns None if the student does not exist.
+    """
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        # Lock the student row before touching its documents (the order every
+        # document write path uses) and keep its denormalised counts in step.
+        cursor.execute('UPDATE students SET doc_count = doc_count + 1, last_upload_at = NOW(), '
+                       'docs_version = docs_version + 1, docs_updated_at = NOW() '
+                       'WHERE id = %s', (student_id,))
+        if not cursor.rowcount:
+            conn.rollback()
+            return None
+
+        sql = '''INSERT INTO medical_documents
+                 (student_id, filename, blob_sha256, content_type, size_bytes, description,
+                  uploaded_at, preview_state)
+                 SELECT id, %s, %s, %s, %s, %s, last_upload_at, %s FROM students WHERE id = %s'''
+
+        wants_preview = previews.previewable(content_type)
+        preview_state = previews.PENDING if wants_preview else previews.NONE
+        cursor.execute(sql, (filename, digest, content_type, size, description, preview_state,
+                             student_id))
+        doc_id = cursor.lastrowid
+        stats.bump(cursor, {'total_documents': 1})
+        if wants_preview:
+            # Same transaction as the row: the job exists exactly when the document does
+            _jobs.enqueue('previews', {'document_id': doc_id}, priority=10,
+                          idempotency_key=f'previews:{doc_id}', conn=conn)
+        conn.commit()
+
+        try:
+            store_blob()
+        except Exception:
+            cursor.execute('UPDATE students SET doc_count = doc_count - 1, '
+                           'docs_version = docs_version + 1, docs_updated_at = NOW() '
+                           'WHERE id = %s', (student_id,))
+            cursor.execute('DELETE FROM medical_documents WHERE id = %s', (doc_id,))
+            _refresh_last_upload(cursor, student_id)
+            stats.bump(cursor, {'total_documents': -1})
+            conn.commit()
+            raise
+
+    _scan_cache.invalidate(student_id)
+    if wants_preview:
+        _jobs.notify()
+    return doc_id
+
+
+def _refresh_last_upload(cursor, student_id):
+    """Recompute students.last_upload_at after a document was removed."""
+    cursor.execute('UPDATE students SET last_upload_at = '
+                   '(SELECT MAX(uploaded_at) FROM medical_documents WHERE student_id = %s) '
+                   'WHERE id = %s', (student_id, student_id))
+
+
+def _document_created(doc_id):
+    if doc_id is None:
+        return jsonify({'success': False, 'error': 'Student not found'}), 404
+    return jsonify({
+        'success': True,
+        'message': 'Document uploaded successfully',
+        'document_id': doc_id
+    }), 201
+
+
 @app.route('/api/student/<int:student_id>/documents', methods=['POST'])
 def upload_document(student_id):
-    """Upload a medical document for a student."""
+    """Upload a medical document for a student.
+
+    Accepts multipart/form-data (``file`` + ``description``), a raw body
+    (``?filename=...&description=...``), or the original JSON body with
+    base64 ``fileData``. The first two stream to disk instead of memory.
+    """
+    try:
+        if request.mimetype == 'application/json':
+            return _upload_document_json(student_id)
+        if request.mimetype == 'multipart/form-data':
+            return _upload_document_multipart(student_id)
+        return _upload_document_raw(student_id)
+
+    except UploadTooLarge as err:
+        return jsonify({'success': False, 'error': str(err)}), 413
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+    except OSError as err:
+        return jsonify({'success': False, 'error': f'Could not store the document: {err}'}), 500
+
+
+def _upload_document_json(student_id):
     data = request.get_json()
 
     filename = data.get('filename', '')
@@ -484,48 +992,188 @@ def upload_document(student_id):
         return jsonify({'success': False, 'error': 'filename and fileData are required'}), 400
 
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        content, content_type = decode_data_url(file_data)
+    except ValueError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    del file_data, data
 
-        sql = '''INSERT INTO medical_documents
-                 (student_id, filename, file_data, description)
-                 VALUES (%s, %s, %s, %s)'''
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f'File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit')
 
-        cursor.execute(sql, (student_id, filename, file_data, description))
-        conn.commit()
+    digest = hashlib.sha256(content).hexdigest()
+    doc_id = _save_document(student_id, filename, description, content_type, digest,
+                            len(content), lambda: _blob_store.put_bytes(content))
+    return _document_created(doc_id)
 
-        doc_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
 
-        return jsonify({
-            'success': True,
-            'message': 'Document uploaded successfully',
-            'document_id': doc_id
-        }), 201
+def _upload_document_multipart(student_id):
+    form, files, spools = spool_multipart(request.environ, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    try:
+        upload = files.get('file')
+        if upload is None or not upload.filename:
+            return jsonify({'success': False, 'error': 'file is required'}), 400
+
+        spool = upload.stream
+        content_type = upload.mimetype if upload.mimetype != 'application/octet-stream' else None
+        doc_id = _save_document(student_id, upload.filename,
+                                form.get('description') or 'Medical Document',
+                                content_type, spool.digest, spool.size,
+                                lambda: _blob_store.put_file(spool.path, spool.digest))
+        return _document_created(doc_id)
+    finally:
+        for spool in spools:
+            spool.discard()
+
+
+def _upload_document_raw(student_id):
+    filename = request.args.get('filename') or request.headers.get('X-Filename', '')
+    if not filename:
+        return jsonify({'success': False, 'error': 'filename is required'}), 400
+
+    spool = spool_stream(request.stream, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    try:
+        if not spool.size:
+            return jsonify({'success': False, 'error': 'Request body is empty'}), 400
+
+        content_type = request.mimetype if request.mimetype != 'application/octet-stream' else None
+        doc_id = _save_document(student_id, filename,
+                                request.args.get('description') or 'Medical Document',
+                                content_type or None, spool.digest, spool.size,
+                                lambda: _blob_store.put_file(spool.path, spool.digest))
+        return _document_created(doc_id)
+    finally:
+        spool.discard()
+
+
+# ── Resumable uploads ────────────────────────────────────────────────────────
+# POST /api/student/<id>/uploads starts one; each PUT /api/uploads/<upload_id>
+# carries a chunk with `Content-Range: bytes <start>-<end>/<total>`. A 409
+# reply says where to resume. The final chunk creates the document.
+
+_CONTENT_RANGE = re.compile(r'^bytes (?:(\d+)-\d+|\*)/(?:\d+|\*)$')
+
 
+@app.route('/api/student/<int:student_id>/uploads', methods=['POST'])
+def create_upload(student_id):
+    """Start a resumable document upload."""
+    data = request.get_json()
+
+    filename = data.get('filename', '')
+    try:
+        size = int(data.get('size') or 0)
+    except (TypeError, ValueError):
+        size = 0
+
+    if not filename or size <= 0:
+        return jsonify({'success': False, 'error': 'filename and size are required'}), 400
+
+    try:
+        upload = _resumable.create(
+            size,
+            student_id=student_id,
+            filename=filename,
+            description=data.get('description') or 'Medical Document',
+            content_type=data.get('contentType') or None,
+        )
+    except UploadTooLarge as err:
+        return jsonify({'success': False, 'error': str(err)}), 413
+
+    return jsonify({'success': True, 'upload': upload, 'chunk_size': UPLOAD_CHUNK_BYTES}), 201
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """How many bytes of a resumable upload the server has."""
+    try:
+        return jsonify({'success': True, 'upload': _resumable.status(upload_id)})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """Append one chunk; the chunk that completes the file stores the document."""
+    match = _CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return jsonify({'success': False, 'error': 'Content-Range header is required'}), 400
+
+    try:
+        if match.group(1) is None:
+            upload = _resumable.status(upload_id)   # "bytes */total": just finish
+        else:
+            upload = _resumable.append(upload_id, int(match.group(1)), request.stream)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    except UploadConflict as err:
+        return jsonify({'success': False, 'error': str(err), 'received': err.received}), 409
+    except UploadTooLarge as err:
+        return jsonify({'success': False, 'error': str(err)}), 413
+
+    if upload['received'] < upload['size']:
+        return jsonify({'success': True, 'upload': upload})
+
+    def store(part_path, digest, meta):
+        return _save_document(meta['student_id'], meta['filename'], meta['description'],
+                              meta['content_type'], digest, meta['size'],
+                              lambda: _blob_store.put_file(part_path, digest))
+
+    # Runs once per upload; a repeated final request gets the same document_id
+    try:
+        doc_id = _resumable.complete(upload_id, store)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    except UploadConflict as err:
+        return jsonify({'success': False, 'error': str(err), 'received': err.received}), 409
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
+    except OSError as err:
+        return jsonify({'success': False, 'error': f'Could not store the document: {err}'}), 500
+
+    if doc_id is None:
+        _resumable.abort(upload_id)
+    return _document_created(doc_id)
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """Abandon a resumable upload and free its disk space."""
+    try:
+        _resumable.abort(upload_id)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    return jsonify({'success': True, 'message': 'Upload cancelled'})
+
+
+@app.errorhandler(413)
+def request_too_large(err):
+    return jsonify({'success': False, 'error': 'Upload exceeds the size limit'}), 413
 
 
 @app.route('/api/student/<int:student_id>/documents', methods=['GET'])
 def get_documents(student_id):
-    """Get all medical documents for a student."""
+    """Get all medical documents for a student (304 if the client's ETag is current)."""
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, filename, description, uploaded_at FROM medical_documents '
-                       'WHERE student_id = %s ORDER BY uploaded_at DESC', (student_id,))
-        docs = cursor.fetchall()
+        with get_read_db() as conn:
+            validators = _validators(conn, http_cache.DOCUMENTS_VERSION_SQL, student_id,
+                                     http_cache.documents_etag)
+            if not validators:
+                return jsonify({'success': True, 'documents': []})
+            if http_cache.not_modified(request.headers, *validators):
+                _log_access(access_log.DOCUMENTS, student_id, status=304)
+                return _not_modified(*validators)
+
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(DOCUMENT_LIST_SQL, (student_id,))
+            docs = cursor.fetchall()
+        _log_access(access_log.DOCUMENTS, student_id)
 
         for d in docs:
             if d.get('uploaded_at'):
                 d['uploaded_at'] = d['uploaded_at'].isoformat()
+            preview_links(d)
 
-        cursor.close()
-        conn.close()
-
-        return jsonify({'success': True, 'documents': docs})
+        return jsonify({'success': True, 'documents': docs}), 200, \
+            http_cache.validator_headers(*validators)
 
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
@@ -533,44 +1181,381 @@ def get_documents(student_id):
 
 @app.route('/api/document/<int:doc_id>', methods=['GET'])
 def get_document(doc_id):
-    """Get a single document with its file data."""
+    """Get a document's metadata and the URL its bytes are served from."""
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM medical_documents WHERE id = %s', (doc_id,))
-        doc = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(DOCUMENT_META_SQL, (doc_id,))
+            doc = cursor.fetchone()
+
+            if doc:
+                # ETag only: uploaded_at stays put when the previews are added later,
+                # so If-Modified-Since would keep answering 304 without them
+                etag = http_cache.document_etag(doc)
+                if http_cache.not_modified(request.headers, etag):
+                    _log_access(access_log.DOCUMENT, doc['student_id'], doc_id, status=304)
+                    return _not_modified(etag)
+
+            # Rows not yet moved by `manage.py migrate-blobs` still carry base64 inline
+            if doc and not doc['blob_sha256']:
+                cursor.execute('SELECT file_data FROM medical_documents WHERE id = %s', (doc_id,))
+                doc['file_data'] = cursor.fetchone()['file_data']
 
         if not doc:
             return jsonify({'success': False, 'error': 'Document not found'}), 404
+        _log_access(access_log.DOCUMENT, doc['student_id'], doc_id)
 
+        headers = http_cache.validator_headers(etag)
         if doc.get('uploaded_at'):
             doc['uploaded_at'] = doc['uploaded_at'].isoformat()
+        doc['content_url'] = f'/api/document/{doc_id}/content'
+        preview_links(doc)
 
-        return jsonify({'success': True, 'document': doc})
+        return jsonify({'success': True, 'document': doc}), 200, headers
 
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
+@app.route('/api/document/<int:doc_id>/content', methods=['GET'])
+def get_document_content(doc_id):
+    """Serve a document's raw bytes (supports Range; sendfile where available)."""
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT student_id, filename, blob_sha256, content_type '
+                           'FROM medical_documents WHERE id = %s', (doc_id,))
+            doc = cursor.fetchone()
+
+            if doc and not doc['blob_sha256']:
+                cursor.execute('SELECT file_data FROM medical_documents WHERE id = %s', (doc_id,))
+                doc['file_data'] = cursor.fetchone()['file_data']
+
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+    if not doc:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+    _log_access(access_log.DOCUMENT_CONTENT, doc['student_id'], doc_id)
+
+    as_attachment = request.args.get('download') == '1'
+
+    if not doc['blob_sha256']:
+        content, content_type = decode_data_url(doc['file_data'])
+        return send_file(io.BytesIO(content),
+                         mimetype=doc['content_type'] or content_type or 'application/octet-stream',
+                         as_attachment=as_attachment, download_name=doc['filename'])
+
+    digest = doc['blob_sha256']
+    path = _blob_store.local_path(digest)
+    try:
+        source = path if path else _blob_store.open(digest)
+    except BlobNotFound:
+        return jsonify({'success': False, 'error': 'Document content missing'}), 404
+
+    response = send_file(source,
+                         mimetype=doc['content_type'] or 'application/octet-stream',
+                         as_attachment=as_attachment, download_name=doc['filename'],
+                         conditional=True, etag=digest)
+    # A document's bytes never change, so clients need not revalidate them
+    response.headers['Cache-Control'] = http_cache.IMMUTABLE
+    return response
+
+
+def _serve_preview(doc_id, column):
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f'SELECT preview_state, {column} AS digest FROM medical_documents '
+                           f'WHERE id = %s', (doc_id,))
+            doc = cursor.fetchone()
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+    if not doc:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+    if not doc['digest']:
+        return jsonify({'success': False, 'error': 'No preview available',
+                        'preview_state': doc['preview_state'] or previews.PENDING}), 404
+
+    path = _blob_store.local_path(doc['digest'])
+    try:
+        source = path if path else _blob_store.open(doc['digest'])
+    except BlobNotFound:
+        return jsonify({'success': False, 'error': 'Preview missing'}), 404
+    response = send_file(source, mimetype='image/jpeg', conditional=True, etag=doc['digest'])
+    response.headers['Cache-Control'] = http_cache.IMMUTABLE
+    return response
+
+
+@app.route('/api/document/<int:doc_id>/thumbnail', methods=['GET'])
+def get_document_thumbnail(doc_id):
+    """Small JPEG thumbnail of an image or a PDF's first page (404 until generated)."""
+    return _serve_preview(doc_id, 'thumb_sha256')
+
+
+@app.route('/api/document/<int:doc_id>/preview', methods=['GET'])
+def get_document_preview(doc_id):
+    """Screen-sized JPEG preview of an image or a PDF's first page (404 until generated)."""
+    return _serve_preview(doc_id, 'preview_sha256')
+
+
+def _blob_referenced(cursor, digest):
+    """Whether any document still uses ``digest`` as its content or a preview."""
+    cursor.execute('SELECT 1 FROM medical_documents '
+                   'WHERE blob_sha256 = %s OR thumb_sha256 = %s OR preview_sha256 = %s LIMIT 1',
+                   (digest, digest, digest))
+    return cursor.fetchone() is not None
+
+
+def _delete_unreferenced_blobs(conn, digests):
+    """Remove those of ``digests`` no document uses any more; call after the delete commits.
+
+    Identical files share one blob (and previews). Each check and delete runs
+    under the store lock, which an upload of the same file takes to reuse the
+    blob, and in a fresh transaction, so it sees rows committed meanwhile.
+    """
+    cursor = conn.cursor()
+    for digest in set(digests):
+        if not digest:
+            continue
+        with _blob_store.lock():
+            conn.rollback()
+            if not _blob_referenced(cursor, digest):
+                _blob_store.delete(digest)
+
+
 @app.route('/api/document/<int:doc_id>', methods=['DELETE'])
 def delete_document(doc_id):
     """Delete a medical document."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM medical_documents WHERE id = %s', (doc_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT student_id, blob_sha256, thumb_sha256, preview_sha256 '
+                           'FROM medical_documents WHERE id = %s', (doc_id,))
+            row = cursor.fetchone()
+            if row:
+                # Student row first, as in _save_document, then the document
+                cursor.execute('SELECT id FROM students WHERE id = %s FOR UPDATE', (row[0],))
+                cursor.fetchall()
+                cursor.execute('DELETE FROM medical_documents WHERE id = %s', (doc_id,))
+                if cursor.rowcount:
+                    cursor.execute('UPDATE students SET doc_count = doc_count - 1, '
+                                   'docs_version = docs_version + 1, docs_updated_at = NOW() '
+                                   'WHERE id = %s', (row[0],))
+                    _refresh_last_upload(cursor, row[0])
+                    stats.bump(cursor, {'total_documents': -1})
+                conn.commit()
+                _delete_unreferenced_blobs(conn, row[1:])
+
+        if row:
+            _scan_cache.invalidate(row[0])
         return jsonify({'success': True, 'message': 'Document deleted'})
 
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
+# ── Emergency scan endpoint ──────────────────────────────────────────────────
+
+def _load_scan_profile(student_id):
+    """Fetch a student's profile and document list over one connection."""
+    with get_db() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(STUDENT_PROFILE_SQL, (student_id,))
+        student = cursor.fetchone()
+        if not student:
+            return None
+
+        cursor.execute(DOCUMENT_LIST_SQL, (student_id,))
+        docs = cursor.fetchall()
+
+    if student.get('created_at'):
+        student['created_at'] = student['created_at'].isoformat()
+    for d in docs:
+        if d.get('uploaded_at'):
+            d['uploaded_at'] = d['uploaded_at'].isoformat()
+        preview_links(d)
+
+    return {'student': student, 'documents': docs}
+
+
+@app.route('/api/scan/<int:student_id>', methods=['GET'])
+def scan_student(student_id):
+    """Emergency read path: profile + document metadata in one cached call."""
+    try:
+        profile, state = _scan_cache.get_or_load(
+            student_id, lambda: _load_scan_profile(student_id))
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Student not found'}), 404
+    _log_access(access_log.SCAN, student_id)
+
+    resp = jsonify({'success': True, 'stale': state == 'stale', **profile})
+    resp.headers['X-Cache'] = state.upper()
+    return resp
+
+
+# ── Emergency payload endpoints ──────────────────────────────────────────────
+
+EMERGENCY_PAYLOAD_SQL = ('SELECT id, name, blood_group, allergies, medical_conditions, '
+                         'regular_medications, emergency_contacts, emergency_payload '
+                         'FROM students WHERE id = %s')
+
+# Payload fields update_student can change
+PAYLOAD_EDITABLE_FIELDS = ('allergies', 'medical_conditions', 'regular_medications',
+                           'emergency_contacts')
+
+
+def _payload_is_current(payload, signer):
+    """True if a stored payload exists and was signed with the current key."""
+    try:
+        return bool(payload) and emergency_payload.key_id_of(payload) == signer.key_id.hex()
+    except emergency_payload.PayloadError:
+        return False
+
+
+def _no_payload_key():
+    return jsonify({'success': False,
+                    'error': 'Emergency payload key not configured; '
+                             'run: python manage.py payload-keygen'}), 503
+
+
+def _issue_payloads(conn, students, signer):
+    """Current payload text of each row (EMERGENCY_PAYLOAD_SQL columns), keyed by id.
+
+    Issued lazily: a stored payload is kept as long as it was signed with the
+    current key. Missing or outdated ones are signed and saved here.
+    """
+    payloads, stale = {}, []
+    for student in students:
+        payload = student['emergency_payload']
+        if not _payload_is_current(payload, signer):
+            payload = signer.encode(student)
+            stale.append((payload, student['id'], student['emergency_payload']))
+        payloads[student['id']] = payload
+    if not stale:
+        return payloads
+
+    # Only replace what was read; a concurrent update_student wins
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE students SET emergency_payload = %s '
+                       'WHERE id = %s AND emergency_payload <=> %s', stale)
+    conn.commit()
+    if cursor.rowcount < len(stale):
+        ids = [student_id for _, student_id, _ in stale]
+        cursor.execute(f"SELECT id, emergency_payload FROM students "
+                       f"WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+        for student_id, payload in cursor.fetchall():
+            if payload:
+                payloads[student_id] = payload
+    return payloads
+
+
+@app.route('/api/student/<int:student_id>/emergency-payload', methods=['GET'])
+def get_emergency_payload(student_id):
+    """Signed offline payload for the student's QR code.
+
+    The stored text is reused until update_student changes one of its
+    fields or the signing key is replaced.
+    """
+    signer = payload_signer()
+    if signer is None:
+        return _no_payload_key()
+
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(EMERGENCY_PAYLOAD_SQL, (student_id,))
+            student = cursor.fetchone()
+            if not student:
+                return jsonify({'success': False, 'error': 'Student not found'}), 404
+            payload = _issue_payloads(conn, [student], signer)[student_id]
+
+        return jsonify({'success': True, 'payload': payload, 'key_id': signer.key_id.hex(),
+                        'length': len(payload)})
+
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+
+@app.route('/api/emergency-payload/keys', methods=['GET'])
+def get_emergency_payload_keys():
+    """Public key(s) scanners verify payloads against; safe to cache indefinitely."""
+    signer = payload_signer()
+    if signer is None:
+        return _no_payload_key()
+    public_key = base64.urlsafe_b64encode(signer.public_raw).decode().rstrip('=')
+    return jsonify({'success': True, 'keys': [
+        {'key_id': signer.key_id.hex(), 'algorithm': 'Ed25519', 'public_key': public_key},
+    ]})
+
+
+# ── QR code endpoints ────────────────────────────────────────────────────────
+
+CLASS_SHEET_SQL = ('SELECT id, name, blood_group, allergies, medical_conditions, '
+                   'regular_medications, emergency_contacts, emergency_payload, '
+                   'student_class, section, roll_number FROM students WHERE student_class = %s')
+
+
+def _qr_texts(conn, students):
+    """What each student's code encodes: the signed payload, or the plain ID without a key."""
+    signer = payload_signer()
+    payloads = _issue_payloads(conn, students, signer) if signer else {}
+    return {s['id']: qr_render.qr_text(s['id'], payloads.get(s['id'])) for s in students}
+
+
+def _sheet_cards(conn, student_class, section=None):
+    """(title, cards) for the print sheet of a class, or of one section of it."""
+    sql, params = CLASS_SHEET_SQL, [student_class]
+    if section:
+        sql += ' AND section = %s'
+        params.append(section)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql + ' ORDER BY section, roll_number, name, id', params)
+    students = cursor.fetchall()
+
+    texts = _qr_texts(conn, students)
+    cards = [{'id': s['id'], 'name': s['name'], 'student_class': s['student_class'],
+              'section': s['section'], 'roll_number': s['roll_number'], 'text': texts[s['id']]}
+             for s in students]
+    title = f'Class {student_class}' + (f' - {section}' if section else '')
+    return title, cards
+
+
+@app.route('/api/student/<int:student_id>/qr', methods=['GET'])
+def get_student_qr(student_id):
+    """The student's QR code as ?format=png (default) or svg, from the on-disk cache."""
+    fmt = request.args.get('format', 'png')
+    if fmt not in qr_render.FORMATS:
+        return jsonify({'success': False,
+                        'error': f"format must be one of: {', '.join(qr_render.FORMATS)}"}), 400
+
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(EMERGENCY_PAYLOAD_SQL, (student_id,))
+            student = cursor.fetchone()
+            if not student:
+                return jsonify({'success': False, 'error': 'Student not found'}), 404
+            text = _qr_texts(conn, [student])[student_id]
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+    try:
+        path, key = _qr_cache.get(text, fmt)
+    except RuntimeError as err:  # segno not installed
+        return jsonify({'success': False, 'error': str(err)}), 503
+
+    response = send_file(path, mimetype=qr_render.FORMATS[fmt],
+                         download_name=f'lifeline-qr-{student_id}.{fmt}',
+                         conditional=True, etag=f'qr-{key[:32]}')
+    response.headers['Cache-Control'] = http_cache.REVALIDATE
+    return response
+
+
 # ── Admin endpoints ───────────────────────────────────────────────────────────
 
 @app.route('/api/admin/login', methods=['POST'])
@@ -582,12 +1567,10 @@ def admin_login():
     if not email or not password:
         return jsonify({'success': False, 'error': 'Email and password required'}), 400
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM admins WHERE email = %s', (email,))
-        admin = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(ADMIN_LOGIN_SQL, (email,))
+            admin = cursor.fetchone()
         if not admin or admin['password'] != password:
             return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
         return jsonify({'success': True, 'admin': {'id': admin['id'], 'email': admin['email']}})
@@ -597,83 +1580,194 @@ def admin_login():
 
 @app.route('/api/admin/stats', methods=['GET'])
 def admin_stats():
-    """Return aggregate counts for the dashboard."""
+    """Return aggregate counts for the dashboard (maintained incrementally, see stats.py)."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM students')
-        total_students = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM doctors')
-        total_doctors = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM medical_documents')
-        total_docs = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM students WHERE DATE(created_at) = CURDATE()")
-        new_today = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM doctors WHERE is_verified = FALSE')
-        pending_doctors = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
-        return jsonify({
-            'success': True,
-            'stats': {
-                'total_students': total_students,
-                'total_doctors': total_doctors,
-                'total_documents': total_docs,
-                'new_today': new_today,
-                'pending_doctors': pending_doctors
-            }
-        })
+        with get_read_db() as conn:
+            counts = stats.read(conn.cursor())
+        return jsonify({'success': True, 'stats': counts})
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
 @app.route('/api/admin/students', methods=['GET'])
 def admin_get_students():
-    """Full student list for admin (excludes passwords)."""
+    """Paged student list for admin (excludes passwords); same query options as /api/students."""
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT p.id, p.name, p.age, p.email, p.blood_group,
-                   p.allergies, p.medical_conditions, p.regular_medications,
-                   p.address, p.emergency_contacts, p.student_class, p.section,
-                   p.roll_number, p.parent_name, p.created_at,
-                   COUNT(d.id) AS doc_count
-            FROM students p
-            LEFT JOIN medical_documents d ON d.student_id = p.id
-            GROUP BY p.id
-            ORDER BY p.created_at DESC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        for r in rows:
-            if r.get('created_at'):
-                r['created_at'] = r['created_at'].isoformat()
-        return jsonify({'success': True, 'students': rows})
+        with get_read_db() as conn:
+            rows, next_cursor = _list_page(conn, 'students', ADMIN_STUDENT_LIST_COLUMNS,
+                                           STUDENT_LIST_FILTERS)
+        return jsonify({'success': True, 'students': rows, 'next_cursor': next_cursor})
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
+@app.route('/api/admin/students/import', methods=['POST'])
+def admin_import_students():
+    """Bulk-register students from a CSV or NDJSON roster.
+
+    The roster is the request body, or the ``file`` part of a multipart form.
+    Query: format=csv|ndjson (default: from the Content-Type), batch_size,
+    default_password (for rows without one). Bad rows are reported by line
+    number and skipped; every valid row is inserted. With async=true the
+    roster is saved and imported by a background job: 202 with the job, whose
+    result is the same report.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'success': False, 'error': 'file is required'}), 400
+        body, mimetype = upload.stream, upload.mimetype
+    else:
+        body, mimetype = request.stream, request.mimetype
+
+    fmt = request.args.get('format') or (
+        'ndjson' if mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    try:
+        batch_size = int(request.args.get('batch_size', IMPORT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'batch_size must be an integer'}), 400
+    try:
+        run_async = parse_bool(request.args.get('async', 'false'))
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+
+    if run_async:
+        filename = f'import-{secrets.token_hex(8)}.{fmt}'
+        with open(os.path.join(JOB_FILES_DIR, filename), 'wb') as f:
+            shutil.copyfileobj(body, f, UPLOAD_CHUNK_BYTES)
+        return _job_accepted('import_students', {
+            'file': filename, 'format': fmt, 'batch_size': batch_size,
+            'default_password': request.args.get('default_password'),
+        })
+
+    stream = io.TextIOWrapper(body, encoding='utf-8-sig', newline='')
+    try:
+        with get_db() as conn:
+            importer = roster.RosterImporter(conn, batch_size=batch_size,
+                                             default_password=request.args.get('default_password'))
+            report = importer.run(roster.read_rows(stream, fmt))
+        return jsonify(dict(report, success=True))
+
+    except (UnicodeDecodeError, csv.Error) as err:
+        return jsonify({'success': False, 'error': f'Unreadable roster: {err}',
+                        'inserted': importer.inserted}), 400
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+
+def _export_students_query(args):
+    """(fields, sql, params) of a student export for ``fields=`` and the list filters."""
+    fields = parse_fields(args, ADMIN_STUDENT_LIST_COLUMNS)
+    sql, params = export_query('students', {f: ADMIN_STUDENT_LIST_COLUMNS[f] for f in fields},
+                               parse_filters(args, STUDENT_LIST_FILTERS))
+    return fields, sql, params
+
+
+@app.route('/api/admin/students/export', methods=['GET'])
+def admin_export_students():
+    """Stream every matching student as CSV or NDJSON.
+
+    Query: format=csv|ndjson (default csv), fields=a,b,c and the filters of
+    /api/students. Rows come off an unbuffered cursor and are written as
+    they arrive, so memory use does not grow with the roster.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in roster.EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    try:
+        fields, sql, params = _export_students_query(request.args)
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+
+    def generate():
+        # Headers and the CSV header line go out before the query runs
+        yield roster.export_header(fields, fmt)
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                yield from roster.iter_export(cursor, fields, fmt)
+        except mysql.connector.Error as err:
+            # Too late for an error status; the truncated body is all we can do
+            print(f"  [ERR] Student export aborted: {err}")
+
+    return Response(stream_with_context(generate()), mimetype=roster.EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename=students.{fmt}',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/api/admin/students/export', methods=['POST'])
+def admin_export_students_job():
+    """Write the export of GET /api/admin/students/export to a file in the background.
+
+    Takes the same query; returns 202 with the job. Once it is done the file
+    is at GET /api/admin/jobs/<id>/file.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in roster.EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    query = {k: v for k, v in request.args.items() if k == 'fields' or k in STUDENT_LIST_FILTERS}
+    try:
+        _export_students_query(query)
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    return _job_accepted('export_students', {'format': fmt, 'query': query})
+
+
 @app.route('/api/admin/doctors', methods=['GET'])
 def admin_get_doctors():
-    """Full doctor list for admin (excludes passwords)."""
+    """Paged doctor list for admin (excludes passwords); same query options as /api/doctors."""
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, name, age, email, specialization, experience,
-                   hospital, contact_number, working_hours, is_verified, created_at
-            FROM doctors
-            ORDER BY created_at DESC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        for r in rows:
-            if r.get('created_at'):
-                r['created_at'] = r['created_at'].isoformat()
-        return jsonify({'success': True, 'doctors': rows})
+        with get_read_db() as conn:
+            rows, next_cursor = _list_page(conn, 'doctors', DOCTOR_LIST_COLUMNS,
+                                           DOCTOR_LIST_FILTERS)
+        return jsonify({'success': True, 'doctors': rows, 'next_cursor': next_cursor})
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+
+@app.route('/api/admin/search', methods=['GET'])
+def admin_search():
+    """Admin variant of /api/search (students also expose doc_count / last_upload_at)."""
+    try:
+        with get_read_db() as conn:
+            target, rows, next_cursor = _search_page(conn, {
+                'students': ADMIN_STUDENT_LIST_COLUMNS, 'doctors': DOCTOR_LIST_COLUMNS})
+        return jsonify({'success': True, target: rows, 'next_cursor': next_cursor})
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+
+@app.route('/api/admin/student/<int:student_id>/access-log', methods=['GET'])
+def admin_student_access_log(student_id):
+    """Who viewed a student's records, newest first (``limit``, ``cursor``).
+
+    Events reach the table within LIFELINEQR_ACCESS_LOG_FLUSH_SECONDS of the view.
+    """
+    try:
+        limit = parse_limit(request.args)
+        page_cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        with get_db() as conn:
+            rows = access_log.history(conn.cursor(dictionary=True), student_id, page_cursor,
+                                      limit)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['accessed_at'], rows[-1]['id'])
+        for row in rows:
+            row['accessed_at'] = row['accessed_at'].isoformat()
+        return jsonify({'success': True, 'events': rows, 'next_cursor': next_cursor})
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
@@ -682,12 +1776,24 @@ def admin_get_doctors():
 def admin_delete_student(student_id):
     """Delete a student (and cascade their documents)."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM students WHERE id = %s', (student_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # The row lock holds off uploads, so doc_count is exact for the cascade
+            cursor.execute('SELECT DATE(created_at), doc_count FROM students '
+                           'WHERE id = %s FOR UPDATE', (student_id,))
+            row = cursor.fetchone()
+            digests = []
+            if row:
+                cursor.execute('SELECT blob_sha256, thumb_sha256, preview_sha256 '
+                               'FROM medical_documents WHERE student_id = %s', (student_id,))
+                digests = [digest for doc in cursor.fetchall() for digest in doc]
+                cursor.execute('DELETE FROM students WHERE id = %s', (student_id,))
+                stats.bump(cursor, {'total_documents': -row[1], 'total_students': -1})
+                if row[0]:
+                    stats.bump_daily(cursor, stats.DAILY_REGISTRATIONS, -1, day=row[0])
+            conn.commit()
+            _delete_unreferenced_blobs(conn, digests)
+        _scan_cache.invalidate(student_id)
         return jsonify({'success': True, 'message': 'Student deleted'})
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
@@ -697,12 +1803,14 @@ def admin_delete_student(student_id):
 def admin_delete_doctor(doctor_id):
     """Delete a doctor."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM doctors WHERE id = %s', (doctor_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT is_verified FROM doctors WHERE id = %s FOR UPDATE', (doctor_id,))
+            row = cursor.fetchone()
+            if row:
+                cursor.execute('DELETE FROM doctors WHERE id = %s', (doctor_id,))
+                stats.bump(cursor, {'pending_doctors': 0 if row[0] else -1, 'total_doctors': -1})
+            conn.commit()
         return jsonify({'success': True, 'message': 'Doctor deleted'})
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
@@ -712,17 +1820,322 @@ def admin_delete_doctor(doctor_id):
 def admin_verify_doctor(doctor_id):
     """Verify a doctor."""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE doctors SET is_verified = TRUE WHERE id = %s', (doctor_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE doctors SET is_verified = TRUE '
+                           'WHERE id = %s AND is_verified = FALSE', (doctor_id,))
+            stats.bump(cursor, {'pending_doctors': -cursor.rowcount})
+            conn.commit()
         return jsonify({'success': True, 'message': 'Doctor verified'})
     except mysql.connector.Error as err:
         return jsonify({'success': False, 'error': str(err)}), 500
 
 
+@app.route('/api/admin/qr-sheets', methods=['POST'])
+def admin_start_qr_sheet():
+    """Start rendering the printable QR sheet of a class (``class``, optional ``section``).
+
+    Returns 202 with the job; poll GET /api/admin/qr-sheets/<job_id> for
+    progress and fetch .../sheet once its state is ``done``.
+    """
+    data = request.get_json(silent=True) or request.args
+    student_class = (data.get('class') or '').strip()
+    section = (data.get('section') or '').strip() or None
+    if not student_class:
+        return jsonify({'success': False, 'error': 'class is required'}), 400
+    if qr_render.segno is None:
+        return jsonify({'success': False,
+                        'error': 'QR rendering needs the segno package (pip install segno)'}), 503
+
+    try:
+        with get_db() as conn:
+            title, cards = _sheet_cards(conn, student_class, section)
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+    if not cards:
+        return jsonify({'success': False, 'error': f'No students in {title}'}), 404
+    job = _sheet_jobs.start(title, cards)
+    return jsonify({'success': True, 'job': job}), 202
+
+
+@app.route('/api/admin/qr-sheets/<job_id>', methods=['GET'])
+def admin_qr_sheet_status(job_id):
+    """Progress of a sheet job: state (running / done / failed), done of total."""
+    try:
+        return jsonify({'success': True, 'job': _sheet_jobs.status(job_id)})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Sheet job not found'}), 404
+
+
+@app.route('/api/admin/qr-sheets/<job_id>/sheet', methods=['GET'])
+def admin_qr_sheet(job_id):
+    """The finished sheet, an HTML page laid out for A4 printing."""
+    try:
+        path = _sheet_jobs.sheet_path(job_id)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Sheet not ready'}), 404
+    return send_file(path, mimetype='text/html', download_name=f'qr-sheet-{job_id[:8]}.html')
+
+
+@app.route('/api/admin/jobs', methods=['GET'])
+def admin_list_jobs():
+    """Recent background jobs, newest first (``state``, ``kind``, ``limit`` up to 500).
+
+    Also returns the number of jobs per state and kind, and this process's
+    worker counters.
+    """
+    state = request.args.get('state')
+    if state and state not in jobs.STATES:
+        return jsonify({'success': False,
+                        'error': f"state must be one of {', '.join(jobs.STATES)}"}), 400
+    try:
+        limit = parse_limit(request.args, default=50)
+        recent = _jobs.recent(state, request.args.get('kind'), limit)
+        counts = _jobs.counts()
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+    return jsonify({'success': True, 'jobs': recent, 'counts': counts, 'worker': _jobs.stats()})
+
+
+@app.route('/api/admin/jobs/<int:job_id>', methods=['GET'])
+def admin_job_status(job_id):
+    """State, attempts, progress (done of total), result and last error of one job."""
+    try:
+        job = _jobs.status(job_id)
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/admin/jobs/<int:job_id>/retry', methods=['POST'])
+def admin_retry_job(job_id):
+    """Run a failed job again with a fresh set of attempts."""
+    try:
+        if not _jobs.retry(job_id):
+            return jsonify({'success': False, 'error': 'Only failed jobs can be retried'}), 409
+        return jsonify({'success': True, 'job': _jobs.status(job_id)})
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+
+
+@app.route('/api/admin/jobs/<int:job_id>/file', methods=['GET'])
+def admin_job_file(job_id):
+    """The file a finished job produced (student exports)."""
+    try:
+        job = _jobs.status(job_id)
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+    filename = (job or {}).get('result') and job['result'].get('file')
+    if job is None or job['state'] != jobs.DONE or not filename:
+        return jsonify({'success': False, 'error': 'No file for this job'}), 404
+    path = os.path.join(JOB_FILES_DIR, filename)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'File has expired'}), 410
+    return send_file(path, mimetype=job['result'].get('content_type'), as_attachment=True,
+                     download_name=job['result'].get('download_name', filename))
+
+
+@app.route('/api/admin/qr-cache', methods=['GET'])
+def admin_qr_cache():
+    """Hits, misses and render time of the QR image cache in this process."""
+    return jsonify({'success': True, 'cache': _qr_cache.stats()})
+
+
+@app.route('/api/admin/previews', methods=['GET'])
+def admin_previews():
+    """Document preview counters for this process (ready, reused, failed)."""
+    return jsonify({'success': True, 'previews': _previews.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latency, response size and DB time histograms in the Prometheus text format."""
+    return Response(_metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/api/admin/db-pool', methods=['GET'])
+def admin_db_pool():
+    """Connection pool occupancy and counters (wait time, checkouts, exhaustion).
+
+    With a read replica, also its pool and where reads were routed.
+    """
+    if _router is None:
+        return jsonify({'success': True, 'pool': _pool.stats()})
+    return jsonify({'success': True, 'pool': _pool.stats(), 'replica_pool': _replica_pool.stats(),
+                    'replica': _router.stats()})
+
+
+@app.route('/api/admin/sql-profile', methods=['GET'])
+def admin_sql_profile():
+    """Recently profiled requests and the statements with the most total time (``limit``).
+
+    ``?reset=1`` clears both after reading them.
+    """
+    if _sql_profiler is None:
+        return jsonify({'success': False,
+                        'error': 'SQL profiling is off (set LIFELINEQR_SQL_PROFILE=1)'}), 404
+    try:
+        limit = parse_limit(request.args, default=50, maximum=SQL_PROFILE_KEEP)
+        reset = parse_bool(request.args.get('reset', 'false'))
+    except ListingError as err:
+        return jsonify({'success': False, 'error': str(err)}), 400
+    body = {
+        'success': True,
+        'requests': _sql_profiler.recent(limit),
+        'statements': _sql_profiler.statements(limit),
+        'slow_ms': _sql_profiler.slow_ms,
+        'n_plus_one': _sql_profiler.n_plus_one,
+        'explain': _sql_profiler.explain,
+    }
+    if reset:
+        _sql_profiler.reset()
+    return jsonify(body)
+
+
+@app.route('/api/admin/sql-profile/<int:profile_id>', methods=['GET'])
+def admin_sql_profile_request(profile_id):
+    """Full dump of one profiled request, by the id sent in its X-SQL-Profile header."""
+    if _sql_profiler is None:
+        return jsonify({'success': False,
+                        'error': 'SQL profiling is off (set LIFELINEQR_SQL_PROFILE=1)'}), 404
+    try:
+        return jsonify({'success': True, 'profile': _sql_profiler.get(profile_id)})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+
+
+@app.route('/api/admin/access-log', methods=['GET'])
+def admin_access_log():
+    """Access log buffer of this process (buffered, written, dropped, failed flushes)."""
+    return jsonify({'success': True, 'access_log': _access_log.stats()})
+
+
+@app.route('/api/admin/scan-cache', methods=['GET'])
+def admin_scan_cache():
+    """Hit/miss counters for the emergency scan cache."""
+    return jsonify({'success': True, 'cache': _scan_cache.stats()})
+
+
+@app.route('/api/admin/compression', methods=['GET'])
+def admin_compression():
+    """Per-endpoint compressed responses, bytes before / after and time spent compressing."""
+    return jsonify({'success': True, 'compression': _compression.stats()})
+
+
+# ── Background job handlers ──────────────────────────────────────────────────
+# Registered at import, so `manage.py jobs-worker` processes run the same kinds.
+
+def _job_accepted(kind, payload, priority=5):
+    """Enqueue ``kind`` for this request and answer 202 with the job.
+
+    A retried request carrying the same Idempotency-Key header gets the
+    original job back instead of starting a second one.
+    """
+    key = request.headers.get('Idempotency-Key')
+    try:
+        job_id = _jobs.enqueue(kind, payload, priority,
+                               idempotency_key=f'{kind}:{key}'[:191] if key else None)
+        job = _jobs.status(job_id)
+    except mysql.connector.Error as err:
+        return jsonify({'success': False, 'error': str(err)}), 500
+    return jsonify({'success': True, 'job': job}), 202
+
+
+def _job_previews(job):
+    return {'state': _previews.process(job.payload['document_id'])}
+
+
+def _job_reconcile_stats(job):
+    with get_db() as conn:
+        drift = stats.reconcile(conn)
+    if drift:
+        print(f'  [OK] Stats reconciled, corrected drift: {drift}')
+    return {'drift': drift}
+
+
+def _job_import_students(job):
+    path = os.path.join(JOB_FILES_DIR, job.payload['file'])
+    try:
+        f = open(path, encoding='utf-8-sig', newline='')
+    except FileNotFoundError:
+        raise jobs.PermanentFailure('Roster file is gone')
+    # A retry re-reads the whole roster; rows a failed attempt committed are
+    # reported as already registered rather than inserted twice
+    with f, get_db() as conn:
+        importer = roster.RosterImporter(conn, batch_size=job.payload['batch_size'],
+                                         default_password=job.payload.get('default_password'),
+                                         progress=job.progress)
+        try:
+            report = importer.run(roster.read_rows(f, job.payload['format']))
+        except (UnicodeDecodeError, csv.Error) as err:
+            raise jobs.PermanentFailure(f'Unreadable roster: {err}')
+    os.unlink(path)
+    return report
+
+
+def _job_export_students(job):
+    fmt = job.payload['format']
+    try:
+        fields, sql, params = _export_students_query(job.payload['query'])
+    except ListingError as err:
+        raise jobs.PermanentFailure(str(err))
+    filename = f'export-{job.id}.{fmt}'
+    rows = 0
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', dir=JOB_FILES_DIR,
+                                     delete=False) as tmp:
+        try:
+            tmp.write(roster.export_header(fields, fmt))
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                for chunk in roster.iter_export(cursor, fields, fmt):
+                    tmp.write(chunk)
+                    rows = cursor.rowcount
+                    job.progress(rows)
+            job.progress(rows, rows)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, os.path.join(JOB_FILES_DIR, filename))
+    return {'file': filename, 'rows': rows, 'content_type': roster.EXPORT_FORMATS[fmt],
+            'download_name': f'students.{fmt}'}
+
+
+def _job_purge(job):
+    """Drop finished jobs and job files older than LIFELINEQR_JOB_RETENTION_DAYS."""
+    removed = _jobs.purge(JOB_RETENTION_DAYS)
+    cutoff = datetime.now().timestamp() - JOB_RETENTION_DAYS * 86400
+    files = 0
+    for name in os.listdir(JOB_FILES_DIR):
+        path = os.path.join(JOB_FILES_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                files += 1
+        except FileNotFoundError:
+            pass
+    return {'jobs': removed, 'files': files}
+
+
+_jobs.register('previews', _job_previews, max_attempts=3)
+_jobs.register('reconcile_stats', _job_reconcile_stats, max_attempts=1)
+_jobs.register('import_students', _job_import_students, max_attempts=3)
+_jobs.register('export_students', _job_export_students)
+_jobs.register('purge_jobs', _job_purge, max_attempts=1)
+_jobs.every(STATS_RECONCILE_SECONDS, 'reconcile_stats')
+_jobs.every(3600, 'purge_jobs', priority=-10)
+
+
+def _start_job_workers():
+    """Start this process's job workers (LIFELINEQR_JOB_THREADS, 0 = none)."""
+    _jobs.start()
+    return _jobs
 
 
 # ── Run ──────────────────────────────────────────────────────────────────────
@@ -731,5 +2144,9 @@ if __name__ == '__main__':
     print('=' * 50)
     print('  LifelineQR Python Backend')
     print('  Running on http://localhost:5000')
+    print('  Development server; use `python manage.py serve` in production')
     print('=' * 50)
+    if not _check_schema():
+        sys.exit(1)
+    _start_job_workers()
     app.run(debug=True, port=5000)
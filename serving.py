@@ -0,0 +1,127 @@
+"""
+LifelineQR - Production server launcher.
+Runs the Flask app under gunicorn: the app is imported once in the master,
+then forked into worker processes that each serve requests on a thread pool.
+On Windows, where gunicorn cannot run, waitress serves it multi-threaded.
+``serve_asgi`` runs asgi.py (async handlers + the Flask app) under uvicorn.
+"""
+
+import multiprocessing
+import os
+import sys
+
+DEFAULTS = {
+    'bind': os.environ.get('LIFELINEQR_BIND', '127.0.0.1:5000'),
+    'workers': int(os.environ.get('LIFELINEQR_WORKERS', multiprocessing.cpu_count() * 2 + 1)),
+    'threads': int(os.environ.get('LIFELINEQR_THREADS', 4)),
+    # Seconds a worker may go silent before the master kills and replaces it
+    'timeout': int(os.environ.get('LIFELINEQR_TIMEOUT', 60)),
+    # Seconds in-flight requests get to finish on restart / shutdown
+    'graceful_timeout': int(os.environ.get('LIFELINEQR_GRACEFUL_TIMEOUT', 30)),
+    'keepalive': int(os.environ.get('LIFELINEQR_KEEPALIVE', 5)),
+    # Recycle each worker after this many requests (0 = never), +/- jitter
+    'max_requests': int(os.environ.get('LIFELINEQR_MAX_REQUESTS', 5000)),
+    'max_requests_jitter': int(os.environ.get('LIFELINEQR_MAX_REQUESTS_JITTER', 500)),
+}
+
+
+def _load_app():
+    """Import the app and confirm the schema; runs once, in the master."""
+    import server
+
+    if not server._check_schema():
+        sys.exit(1)
+    # The master never serves; don't let workers inherit its connections
+    server._pool.dispose()
+    if server._replica_pool is not None:
+        server._replica_pool.dispose()
+    return server
+
+
+# ── gunicorn hooks ───────────────────────────────────────────────────────────
+
+def _post_fork(arbiter, worker):
+    import server
+    server._pool.after_fork()
+    if server._replica_pool is not None:
+        server._replica_pool.after_fork()
+
+
+def _post_worker_init(worker):
+    import server
+    server._start_job_workers()
+
+
+def _worker_exit(arbiter, worker):
+    import server
+    server._access_log.stop()
+    server._pool.dispose()
+    if server._replica_pool is not None:
+        server._replica_pool.dispose()
+
+
+def serve_gunicorn(options):
+    from gunicorn.app.base import BaseApplication
+
+    class LifelineApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return _load_app().app
+
+    options = dict(
+        options,
+        worker_class='gthread',
+        preload_app=True,
+        post_fork=_post_fork,
+        post_worker_init=_post_worker_init,
+        worker_exit=_worker_exit,
+        proc_name='lifelineqr',
+    )
+    LifelineApplication().run()
+
+
+def serve_waitress(options):
+    import waitress
+
+    server = _load_app()
+    server._start_job_workers()
+    waitress.serve(server.app, listen=options['bind'], threads=options['threads'],
+                   channel_timeout=options['timeout'])
+
+
+def serve_asgi(options):
+    import uvicorn
+    import config
+
+    config.load()
+    if config.db_backend() == 'sqlite':
+        # asgi.py's async handlers talk to MySQL directly (aiomysql)
+        print('  [ERR] --asgi needs the MySQL backend; serve SQLite without it')
+        sys.exit(1)
+
+    host, _, port = options['bind'].rpartition(':')
+    uvicorn.run(
+        'asgi:app',
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host or '127.0.0.1',
+        port=int(port),
+        workers=options['workers'],
+        timeout_keep_alive=options['keepalive'],
+        timeout_graceful_shutdown=options['graceful_timeout'],
+        limit_max_requests=options['max_requests'] or None,
+        lifespan='on',
+    )
+
+
+def serve(asgi=False, **overrides):
+    """Run the production server; keyword arguments override DEFAULTS."""
+    options = dict(DEFAULTS, **{k: v for k, v in overrides.items() if v is not None})
+    if asgi:
+        serve_asgi(options)
+    elif sys.platform == 'win32':
+        serve_waitress(options)
+    else:
+        serve_gunicorn(options)
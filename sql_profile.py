@@ -0,0 +1,273 @@
+"""
+LifelineQR - Opt-in per-request SQL profiling for staging.
+While a request is profiled, every statement run through get_db() cursors is
+recorded with the shape of its parameters, its time and its row count.
+Statements repeated within one request (N+1) and slow ones are flagged and
+can have their EXPLAIN plan captured. Request summaries and per-statement
+totals are kept in memory for /api/admin/sql-profile.
+"""
+
+import itertools
+import re
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+# Statements recorded per request; later ones are only counted
+MAX_STATEMENTS = 500
+# Distinct statement shapes totalled across requests
+MAX_SHAPES = 1000
+# Statement kinds MySQL can EXPLAIN without running them
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def shape(sql):
+    """The statement with literals replaced and IN lists folded, for grouping.
+
+    ``WHERE id IN (%s, %s, %s) LIMIT 20`` and ``WHERE id IN (%s) LIMIT 50``
+    share the shape ``WHERE id IN (...) LIMIT ?``.
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _type_name(value):
+    return 'null' if value is None else type(value).__name__
+
+
+def param_shape(params, many=False):
+    """Parameter types without their values, e.g. ['int', 'str'] or {'id': 'int'}."""
+    if many:
+        rows = list(params or ())
+        return {'rows': len(rows), 'row': param_shape(rows[0]) if rows else None}
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _type_name(value) for key, value in params.items()}
+    return [_type_name(value) for value in params]
+
+
+class Statement:
+    """One statement as run by a request; fetches add their time and rows to it."""
+
+    def __init__(self, sql, params, many, seconds, rowcount):
+        self.sql = sql
+        self.params = params          # kept for EXPLAIN, never put in the dump
+        self.many = many
+        self.seconds = seconds
+        self.rows = max(rowcount, 0)
+        self.explain = None
+
+    def update(self, seconds, rowcount):
+        self.seconds += seconds
+        # Unbuffered cursors count rows as they are fetched
+        self.rows = max(self.rows, rowcount)
+
+    @property
+    def kind(self):
+        return self.sql.split(None, 1)[0].upper() if self.sql.strip() else ''
+
+
+class RequestProfile:
+    """Statements run by one request, in order."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.statements = []
+        self.dropped = 0
+
+    def record(self, args, kwargs, seconds, rowcount, many=False):
+        """Add an execute/executemany call; returns its Statement (None past MAX_STATEMENTS)."""
+        sql = args[0] if args else kwargs.get('operation', '')
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode('utf-8', 'replace')
+        params = args[1] if len(args) > 1 else kwargs.get('params', kwargs.get('seq_params'))
+        if len(self.statements) >= MAX_STATEMENTS:
+            self.dropped += 1
+            return None
+        statement = Statement(sql, params, many, seconds, rowcount)
+        self.statements.append(statement)
+        return statement
+
+
+class SQLProfiler:
+    """Profiles the SQL of requests on this process.
+
+    timer       -- the pool's QueryTimer; a request is profiled while its
+                   ``profile`` attribute holds a RequestProfile
+    get_db      -- callable returning a pooled connection, used for EXPLAIN
+    slow_ms     -- statements taking at least this long are flagged slow
+    n_plus_one  -- a SELECT shape run this many times in one request is flagged
+    explain     -- capture EXPLAIN for flagged statements (one extra query each)
+    keep        -- request profiles kept for /api/admin/sql-profile
+    """
+
+    def __init__(self, timer, get_db, slow_ms=100, n_plus_one=5, explain=False, keep=200):
+        self.timer = timer
+        self.get_db = get_db
+        self.slow_ms = slow_ms
+        self.n_plus_one = n_plus_one
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._recent = deque(maxlen=keep)
+        self._shapes = {}     # shape -> totals across requests
+
+    def start(self, method, path):
+        self.timer.profile = RequestProfile(method, path)
+
+    def stop(self):
+        """Stop recording on this thread; returns the profile, if one was running."""
+        profile, self.timer.profile = self.timer.profile, None
+        return profile
+
+    def finish(self, route, status):
+        """End this thread's request profile; returns its dump (None if not profiling)."""
+        profile = self.stop()
+        if profile is None:
+            return None
+        total = time.perf_counter() - profile.started
+        statements = profile.statements
+        shapes = [shape(s.sql) for s in statements]
+
+        repeated = {}
+        for statement, key in zip(statements, shapes):
+            if statement.kind == 'SELECT':
+                repeated.setdefault(key, []).append(statement)
+        n_plus_one = {key: runs for key, runs in repeated.items() if len(runs) >= self.n_plus_one}
+
+        flagged = set()
+        for statement in statements:
+            if statement.seconds * 1000 >= self.slow_ms:
+                flagged.add(id(statement))
+        for runs in n_plus_one.values():
+            flagged.add(id(max(runs, key=lambda s: s.seconds)))
+        if self.explain and flagged:
+            self._explain([s for s in statements if id(s) in flagged])
+
+        db_seconds = sum(s.seconds for s in statements)
+        dump = {
+            'id': next(self._ids),
+            'method': profile.method,
+            'path': profile.path,
+            'route': route,
+            'status': status,
+            'at': time.time(),
+            'ms': round(total * 1000, 3),
+            'db_ms': round(db_seconds * 1000, 3),
+            'queries': sum(s.kind != 'COMMIT' for s in statements) + profile.dropped,
+            'dropped': profile.dropped,
+            'statements': [],
+            'n_plus_one': [
+                {'sql': key, 'count': len(runs),
+                 'ms': round(sum(s.seconds for s in runs) * 1000, 3)}
+                for key, runs in sorted(n_plus_one.items(), key=lambda item: -len(item[1]))
+            ],
+            'slow': [],
+        }
+        for index, (statement, key) in enumerate(zip(statements, shapes)):
+            flags = []
+            if statement.seconds * 1000 >= self.slow_ms:
+                flags.append('slow')
+                dump['slow'].append(index)
+            if key in n_plus_one:
+                flags.append('n+1')
+            entry = {
+                'sql': key,
+                'params': param_shape(statement.params, statement.many),
+                'ms': round(statement.seconds * 1000, 3),
+                'rows': statement.rows,
+                'flags': flags,
+            }
+            if statement.explain is not None:
+                entry['explain'] = statement.explain
+            dump['statements'].append(entry)
+
+        with self._lock:
+            self._recent.append(dump)
+            for statement, key in zip(statements, shapes):
+                totals = self._shapes.get(key)
+                if totals is None:
+                    if len(self._shapes) >= MAX_SHAPES:
+                        continue
+                    totals = self._shapes[key] = {'sql': key, 'count': 0, 'seconds': 0.0,
+                                                  'max_seconds': 0.0, 'rows': 0, 'routes': set()}
+                totals['count'] += 1
+                totals['seconds'] += statement.seconds
+                totals['max_seconds'] = max(totals['max_seconds'], statement.seconds)
+                totals['rows'] += statement.rows
+                totals['routes'].add(route)
+        return dump
+
+    def _explain(self, statements):
+        """Attach EXPLAIN rows to ``statements``, off the books of the request's timer."""
+        seconds, queries = self.timer.seconds, self.timer.queries
+        try:
+            with self.get_db() as conn:
+                cursor = conn.cursor(dictionary=True)
+                for statement in statements:
+                    if statement.many or statement.kind not in EXPLAINABLE:
+                        continue
+                    try:
+                        cursor.execute('EXPLAIN ' + statement.sql, statement.params)
+                        statement.explain = cursor.fetchall()
+                    except mysql.connector.Error as err:
+                        statement.explain = {'error': str(err)}
+        except mysql.connector.Error as err:
+            print(f'  [ERR] SQL profile EXPLAIN: {err}')
+        finally:
+            self.timer.seconds, self.timer.queries = seconds, queries
+
+    @staticmethod
+    def server_timing(dump):
+        """Server-Timing header value for a request's dump."""
+        return (f'db;dur={dump["db_ms"]};desc="{dump["queries"]} queries", '
+                f'total;dur={dump["ms"]}')
+
+    def get(self, profile_id):
+        with self._lock:
+            for dump in self._recent:
+                if dump['id'] == profile_id:
+                    return dump
+        raise KeyError(profile_id)
+
+    def recent(self, limit=50):
+        """Summaries of the latest requests, newest first."""
+        keys = ('id', 'method', 'path', 'route', 'status', 'at', 'ms', 'db_ms', 'queries')
+        with self._lock:
+            dumps = list(self._recent)[-limit:]
+        return [dict({key: dump[key] for key in keys}, n_plus_one=len(dump['n_plus_one']),
+                     slow=len(dump['slow']))
+                for dump in reversed(dumps)]
+
+    def statements(self, limit=50):
+        """Statement shapes with the most total time across profiled requests."""
+        with self._lock:
+            totals = sorted(self._shapes.values(), key=lambda t: -t['seconds'])[:limit]
+            return [{
+                'sql': t['sql'],
+                'count': t['count'],
+                'ms': round(t['seconds'] * 1000, 3),
+                'avg_ms': round(t['seconds'] * 1000 / t['count'], 3),
+                'max_ms': round(t['max_seconds'] * 1000, 3),
+                'rows': t['rows'],
+                'routes': sorted(t['routes']),
+            } for t in totals]
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._shapes.clear()
@@ -0,0 +1,592 @@
+"""
+LifelineQR - Embedded SQLite (WAL) backend for single-machine deployments.
+SQLitePool hands out connections that look like db_pool's pooled MySQL ones,
+so handlers, jobs and manage.py run unchanged. Their MySQL-dialect SQL is
+rewritten once per distinct statement (the same text each time, so SQLite's
+prepared statement cache is reused) and errors surface as mysql.connector
+errors with the matching errno. Each thread keeps its own connections.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+from mysql.connector import errorcode, errors
+
+import stats
+from db_pool import PooledConnection, QueryTimer
+
+# Statements that only read; anything else opens a write transaction first
+_READS = ('SELECT', 'EXPLAIN', 'PRAGMA', 'WITH')
+
+# The schema at migrations.LATEST. Every statement is idempotent, so it
+# creates a new database in one step and adds new tables to an older one.
+# Columns compared case-insensitively under MySQL's default collation are
+# COLLATE NOCASE here; timestamps are local time, as MySQL's NOW() is.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL COLLATE NOCASE,
+        age INT NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+        password VARCHAR(255) NOT NULL,
+        blood_group VARCHAR(5) COLLATE NOCASE,
+        allergies TEXT,
+        medical_conditions TEXT,
+        regular_medications TEXT,
+        address TEXT,
+        emergency_contacts VARCHAR(20),
+        student_class VARCHAR(10) COLLATE NOCASE,
+        section VARCHAR(5) COLLATE NOCASE,
+        roll_number VARCHAR(20) COLLATE NOCASE,
+        parent_name VARCHAR(255) COLLATE NOCASE,
+        doc_count INT NOT NULL DEFAULT 0,
+        last_upload_at DATETIME,
+        created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+        version INT NOT NULL DEFAULT 1,
+        updated_at DATETIME,
+        docs_version INT NOT NULL DEFAULT 1,
+        docs_updated_at DATETIME,
+        emergency_payload VARCHAR(2048)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS doctors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL COLLATE NOCASE,
+        age INT NOT NULL,
+        email VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+        password VARCHAR(255) NOT NULL,
+        specialization VARCHAR(100) COLLATE NOCASE,
+        experience INT,
+        hospital VARCHAR(255) COLLATE NOCASE,
+        contact_number VARCHAR(20),
+        working_hours VARCHAR(50),
+        is_verified BOOLEAN DEFAULT FALSE,
+        created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medical_documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INT NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+        filename VARCHAR(255) NOT NULL,
+        blob_sha256 CHAR(64),
+        content_type VARCHAR(100),
+        size_bytes BIGINT,
+        description TEXT,
+        uploaded_at DATETIME DEFAULT (datetime('now', 'localtime')),
+        preview_state VARCHAR(10),
+        thumb_sha256 CHAR(64),
+        preview_sha256 CHAR(64)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admins (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+        password VARCHAR(255) NOT NULL,
+        created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind VARCHAR(64) NOT NULL,
+        payload TEXT,
+        idempotency_key VARCHAR(191) UNIQUE,
+        priority INT NOT NULL DEFAULT 0,
+        state VARCHAR(10) NOT NULL DEFAULT 'queued',
+        attempts INT NOT NULL DEFAULT 0,
+        max_attempts INT NOT NULL DEFAULT 5,
+        run_after DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+        locked_by VARCHAR(100),
+        locked_until DATETIME,
+        progress_done INT,
+        progress_total INT,
+        result TEXT,
+        error TEXT,
+        created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+        started_at DATETIME,
+        finished_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS access_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INT NOT NULL,
+        document_id INT,
+        action VARCHAR(20) NOT NULL,
+        viewer_role VARCHAR(10),
+        viewer_id INT,
+        ip VARCHAR(45),
+        user_agent VARCHAR(255),
+        status SMALLINT,
+        accessed_at DATETIME NOT NULL
+    )
+    """,
+] + list(stats.SCHEMA) + [
+    f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})'
+    for table, index, columns in [
+        ('medical_documents', 'idx_documents_blob', 'blob_sha256'),
+        ('medical_documents', 'idx_documents_student', 'student_id, uploaded_at'),
+        ('medical_documents', 'idx_documents_thumb', 'thumb_sha256'),
+        ('medical_documents', 'idx_documents_preview', 'preview_sha256'),
+        ('students', 'idx_students_created', 'created_at, id'),
+        ('students', 'idx_students_class', 'student_class, section, created_at, id'),
+        ('students', 'idx_students_blood', 'blood_group, created_at, id'),
+        ('students', 'idx_students_name', 'name'),
+        ('students', 'idx_students_roll', 'roll_number'),
+        ('students', 'idx_students_parent', 'parent_name'),
+        ('doctors', 'idx_doctors_created', 'created_at, id'),
+        ('doctors', 'idx_doctors_verified', 'is_verified, created_at, id'),
+        ('doctors', 'idx_doctors_name', 'name'),
+        ('doctors', 'idx_doctors_specialization', 'specialization'),
+        ('doctors', 'idx_doctors_hospital', 'hospital'),
+        ('jobs', 'idx_jobs_ready', 'state, priority DESC, run_after, id'),
+        ('jobs', 'idx_jobs_lease', 'state, locked_until'),
+        ('jobs', 'idx_jobs_finished', 'state, finished_at'),
+        ('access_log', 'idx_access_student', 'student_id, accessed_at, id'),
+    ]
+]
+
+
+def _fulltext(table, columns):
+    """FTS5 index over ``columns`` of ``table``, kept in step by triggers (search.py)."""
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    names = ', '.join(columns)
+    fts = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, "
+        f"content='{table}', content_rowid='id')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN '
+        f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f'INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new}); END',
+    ]
+
+
+SCHEMA += _fulltext('students', ('name', 'email', 'roll_number', 'parent_name'))
+SCHEMA += _fulltext('doctors', ('name', 'specialization', 'hospital'))
+
+# Rows a new database starts with
+SEED = [
+    "INSERT OR IGNORE INTO admins (email, password) VALUES ('admin@lifelineqr.com', 'admin@123')",
+]
+
+# Migration number -> statements altering tables an older database already has
+# (SCHEMA creates only what is missing)
+UPGRADES = {}
+
+# Whole statements no rewrite rule covers, by their MySQL text
+STATEMENTS = {
+    stats.BACKFILL_DOC_COUNTS_SQL: (
+        'UPDATE students SET doc_count = COALESCE(d.n, 0), last_upload_at = d.last_upload '
+        'FROM (SELECT s.id, n, last_upload FROM students s LEFT JOIN ('
+        '  SELECT student_id, COUNT(*) AS n, MAX(uploaded_at) AS last_upload'
+        '  FROM medical_documents GROUP BY student_id'
+        ') AS docs ON docs.student_id = s.id) AS d WHERE d.id = students.id'),
+}
+
+
+# ── MySQL dialect → SQLite ───────────────────────────────────────────────────
+
+_LOCKING = re.compile(r'\s+(?:FOR UPDATE(?:\s+(?:SKIP LOCKED|NOWAIT))?|LOCK IN SHARE MODE)',
+                      re.IGNORECASE)
+_UPSERT = re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.IGNORECASE)
+_UPSERT_VALUE = re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE)
+_DATE_ARITH = re.compile(r'\bDATE_(ADD|SUB)\(NOW\(\),\s*INTERVAL\s+(%s|\d+)\s+'
+                         r'(SECOND|MINUTE|HOUR|DAY)\)', re.IGNORECASE)
+_DAYS_AGO = re.compile(r'\bCURDATE\(\)\s*-\s*INTERVAL\s+(\d+)\s+DAY\b', re.IGNORECASE)
+_RULES = [
+    (re.compile(r'\bINSERT IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+    (re.compile(r'\bNOW\(\)', re.IGNORECASE), "datetime('now', 'localtime')"),
+    (re.compile(r'\bCURDATE\(\)', re.IGNORECASE), "date('now', 'localtime')"),
+    (re.compile(r'<=>'), 'IS'),
+    (re.compile(r'\bIF\(', re.IGNORECASE), 'IIF('),
+    (re.compile(r'\bRAND\(\)', re.IGNORECASE), 'RANDOM()'),
+    # MySQL escapes LIKE patterns with a backslash by default; SQLite only when told
+    (re.compile(r'\bLIKE\s+%s', re.IGNORECASE), r"LIKE %s ESCAPE '\\'"),
+]
+
+
+def _date_arith(match):
+    op, amount, unit = match.groups()
+    amount = '?' if amount == '%s' else amount
+    sign = "'-' || " if op.upper() == 'SUB' else ''
+    return f"datetime('now', 'localtime', {sign}{amount} || ' {unit.lower()}s')"
+
+
+@lru_cache(maxsize=2048)
+def translate(sql):
+    """(SQLite statement, whether it needs the write lock) for a MySQL statement.
+
+    Cached, so every run of a statement hands SQLite the same text and
+    reuses its prepared form.
+    """
+    sql = STATEMENTS.get(sql, sql)
+    locking = bool(_LOCKING.search(sql))
+    sql = _LOCKING.sub('', sql)
+    upsert = _UPSERT.search(sql)
+    if upsert:
+        sql = (sql[:upsert.start()] + 'ON CONFLICT DO UPDATE SET'
+               + _UPSERT_VALUE.sub(r'excluded.\1', sql[upsert.end():]))
+    sql = _DATE_ARITH.sub(_date_arith, sql)
+    sql = _DAYS_AGO.sub(r"date('now', 'localtime', '-\1 days')", sql)
+    for pattern, replacement in _RULES:
+        sql = pattern.sub(replacement, sql)
+    sql = sql.replace('%s', '?')
+    read = sql.lstrip().split(None, 1)[0].upper() in _READS if sql.strip() else True
+    return sql, locking or not read
+
+
+# ── Values and errors ────────────────────────────────────────────────────────
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+
+_DATE_TEXT = re.compile(r'^\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)?$')
+
+
+def _temporal(value):
+    """datetime / date for the text SQLite returns from DATE(), MAX(uploaded_at), ..."""
+    if isinstance(value, str) and _DATE_TEXT.match(value):
+        return datetime.fromisoformat(value) if len(value) > 10 else date.fromisoformat(value)
+    return value
+
+
+def _error(exc):
+    """The mysql.connector error a handler expects for a sqlite3 error."""
+    message = str(exc)
+    if isinstance(exc, sqlite3.IntegrityError):
+        if message.startswith('UNIQUE'):
+            return errors.IntegrityError(msg=message, errno=errorcode.ER_DUP_ENTRY)
+        if message.startswith('FOREIGN KEY'):
+            return errors.IntegrityError(msg=message, errno=errorcode.ER_NO_REFERENCED_ROW_2)
+        if message.startswith('NOT NULL'):
+            return errors.IntegrityError(msg=message, errno=errorcode.ER_BAD_NULL_ERROR)
+        return errors.IntegrityError(msg=message)
+    if isinstance(exc, sqlite3.OperationalError):
+        if 'no such table' in message:
+            return errors.ProgrammingError(msg=message, errno=errorcode.ER_NO_SUCH_TABLE)
+        if 'locked' in message or 'busy' in message:
+            return errors.OperationalError(msg=message, errno=errorcode.ER_LOCK_WAIT_TIMEOUT)
+        return errors.OperationalError(msg=message)
+    if isinstance(exc, sqlite3.ProgrammingError):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+
+# ── Connections ──────────────────────────────────────────────────────────────
+
+class SQLiteCursor:
+    """mysql.connector-style cursor: %s parameters, dictionary rows, errno'd errors.
+
+    Like an unbuffered MySQL cursor, rowcount after a SELECT is the number of
+    rows fetched so far.
+    """
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+        self._dictionary = dictionary
+        self._fetched = None      # rows fetched from the current SELECT, else None
+
+    def execute(self, operation, params=None):
+        sql, write = translate(operation)
+        try:
+            if write:
+                self._conn.begin()
+            self._cursor.execute(sql, params or ())
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+        self._fetched = -1 if self._cursor.description is not None else None
+
+    def executemany(self, operation, seq_params):
+        sql, write = translate(operation)
+        try:
+            if write:
+                self._conn.begin()
+            self._cursor.executemany(sql, seq_params)
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+        self._fetched = None
+
+    def _rows(self, rows):
+        if self._fetched is not None:
+            self._fetched = max(self._fetched, 0) + len(rows)
+        names = self.column_names
+        # Declared DATE/DATETIME columns are converted by sqlite3 already;
+        # expressions over them (named after the expression) are not
+        computed = [i for i, name in enumerate(names) if '(' in name]
+        out = []
+        for row in rows:
+            if computed:
+                row = list(row)
+                for i in computed:
+                    row[i] = _temporal(row[i])
+                row = tuple(row)
+            out.append(dict(zip(names, row)) if self._dictionary else row)
+        return out
+
+    def fetchone(self):
+        try:
+            row = self._cursor.fetchone()
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchmany(self, size=1):
+        try:
+            return self._rows(self._cursor.fetchmany(size))
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+
+    def fetchall(self):
+        try:
+            return self._rows(self._cursor.fetchall())
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def rowcount(self):
+        return self._fetched if self._fetched is not None else self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """One sqlite3 connection; PooledConnection wraps it like a MySQL connection.
+
+    sqlite3 runs in autocommit mode and transactions are begun explicitly:
+    IMMEDIATE, at the first write or locking read, so a transaction never has
+    to upgrade a read lock (which WAL mode refuses once another writer has
+    committed).
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+
+    def cursor(self, dictionary=False, **kwargs):
+        # buffered= and the like change nothing here: rows are always read lazily
+        return SQLiteCursor(self, dictionary)
+
+    def begin(self):
+        if not self.raw.in_transaction:
+            self.raw.execute('BEGIN IMMEDIATE')
+
+    def commit(self):
+        try:
+            if self.raw.in_transaction:
+                self.raw.execute('COMMIT')
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+
+    def rollback(self):
+        try:
+            if self.raw.in_transaction:
+                self.raw.execute('ROLLBACK')
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+
+    def ping(self, reconnect=False):
+        self.raw.execute('SELECT 1').fetchone()
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLitePool:
+    """Per-thread SQLite connections with the ConnectionPool interface.
+
+    path            -- database file (created with its directory if missing)
+    timeout         -- seconds a write waits for the database lock
+    cache_mb        -- page cache per connection
+    mmap_mb         -- bytes of the file read through mmap instead of read()
+    statement_cache -- prepared statements kept per connection
+
+    A thread reuses the connection it returned last, so there is nothing to
+    wait for at checkout; nested checkouts on one thread get a second one.
+    """
+
+    def __init__(self, path, timeout=10.0, cache_mb=64, mmap_mb=256, statement_cache=512):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self.cache_mb = cache_mb
+        self.mmap_mb = mmap_mb
+        self.statement_cache = statement_cache
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = []        # (thread, idle connections) of every thread that connected
+        self._pid = os.getpid()
+        self.timer = QueryTimer()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._connects = 0
+        self._invalidated = 0
+
+    def _idle(self):
+        try:
+            return self._local.idle
+        except AttributeError:
+            idle = self._local.idle = []
+            with self._lock:
+                self._reap()
+                self._threads.append((threading.current_thread(), idle))
+            return idle
+
+    def _reap(self):
+        """Close the idle connections of threads that have exited (lock held)."""
+        live = []
+        for thread, idle in self._threads:
+            if thread.is_alive():
+                live.append((thread, idle))
+                continue
+            for raw in idle:
+                self._close_quietly(raw)
+                self._open -= 1
+            idle.clear()
+        self._threads = live
+
+    def connection(self):
+        """Check out this thread's connection; use it as a context manager."""
+        self._check_pid()
+        idle = self._idle()
+        raw = idle.pop() if idle else self._connect()
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return PooledConnection(self, raw, raw.created_at)
+
+    def _connect(self):
+        try:
+            raw = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                  check_same_thread=False,
+                                  detect_types=sqlite3.PARSE_DECLTYPES,
+                                  cached_statements=self.statement_cache)
+            for pragma in ('PRAGMA journal_mode = WAL',
+                           'PRAGMA synchronous = NORMAL',
+                           'PRAGMA foreign_keys = ON',
+                           'PRAGMA temp_store = MEMORY',
+                           f'PRAGMA cache_size = {-self.cache_mb * 1024}',
+                           f'PRAGMA mmap_size = {self.mmap_mb * 1024 * 1024}'):
+                raw.execute(pragma)
+        except sqlite3.Error as exc:
+            raise _error(exc) from exc
+        with self._lock:
+            self._open += 1
+            self._connects += 1
+        return SQLiteConnection(raw)
+
+    def _release(self, raw, created_at, cursors):
+        for cursor in cursors:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if not healthy or os.getpid() != self._pid:
+                self._open -= 1
+                self._invalidated += 1
+        if healthy and os.getpid() == self._pid:
+            self._idle().append(raw)
+        else:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    def _check_pid(self):
+        if os.getpid() != self._pid:
+            self.after_fork()
+
+    def after_fork(self):
+        """Forget connections inherited across fork(); SQLite handles must not be shared."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = []
+        self._pid = os.getpid()
+        self._reset_stats()
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on return)."""
+        with self._lock:
+            for _, idle in self._threads:
+                for raw in idle:
+                    self._close_quietly(raw)
+                    self._open -= 1
+                idle.clear()
+
+    def stats(self):
+        with self._lock:
+            cache = translate.cache_info()
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'open': self._open,
+                'idle': sum(len(idle) for _, idle in self._threads),
+                'in_use': self._in_use,
+                'threads': len(self._threads),
+                'checkouts': self._checkouts,
+                'connects': self._connects,
+                'invalidated': self._invalidated,
+                'statements_translated': cache.currsize,
+                'translation_hits': cache.hits,
+            }
+
+
+def create_schema(conn, seed=True):
+    """Create every missing table, index and full-text index (and the SEED rows)."""
+    cursor = conn.cursor()
+    for statement in SCHEMA + (SEED if seed else []):
+        cursor.execute(statement)
+    conn.commit()
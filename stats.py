@@ -0,0 +1,186 @@
+"""
+LifelineQR - Incrementally maintained dashboard counters.
+Write handlers adjust the counters inside their own transaction, so
+/api/admin/stats reads a handful of rows instead of counting tables.
+``reconcile`` recomputes everything from the source tables to correct drift.
+Per-student students.doc_count / last_upload_at are handled the same way.
+"""
+
+COUNTERS = ('pending_doctors', 'total_documents', 'total_doctors', 'total_students')
+
+# Per-day counter behind "new today"
+DAILY_REGISTRATIONS = 'student_registrations'
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        name VARCHAR(64) PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_counters (
+        day DATE NOT NULL,
+        name VARCHAR(64) NOT NULL,
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, name)
+    )
+    """,
+]
+
+
+def bump(cursor, deltas):
+    """Apply {counter: delta} within the caller's transaction.
+
+    Rows are touched in name order, the same order ``reconcile`` locks them,
+    so concurrent writers and the reconciler cannot deadlock on each other.
+    """
+    for name in sorted(deltas):
+        if deltas[name]:
+            cursor.execute('INSERT INTO stats_counters (name, value) VALUES (%s, %s) '
+                           'ON DUPLICATE KEY UPDATE value = value + VALUES(value)',
+                           (name, deltas[name]))
+
+
+def bump_daily(cursor, name, delta, day=None):
+    """Adjust a per-day counter; ``day`` defaults to the database's CURDATE()."""
+    if day is None:
+        cursor.execute('INSERT INTO daily_counters (day, name, value) VALUES (CURDATE(), %s, %s) '
+                       'ON DUPLICATE KEY UPDATE value = value + VALUES(value)', (name, delta))
+    else:
+        cursor.execute('INSERT INTO daily_counters (day, name, value) VALUES (%s, %s, %s) '
+                       'ON DUPLICATE KEY UPDATE value = value + VALUES(value)', (day, name, delta))
+
+
+READ_COUNTERS_SQL = 'SELECT name, value FROM stats_counters'
+READ_TODAY_SQL = 'SELECT value FROM daily_counters WHERE day = CURDATE() AND name = %s'
+
+
+def read(cursor):
+    """Current dashboard numbers from two tiny lookups, independent of table size."""
+    cursor.execute(READ_COUNTERS_SQL)
+    counters = cursor.fetchall()
+    cursor.execute(READ_TODAY_SQL, (DAILY_REGISTRATIONS,))
+    return summarise(counters, cursor.fetchone())
+
+
+def summarise(counter_rows, today_row):
+    """Build the /api/admin/stats payload from the rows of the two reads."""
+    values = {name: 0 for name in COUNTERS}
+    values.update({name: int(value) for name, value in counter_rows})
+
+    return {
+        'total_students': values['total_students'],
+        'total_doctors': values['total_doctors'],
+        'total_documents': values['total_documents'],
+        'new_today': int(today_row[0]) if today_row else 0,
+        'pending_doctors': values['pending_doctors'],
+    }
+
+
+def reconcile(conn):
+    """Recount from the source tables and overwrite drifted counters.
+
+    Locks the counter rows first, so writers that commit meanwhile wait and
+    apply their delta on top of the corrected value. Returns {counter: drift}
+    for every counter that was wrong.
+    """
+    cursor = conn.cursor()
+    for name in COUNTERS:
+        cursor.execute('INSERT IGNORE INTO stats_counters (name, value) VALUES (%s, 0)', (name,))
+    cursor.execute('SELECT name, value FROM stats_counters WHERE name IN (%s, %s, %s, %s) '
+                   'ORDER BY name FOR UPDATE', COUNTERS)
+    stored = {name: int(value) for name, value in cursor.fetchall()}
+
+    actual = {}
+    cursor.execute('SELECT COUNT(*) FROM students')
+    actual['total_students'] = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM doctors')
+    actual['total_doctors'] = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM medical_documents')
+    actual['total_documents'] = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM doctors WHERE is_verified = FALSE')
+    actual['pending_doctors'] = cursor.fetchone()[0]
+
+    drift = {}
+    for name, value in actual.items():
+        if stored.get(name) != value:
+            drift[name] = value - stored.get(name, 0)
+            cursor.execute('UPDATE stats_counters SET value = %s WHERE name = %s', (value, name))
+
+    # Today's and yesterday's registrations: a range on created_at, not DATE(created_at)
+    cursor.execute('SELECT day, value FROM daily_counters '
+                   'WHERE name = %s AND day >= CURDATE() - INTERVAL 1 DAY FOR UPDATE',
+                   (DAILY_REGISTRATIONS,))
+    stored_daily = {day: int(value) for day, value in cursor.fetchall()}
+    cursor.execute('SELECT DATE(created_at), COUNT(*) FROM students '
+                   'WHERE created_at >= CURDATE() - INTERVAL 1 DAY GROUP BY DATE(created_at)')
+    actual_daily = {day: int(count) for day, count in cursor.fetchall()}
+
+    for day in set(stored_daily) | set(actual_daily):
+        value = actual_daily.get(day, 0)
+        if stored_daily.get(day, 0) != value:
+            drift[f'{DAILY_REGISTRATIONS}:{day}'] = value - stored_daily.get(day, 0)
+            cursor.execute('INSERT INTO daily_counters (day, name, value) VALUES (%s, %s, %s) '
+                           'ON DUPLICATE KEY UPDATE value = VALUES(value)',
+                           (day, DAILY_REGISTRATIONS, value))
+
+    conn.commit()
+    return drift
+
+
+BACKFILL_DOC_COUNTS_SQL = (
+    'UPDATE students s LEFT JOIN ('
+    '  SELECT student_id, COUNT(*) AS n, MAX(uploaded_at) AS last_upload'
+    '  FROM medical_documents GROUP BY student_id'
+    ') d ON d.student_id = s.id '
+    'SET s.doc_count = COALESCE(d.n, 0), s.last_upload_at = d.last_upload')
+
+
+def backfill_doc_counts(cursor):
+    """Fill students.doc_count / last_upload_at for every student in one pass."""
+    cursor.execute(BACKFILL_DOC_COUNTS_SQL)
+    return cursor.rowcount
+
+
+def verify_doc_counts(conn, fix=False, batch_size=500):
+    """Compare the stored per-student counts with medical_documents.
+
+    Walks students in id order, ``batch_size`` at a time, so no single query
+    groups the whole documents table. Returns a list of
+    (student_id, stored_count, actual_count) for every row that was wrong;
+    with ``fix`` those rows are corrected under a row lock.
+    """
+    cursor = conn.cursor()
+    mismatched = []
+    last_id = 0
+    while True:
+        cursor.execute(
+            'SELECT s.id, s.doc_count, s.last_upload_at, '
+            '       COUNT(d.id), MAX(d.uploaded_at) '
+            'FROM (SELECT id, doc_count, last_upload_at FROM students '
+            '      WHERE id > %s ORDER BY id LIMIT %s) s '
+            'LEFT JOIN medical_documents d ON d.student_id = s.id '
+            'GROUP BY s.id, s.doc_count, s.last_upload_at ORDER BY s.id',
+            (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        bad = [(sid, stored, actual) for sid, stored, last, actual, newest in rows
+               if stored != actual or last != newest]
+        mismatched.extend(bad)
+        if fix:
+            for sid, _, _ in bad:
+                cursor.execute('SELECT id FROM students WHERE id = %s FOR UPDATE', (sid,))
+                cursor.fetchall()
+                cursor.execute(
+                    'UPDATE students SET '
+                    'doc_count = (SELECT COUNT(*) FROM medical_documents WHERE student_id = %s), '
+                    'last_upload_at = (SELECT MAX(uploaded_at) FROM medical_documents '
+                    '                  WHERE student_id = %s) '
+                    'WHERE id = %s', (sid, sid, sid))
+                conn.commit()
+    return mismatched
+
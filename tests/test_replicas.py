@@ -0,0 +1,89 @@
+import contextlib
+import multiprocessing
+
+import pytest
+
+from replicas import ReplicaRouter, SharedPins
+
+WRITER = ('10.0.0.7', 'Mozilla/5.0 (student)')
+OTHER = ('10.0.0.8', 'Mozilla/5.0 (doctor)')
+
+
+class FakePool:
+    """Stands in for a ConnectionPool; the replica reports ``lag`` seconds."""
+
+    def __init__(self, name, lag=0):
+        self.name = name
+        self.lag = lag
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.pool.lag)
+
+
+class FakeCursor:
+    def __init__(self, lag):
+        self._rows = [{'Seconds_Behind_Source': lag}]
+
+    def execute(self, sql):
+        pass
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+def router(path):
+    return ReplicaRouter(FakePool('primary'), FakePool('replica'), sticky_seconds=30,
+                         shared_pins=SharedPins(path))
+
+
+def served_by(rt, session):
+    with rt.connection(session) as conn:
+        return conn.pool.name
+
+
+def _write_in_worker(path):
+    # Another worker process handles the write and pins its client
+    router(path).pin(WRITER)
+
+
+@pytest.mark.parametrize('start_method', ['fork', 'spawn'])
+def test_pin_from_one_worker_holds_in_another(tmp_path, start_method):
+    path = str(tmp_path / 'pins.bin')
+    reader = router(path)
+    assert served_by(reader, WRITER) == 'replica'
+
+    ctx = multiprocessing.get_context(start_method)
+    worker = ctx.Process(target=_write_in_worker, args=(path,))
+    worker.start()
+    worker.join(30)
+    assert worker.exitcode == 0
+
+    assert served_by(reader, WRITER) == 'primary'
+    assert served_by(reader, OTHER) == 'replica'
+    assert reader.stats()['pinned_sessions'] == 1
+
+
+def test_pin_expires(tmp_path):
+    rt = ReplicaRouter(FakePool('primary'), FakePool('replica'), sticky_seconds=-1,
+                       shared_pins=SharedPins(str(tmp_path / 'pins.bin')))
+    rt.pin(WRITER)
+    assert served_by(rt, WRITER) == 'replica'
+
+
+def test_lagging_replica_is_bypassed(tmp_path):
+    rt = ReplicaRouter(FakePool('primary'), FakePool('replica', lag=10), max_lag=2,
+                       shared_pins=SharedPins(str(tmp_path / 'pins.bin')))
+    assert served_by(rt, OTHER) == 'primary'
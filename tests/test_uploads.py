@@ -0,0 +1,104 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from uploads import ResumableUploads, UploadConflict
+
+CHUNK = 1024 * 1024
+
+
+class SlowStream:
+    """Request body that stalls after its first read until released."""
+
+    def __init__(self, data, release):
+        self._data = io.BytesIO(data)
+        self._release = release
+        self.started = threading.Event()
+
+    def read(self, size):
+        chunk = self._data.read(size)
+        if not self.started.is_set():
+            self.started.set()
+            self._release.wait(5)
+        return chunk
+
+
+def test_concurrent_chunks_at_same_offset(tmp_path):
+    uploads = ResumableUploads(str(tmp_path), max_bytes=4 * CHUNK)
+    upload_id = uploads.create(2 * CHUNK)['upload_id']
+    first, retry = b'A' * CHUNK, b'B' * CHUNK
+
+    release = threading.Event()
+    slow = SlowStream(first, release)
+    results = {}
+
+    def put(name, stream):
+        try:
+            results[name] = uploads.append(upload_id, 0, stream, chunk_size=64 * 1024)['received']
+        except UploadConflict as err:
+            results[name] = err
+
+    original = threading.Thread(target=put, args=('original', slow))
+    original.start()
+    assert slow.started.wait(5)
+    retried = threading.Thread(target=put, args=('retry', io.BytesIO(retry)))
+    retried.start()
+    retried.join(0.2)
+    release.set()
+    original.join(5)
+    retried.join(5)
+
+    assert results['original'] == CHUNK
+    assert isinstance(results['retry'], UploadConflict)
+    assert results['retry'].received == CHUNK
+    assert uploads.status(upload_id)['received'] == CHUNK
+
+    uploads.append(upload_id, CHUNK, io.BytesIO(retry))
+
+    def store(part_path, digest, meta):
+        with open(part_path, 'rb') as f:
+            assert f.read() == first + retry
+        assert digest == hashlib.sha256(first + retry).hexdigest()
+        return 1
+
+    assert uploads.complete(upload_id, store) == 1
+
+
+def test_concurrent_final_requests_store_once(tmp_path):
+    uploads = ResumableUploads(str(tmp_path), max_bytes=CHUNK)
+    upload_id = uploads.create(10)['upload_id']
+    uploads.append(upload_id, 0, io.BytesIO(b'0123456789'))
+    stored = []
+
+    def store(part_path, digest, meta):
+        time.sleep(0.1)
+        os.unlink(part_path)   # moved into the blob store
+        stored.append(digest)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(uploads.complete(upload_id, store)))
+               for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert results == [42, 42]
+    assert len(stored) == 1
+    # A retry after a lost response learns the id too
+    assert uploads.append(upload_id, 10, io.BytesIO(b''))['document_id'] == 42
+    assert uploads.status(upload_id)['received'] == 10
+    assert uploads.complete(upload_id, store) == 42
+
+
+def test_append_after_abort(tmp_path):
+    uploads = ResumableUploads(str(tmp_path), max_bytes=CHUNK)
+    upload_id = uploads.create(10)['upload_id']
+    uploads.abort(upload_id)
+    with pytest.raises(KeyError):
+        uploads.append(upload_id, 0, io.BytesIO(b'0123456789'))
@@ -0,0 +1,290 @@
+"""
+LifelineQR - Streaming and resumable document uploads.
+Request bodies are spooled to disk in fixed-size chunks while their SHA-256
+is computed, so a large scan never sits in worker memory. Resumable uploads
+keep their state on disk and accept the file one chunk per request.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+from werkzeug.formparser import parse_form_data
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single waitress process, a thread lock is enough
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeds the configured size limit."""
+
+
+class UploadConflict(ValueError):
+    """A resumable chunk does not start where the stored data ends."""
+
+    def __init__(self, received):
+        super().__init__(f'Chunk must start at byte {received}')
+        self.received = received
+
+
+class HashingSpool:
+    """Temp file that hashes and size-checks everything written to it."""
+
+    def __init__(self, directory, max_bytes):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        self._sha = hashlib.sha256()
+        self.path = self._file.name
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f'File exceeds the {self.max_bytes // (1024 * 1024)} MB limit')
+        self._sha.update(data)
+        return self._file.write(data)
+
+    @property
+    def digest(self):
+        return self._sha.hexdigest()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        # seek/read/tell/flush/close, used by werkzeug's multipart parser
+        return getattr(self._file, name)
+
+
+def spool_stream(stream, directory, max_bytes, chunk_size=CHUNK_SIZE):
+    """Copy a raw request body to disk; returns a closed HashingSpool."""
+    spool = HashingSpool(directory, max_bytes)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+        spool.close()
+    except BaseException:
+        spool.discard()
+        raise
+    return spool
+
+
+def spool_multipart(environ, directory, max_bytes):
+    """Parse multipart/form-data, streaming every file part into a HashingSpool.
+
+    Returns (form, files, spools); the caller owns the spools and must move
+    or discard them.
+    """
+    spools = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        spool = HashingSpool(directory, max_bytes)
+        spools.append(spool)
+        return spool
+
+    try:
+        _, form, files = parse_form_data(environ, stream_factory=stream_factory, silent=False)
+    except BaseException:
+        for spool in spools:
+            spool.discard()
+        raise
+
+    for spool in spools:
+        spool.close()
+    return form, files, spools
+
+
+class ResumableUploads:
+    """Chunked uploads that survive dropped connections and server restarts.
+
+    Each upload is <id>.json (metadata) plus <id>.part (bytes so far) in
+    ``directory``. The SHA-256 is carried forward in memory between chunks;
+    if this process did not see the earlier chunks it is recomputed from disk.
+    Chunks and the final store run under an exclusive lock on <id>.lock, so a
+    retried request racing the original (in any worker process) gets a
+    conflict, or the stored document's id, instead of writing twice. A stored
+    upload keeps its .json (with document_id) until it expires.
+    """
+
+    def __init__(self, directory, max_bytes, expire_after=86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.expire_after = expire_after
+        self._lock = threading.Lock()
+        self._upload_lock = threading.Lock() if fcntl is None else None
+        self._hashers = {}   # upload_id -> (offset, sha256 object)
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise KeyError(upload_id)
+        base = os.path.join(self.directory, upload_id)
+        return base + '.json', base + '.part'
+
+    def create(self, size, **meta):
+        """Start an upload of ``size`` bytes; returns its metadata."""
+        if size <= 0:
+            raise ValueError('size must be positive')
+        if size > self.max_bytes:
+            raise UploadTooLarge(f'File exceeds the {self.max_bytes // (1024 * 1024)} MB limit')
+        self.purge_expired()
+
+        upload_id = secrets.token_hex(16)
+        meta_path, part_path = self._paths(upload_id)
+        meta = dict(meta, upload_id=upload_id, size=size, created=time.time())
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        return dict(meta, received=0)
+
+    def status(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # Once stored, the .part file has moved into the blob store
+            meta['received'] = (meta['size'] if 'document_id' in meta
+                                else os.path.getsize(part_path))
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        return meta
+
+    @contextlib.contextmanager
+    def _locked(self, upload_id):
+        """Hold the upload exclusively (across threads and processes) until the block ends."""
+        json_path, _ = self._paths(upload_id)
+        if not os.path.exists(json_path):
+            raise KeyError(upload_id)
+        lock_path = json_path[:-len('.json')] + '.lock'
+        with open(lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)   # released when f is closed
+                os.utime(lock_path)             # in use: not for purge_expired
+                yield
+            else:
+                with self._upload_lock:
+                    yield
+
+    def append(self, upload_id, start, stream, chunk_size=CHUNK_SIZE):
+        """Append a chunk that begins at byte ``start``; returns updated status.
+
+        A chunk for an upload that has already been stored appends nothing;
+        the status it returns carries the document_id.
+        """
+        _, part_path = self._paths(upload_id)
+        with self._locked(upload_id):
+            # Only the state seen under the lock counts; another request may have just written
+            meta = self.status(upload_id)
+            if 'document_id' in meta:
+                return meta
+            if start != meta['received']:
+                raise UploadConflict(meta['received'])
+
+            sha = self._hasher(upload_id, part_path, start)
+            received = start
+            with open(part_path, 'ab') as f:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if received > meta['size']:
+                        f.truncate(start)
+                        raise UploadTooLarge('Chunk runs past the declared upload size')
+                    sha.update(chunk)
+                    f.write(chunk)
+
+            with self._lock:
+                self._hashers[upload_id] = (received, sha)
+        meta['received'] = received
+        return meta
+
+    def _hasher(self, upload_id, part_path, offset):
+        with self._lock:
+            cached = self._hashers.pop(upload_id, None)
+        if cached and cached[0] == offset:
+            return cached[1]
+        sha = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                sha.update(chunk)
+                remaining -= len(chunk)
+        return sha
+
+    def complete(self, upload_id, store):
+        """Store a fully received upload once; returns the document id ``store`` gave.
+
+        ``store(part_path, digest, meta)`` runs with the upload locked and
+        returns the new document's id (or None). The id is recorded, so a
+        repeated final request (a retried last chunk, or a retry after a lost
+        response) gets the same id back instead of storing a second copy. If
+        ``store`` raises, the upload stays as it was and the client can retry.
+        """
+        json_path, part_path = self._paths(upload_id)
+        with self._locked(upload_id):
+            meta = self.status(upload_id)
+            if 'document_id' in meta:
+                return meta['document_id']
+            if meta['received'] != meta['size']:
+                raise UploadConflict(meta['received'])
+            sha = self._hasher(upload_id, part_path, meta['size'])
+            with self._lock:
+                self._hashers[upload_id] = (meta['size'], sha.copy())
+
+            document_id = store(part_path, sha.hexdigest(), meta)
+            if document_id is not None:
+                del meta['received']
+                meta['document_id'] = document_id
+                self._write_meta(json_path, meta)
+                with self._lock:
+                    self._hashers.pop(upload_id, None)
+        return document_id
+
+    def _write_meta(self, json_path, meta):
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp',
+                                         delete=False) as tmp:
+            json.dump(meta, tmp)
+        os.replace(tmp.name, json_path)
+
+    def abort(self, upload_id):
+        json_path, part_path = self._paths(upload_id)
+        for path in (json_path, part_path, json_path[:-len('.json')] + '.lock'):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.expire_after
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass